@@ -0,0 +1,550 @@
+from __future__ import annotations
+
+from typing import Iterable, Callable, Any
+import numpy as np
+import bruteforcer
+import argparse
+import platform
+import asyncio
+import search
+import common
+import json
+import math
+import time
+import sys
+import os
+
+try:
+    import tracemalloc
+except ImportError:
+    # Not every implementation of Python has it
+    tracemalloc = None
+
+try:
+    import resource
+except ImportError:
+    # Only available on Unix
+    resource = None
+
+# Colors solved by the suite, from easy to hard, with the number of layers they need
+CANONICAL_COLORS: list[tuple[tuple[int, int, int], int]] = [
+    ((0, 51, 102), 1),
+    ((219, 201, 84), 2),
+    ((164, 4, 122), 3),
+    ((99, 221, 230), 4),
+    ((46, 208, 51), 4),
+    ((148, 249, 1), 5),
+]
+
+# How many calls every microbenchmark makes
+MICROBENCHMARK_SIZE: int = 100000
+
+class CountingCompactColorsSearch(search.CompactColorsSearch):
+    """
+    The search ``search.solve()`` runs, counting the nodes it expands.
+    """
+    def __init__(self):
+        super().__init__()
+        self.expansion_count: int = 0
+
+    def expand(self, nodes: np.ndarray, g_score: int) -> np.ndarray:
+        self.expansion_count += len(nodes)
+        return super().expand(nodes, g_score)
+
+class EuclideanColorsSearch(search.ColorsSearch):
+    """
+    The legacy baseline: the search as it was before the heuristic became admissible, for comparison.
+    Every layer is generated for every node and the heuristic is the Euclidean distance between RGB
+    values.
+    """
+    def __init__(self):
+        super().__init__()
+        self.expansion_count: int = 0
+
+    def astar(self, start: search.SearchNode, goal: search.SearchNode, reversePath: bool = False) -> Iterable[search.SearchNode] | None:
+        # Skip the backwards search that the admissible heuristic needs
+        return super(search.ColorsSearch, self).astar(start, goal, reversePath)
+
+    def neighbors(self, node: search.SearchNode) -> set[search.SearchNode]:
+        self.expansion_count += 1
+
+        neighbors: set[search.SearchNode] = set()
+
+        opacity_indexes: list[int] = common.OPACITY_INDEXES
+        if node.rgb is None:
+            opacity_indexes = [common.FULLY_OPAQUE_INDEX]
+
+        for opacity_index in opacity_indexes:
+            for color_index in common.COLOR_INDEXES:
+                layer: tuple[int, int] = (color_index, opacity_index)
+                neighbors.add(search.SearchNode(rgb=common.apply_layer(node.rgb, layer), top_layer=layer))
+
+        return neighbors
+
+    def heuristic_cost_estimate(self, current_node: search.SearchNode, goal_node: search.SearchNode) -> float:
+        if current_node.rgb is None or goal_node.rgb is None:
+            return math.inf
+        return math.hypot(
+            goal_node.rgb[0] - current_node.rgb[0],
+            goal_node.rgb[1] - current_node.rgb[1],
+            goal_node.rgb[2] - current_node.rgb[2],
+        )
+
+def benchmark_legacy_search(colors: list[tuple[int, int, int]]) -> tuple[list[int], list[int], list[float]]:
+    """
+    Solves every color with a new EuclideanColorsSearch and measures each solve.
+
+    :param colors: The target colors.
+    :type colors: list[tuple[int, int, int]]
+    :return: The number of layers found, the number of node expansions and the wall time in seconds
+    for every color.
+    :rtype: tuple[list[int], list[int], list[float]]
+    """
+    layer_counts: list[int] = []
+    expansion_counts: list[int] = []
+    times: list[float] = []
+    for color in colors:
+        solver: EuclideanColorsSearch = EuclideanColorsSearch()
+        start_time: float = time.perf_counter()
+        solver_result: Iterable[search.SearchNode] | None = solver.astar(search.SearchNode(rgb=None), search.SearchNode(rgb=color))
+        times.append(time.perf_counter() - start_time)
+        layer_counts.append(-1 if solver_result is None else len(list(solver_result)) - 1)
+        expansion_counts.append(solver.expansion_count)
+    return layer_counts, expansion_counts, times
+
+def benchmark_compact_search(colors: list[tuple[int, int, int]]) -> tuple[list[int], list[int], list[float]]:
+    """
+    Solves every color with one CountingCompactColorsSearch, reused between colors like
+    ``search.solve()`` does, and measures each solve.
+
+    :param colors: The target colors.
+    :type colors: list[tuple[int, int, int]]
+    :return: The number of layers found, the number of node expansions and the wall time in seconds
+    for every color.
+    :rtype: tuple[list[int], list[int], list[float]]
+    """
+    solver: CountingCompactColorsSearch = CountingCompactColorsSearch()
+    layer_counts: list[int] = []
+    expansion_counts: list[int] = []
+    times: list[float] = []
+    for color in colors:
+        solver.expansion_count = 0
+        start_time: float = time.perf_counter()
+        solver_result: list[search.SearchNode] | None = solver.search(color)
+        times.append(time.perf_counter() - start_time)
+        layer_counts.append(-1 if solver_result is None else len(solver_result) - 1)
+        expansion_counts.append(solver.expansion_count)
+    return layer_counts, expansion_counts, times
+
+def benchmark_solve_many_per_color(colors: list[tuple[int, int, int]]) -> tuple[list[int], list[float]]:
+    """
+    Solves every color with ``search.solve_many()`` and measures the time until each result.
+
+    :param colors: The target colors.
+    :type colors: list[tuple[int, int, int]]
+    :return: The number of layers found and the wall time in seconds for every color. The time of
+    the first color includes the shared breadth-first search unless it already ran in this process.
+    :rtype: tuple[list[int], list[float]]
+    """
+    layer_counts: list[int] = []
+    times: list[float] = []
+    start_time: float = time.perf_counter()
+    for _, solver_result in search.solve_many(colors):
+        times.append(time.perf_counter() - start_time)
+        layer_counts.append(-1 if solver_result is None else len(solver_result) - 1)
+        start_time = time.perf_counter()
+    return layer_counts, times
+
+def benchmark_solve(colors: list[tuple[int, int, int]]) -> list[float]:
+    """
+    Solves every color with ``search.solve()``, one call per color.
+
+    :param colors: The target colors.
+    :type colors: list[tuple[int, int, int]]
+    :return: The wall time in seconds of every solve.
+    :rtype: list[float]
+    """
+    times: list[float] = []
+    for color in colors:
+        start_time: float = time.perf_counter()
+        search.solve(color)
+        times.append(time.perf_counter() - start_time)
+    return times
+
+def benchmark_solve_many(colors: list[tuple[int, int, int]]) -> tuple[float, float]:
+    """
+    Solves every color with ``search.solve_many()``.
+
+    :param colors: The target colors.
+    :type colors: list[tuple[int, int, int]]
+    :return: The number of seconds spent before the first result (mostly the shared breadth-first
+    search, which only runs once per process) and the number of seconds spent on the rest.
+    :rtype: tuple[float, float]
+    """
+    start_time: float = time.perf_counter()
+    time_of_first_result: float | None = None
+    for _ in search.solve_many(colors):
+        if time_of_first_result is None:
+            time_of_first_result = time.perf_counter()
+    return time_of_first_result - start_time, time.perf_counter() - time_of_first_result
+
+def count_write_syscalls() -> int | None:
+    # The number of write system calls made by this process so far, where the OS reports it (Linux)
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('syscw:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def benchmark_result_writer(colors: np.ndarray, path: str) -> dict[str, tuple[float, int | None]]:
+    """
+    Writes colors one at a time, the way results used to be written (one ``write()`` of 3 bytes per
+    color), and with ``common.ResultWriter`` in both formats.
+
+    :param colors: The colors to write in decimal form.
+    :type colors: np.ndarray
+    :param path: The path to a temporary file to write to. It is removed afterwards.
+    :type path: str
+    :return: The wall time in seconds and number of write system calls (if known) of every method.
+    :rtype: dict[str, tuple[float, int | None]]
+    """
+    results: dict[str, tuple[float, int | None]] = {}
+
+    def measure(name: str, function: Callable[[], Any]) -> None:
+        syscalls_before: int | None = count_write_syscalls()
+        start_time: float = time.perf_counter()
+        function()
+        elapsed_time: float = time.perf_counter() - start_time
+        syscalls_after: int | None = count_write_syscalls()
+        results[name] = elapsed_time, None if syscalls_before is None else syscalls_after - syscalls_before
+
+    def write_one_at_a_time() -> None:
+        with open(path, 'wb') as f:
+            for decimal_color in colors.tolist():
+                f.write(common.rgb_to_bytes(common.decimal_to_rgb(decimal_color)))
+
+    def write_with_result_writer(bitset: bool) -> None:
+        with common.ResultWriter(path, bitset=bitset) as writer:
+            for decimal_color in colors.tolist():
+                writer.add(decimal_color)
+
+    measure('One write per color', write_one_at_a_time)
+    measure('ResultWriter (3-byte stream)', lambda: write_with_result_writer(False))
+    measure('ResultWriter (bitset)', lambda: write_with_result_writer(True))
+    os.remove(path)
+    return results
+
+def measure(workload: Callable[[], int], repeat: int = 1) -> dict[str, Any]:
+    """
+    Runs a workload a number of times and measures the fastest run, then runs it once more with
+    tracemalloc to measure its peak memory.
+
+    :param workload: A function that runs the workload and returns the number of operations it did.
+    :type workload: Callable[[], int]
+    :param repeat: How many times to run the workload before the traced run.
+    :type repeat: int
+    :return: A dictionary with the number of operations, the wall time in seconds and operations per
+    second of the fastest run, and the peak number of bytes allocated by the traced run (None where
+    tracemalloc isn't available, like on PyPy). Tables that are built once per process are built by
+    the first run, so they aren't part of the peak.
+    :rtype: dict[str, Any]
+    """
+    operation_count: int = 0
+    best_time: float = math.inf
+    for _ in range(repeat):
+        start_time: float = time.perf_counter()
+        operation_count = workload()
+        best_time = min(best_time, time.perf_counter() - start_time)
+
+    peak_memory: int | None = None
+    if tracemalloc is not None:
+        tracemalloc.start()
+        workload()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        'operations': operation_count,
+        'seconds': best_time,
+        'ops_per_second': operation_count / best_time,
+        'peak_memory_bytes': peak_memory,
+    }
+
+def run_suite() -> dict[str, Any]:
+    """
+    Runs every benchmark of the suite. Every workload uses a fixed seed, so results from different
+    runs (and different versions of the code) can be compared.
+
+    :return: A dictionary that can be saved as JSON, with information about the environment, the
+    numbers of layers where ``bruteforcer.verify_pruning()`` failed and the result of ``measure()``
+    for every benchmark, by name.
+    :rtype: dict[str, Any]
+    """
+    benchmarks: dict[str, dict[str, Any]] = {}
+    rng: np.random.Generator = np.random.default_rng(0)
+
+    colors: list[tuple[int, int, int]] = [common.decimal_to_rgb(int(decimal)) for decimal in rng.integers(0, 1 << 24, MICROBENCHMARK_SIZE)]
+    layers: list[tuple[int, int]] = list(zip(
+        rng.integers(0, len(common.BASE_COLORS), MICROBENCHMARK_SIZE).tolist(),
+        rng.integers(0, len(common.BASE_OPACITIES), MICROBENCHMARK_SIZE).tolist(),
+    ))
+
+    def apply_every_layer() -> int:
+        for color, layer in zip(colors, layers):
+            common.apply_layer(color, layer)
+        return len(colors)
+
+    def convert_every_color() -> int:
+        for color in colors:
+            common.rgb_to_bytes(color)
+        return len(colors)
+
+    print('Benchmarking microbenchmarks...')
+    benchmarks['common.apply_layer'] = measure(apply_every_layer, repeat=3)
+    benchmarks['common.rgb_to_bytes'] = measure(convert_every_color, repeat=3)
+
+    # Stacks of three layers with an opaque bottom layer
+    solutions: list[bruteforcer.Solution] = [
+        bruteforcer.Solution([(bottom_color_index, common.FULLY_OPAQUE_INDEX), layers[2 * i], layers[2 * i + 1]])
+        for i, bottom_color_index in enumerate(rng.integers(0, len(common.BASE_COLORS), MICROBENCHMARK_SIZE // 10).tolist())
+    ]
+
+    def test_every_solution() -> int:
+        for solution in solutions:
+            solution.test()
+        return len(solutions)
+
+    benchmarks['bruteforcer.Solution.test'] = measure(test_every_solution, repeat=3)
+
+    for color, layer_count in CANONICAL_COLORS:
+        print(f'Benchmarking search.solve() on {common.rgb_to_hex(color)} ({layer_count} {"layer" if layer_count == 1 else "layers"})...')
+        found_layer_counts: list[int] = []
+
+        def solve_color() -> int:
+            solver_result: list[search.SearchNode] | None = search.solve(color)
+            found_layer_counts.append(-1 if solver_result is None else len(solver_result) - 1)
+            return 1
+
+        benchmarks[f'search.solve {common.rgb_to_hex(color)}'] = measure(solve_color, repeat=2)
+        benchmarks[f'search.solve {common.rgb_to_hex(color)}']['layers'] = found_layer_counts[0]
+        if found_layer_counts[0] != layer_count:
+            print(f'WARNING: {common.rgb_to_hex(color)} was solved with {found_layer_counts[0]} layers instead of {layer_count}')
+
+    # The first run also runs the shared breadth-first search, so the fastest run leaves it out
+    print('Benchmarking search.solve_many() on every canonical color...')
+    solve_many_layer_counts: list[int] = []
+
+    def solve_every_color() -> int:
+        solve_many_layer_counts.clear()
+        for _, solver_result in search.solve_many([color for color, _ in CANONICAL_COLORS]):
+            solve_many_layer_counts.append(-1 if solver_result is None else len(solver_result) - 1)
+        return len(CANONICAL_COLORS)
+
+    benchmarks['search.solve_many'] = measure(solve_every_color, repeat=2)
+    for (color, layer_count), found_layer_count in zip(CANONICAL_COLORS, solve_many_layer_counts):
+        if found_layer_count != layer_count:
+            print(f'WARNING: {common.rgb_to_hex(color)} was solved with {found_layer_count} layers instead of {layer_count} by solve_many()')
+
+    print('Benchmarking bruteforcer.get_constructible_colors_from_n_steps(2)...')
+    constructible_color_counts: list[int] = []
+
+    def bruteforce_two_layers() -> int:
+        constructible_color_counts.append(len(bruteforcer.get_constructible_colors_from_n_steps(2)))
+        return 1
+
+    benchmarks['bruteforcer.get_constructible_colors_from_n_steps(2)'] = measure(bruteforce_two_layers, repeat=2)
+    benchmarks['bruteforcer.get_constructible_colors_from_n_steps(2)']['colors'] = constructible_color_counts[0]
+
+    # Operations are colors found, so this is the discovery rate
+    print('Benchmarking bruteforcer.randomized_search_with_n_layers(2)...')
+    benchmarks['bruteforcer.randomized_search_with_n_layers(2)'] = measure(
+        lambda: len(bruteforcer.randomized_search_with_n_layers(2, cutoff_time=0.25, seed=0)),
+    )
+
+    # Not timed: pruning must never change the colors found
+    print('Checking that pruning in the bruteforcer finds the same colors with 2 and 3 layers...')
+    pruning_mismatches: list[int] = bruteforcer.verify_pruning((2, 3))
+    for layer_count in pruning_mismatches:
+        print(f'WARNING: the bruteforcer found different colors with {layer_count} layers with and without pruning')
+
+    peak_rss: int | None = None
+    if resource is not None:
+        # Kibibytes on Linux, bytes on macOS
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+    return {
+        'implementation': common.PY_IMPLEMENTATION,
+        'python_version': platform.python_version(),
+        'numpy_version': np.__version__,
+        'peak_rss_bytes': peak_rss,
+        'pruning_mismatches': pruning_mismatches,
+        'benchmarks': benchmarks,
+    }
+
+def format_suite_results(results: dict[str, Any], baseline: dict[str, Any] | None = None) -> str:
+    """
+    Formats the results of ``run_suite()`` as a table, optionally compared to earlier results.
+
+    :param results: The results from ``run_suite()``.
+    :type results: dict[str, Any]
+    :param baseline: Optional results from an earlier run to compare to.
+    :type baseline: dict[str, Any] | None
+    :return: The formatted table.
+    :rtype: str
+    """
+    lines: list[str] = [f'{"Benchmark":<55} | {"Ops/sec":>12} | {"Peak memory":>12} | {"Baseline":>12}']
+    for name, result in results['benchmarks'].items():
+        peak_memory: str = 'unknown' if result['peak_memory_bytes'] is None else f'{result["peak_memory_bytes"] / (1 << 20):.1f} MiB'
+        comparison: str = ''
+        if baseline is not None and name in baseline['benchmarks']:
+            comparison = f'{result["ops_per_second"] / baseline["benchmarks"][name]["ops_per_second"]:.2f}x'
+        lines.append(f'{name:<55} | {result["ops_per_second"]:>12.1f} | {peak_memory:>12} | {comparison:>12}')
+    if results['peak_rss_bytes'] is not None:
+        lines.append(f'Peak memory of the process: {results["peak_rss_bytes"] / (1 << 20):.1f} MiB')
+    if len(results.get('pruning_mismatches', [])) > 0:
+        lines.append(f'Pruning check FAILED with {", ".join(map(str, results["pruning_mismatches"]))} layers')
+    return '\n'.join(lines)
+
+async def run_load_test(request_count: int, distinct_count: int, workers: int | None = None, timeout: float | None = None) -> dict[str, Any]:
+    """
+    Fires many concurrent requests at ``search.SolveService`` at once, like a web server embedding it
+    would, and measures the latency of every request.
+
+    :param request_count: The number of requests.
+    :type request_count: int
+    :param distinct_count: The number of distinct random colors to request (with a fixed seed), so
+    concurrent requests for the same color and repeated requests are both tested.
+    :type distinct_count: int
+    :param workers: The number of worker processes, or None for one per CPU.
+    :type workers: int | None
+    :param timeout: Optional timeout of every request in seconds.
+    :type timeout: float | None
+    :return: The number of requests, how many of them succeeded and timed out, the total time and
+    the 50th, 90th and 99th percentiles and maximum of the latencies of the requests that succeeded.
+    :rtype: dict[str, Any]
+    """
+    rng: np.random.Generator = np.random.default_rng(0)
+    colors: list[tuple[int, int, int]] = [common.decimal_to_rgb(int(decimal)) for decimal in rng.integers(0, 1 << 24, distinct_count)]
+    targets: list[tuple[int, int, int]] = [colors[index] for index in rng.integers(0, distinct_count, request_count).tolist()]
+
+    with search.SolveService(workers) as service:
+        # Start the workers first, so their start-up time isn't counted
+        await asyncio.gather(*[service.solve(color) for color in common.BASE_COLORS[:service.workers]])
+        service.cache.clear()
+
+        async def request(target_rgb: tuple[int, int, int]) -> float | None:
+            start_time: float = time.perf_counter()
+            try:
+                await service.solve(target_rgb, timeout=timeout)
+            except asyncio.TimeoutError:
+                return None
+            return time.perf_counter() - start_time
+
+        start_time: float = time.perf_counter()
+        latencies: list[float | None] = await asyncio.gather(*[request(target_rgb) for target_rgb in targets])
+        elapsed_time: float = time.perf_counter() - start_time
+
+    successful_latencies: np.ndarray = np.array([latency for latency in latencies if latency is not None])
+    percentiles: list[float | None] = [None] * 3
+    if len(successful_latencies) > 0:
+        percentiles = np.percentile(successful_latencies, [50, 90, 99]).tolist()
+    return {
+        'requests': request_count,
+        'distinct_colors': distinct_count,
+        'succeeded': len(successful_latencies),
+        'timed_out': request_count - len(successful_latencies),
+        'seconds': elapsed_time,
+        'p50_seconds': percentiles[0],
+        'p90_seconds': percentiles[1],
+        'p99_seconds': percentiles[2],
+        'max_seconds': float(successful_latencies.max()) if len(successful_latencies) > 0 else None,
+    }
+
+if __name__ == '__main__':
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Benchmarks the searches.')
+    parser.add_argument('--suite', action='store_true', help='run the fixed-seed benchmark suite and save the results as JSON instead of comparing solvers')
+    parser.add_argument('--output', default='benchmark_results.json', metavar='PATH', help='where --suite saves its results (default: benchmark_results.json)')
+    parser.add_argument('--baseline', metavar='PATH', help='results of an earlier --suite run to compare to')
+    parser.add_argument('--load-test', type=int, metavar='N', help='fire N concurrent requests at search.SolveService and report their latencies instead of comparing solvers')
+    parser.add_argument('--distinct', type=int, default=100, metavar='N', help='number of distinct colors requested by --load-test (default: 100)')
+    parser.add_argument('--workers', type=int, metavar='N', help='number of worker processes for --load-test (default: one per CPU)')
+    parser.add_argument('--timeout', type=float, metavar='SECONDS', help='timeout of every request of --load-test')
+    args: argparse.Namespace = parser.parse_args()
+
+    if args.load_test is not None:
+        print(f'Firing {args.load_test} requests for {args.distinct} colors...')
+        load_test_results: dict[str, Any] = asyncio.run(run_load_test(args.load_test, args.distinct, args.workers, args.timeout))
+        print(f'{load_test_results["succeeded"]} requests succeeded and {load_test_results["timed_out"]} timed out in {load_test_results["seconds"]:.2f} s ({load_test_results["requests"] / load_test_results["seconds"]:.1f} requests per second)')
+        if load_test_results['succeeded'] > 0:
+            print(f'Latency: p50 {load_test_results["p50_seconds"]:.3f} s, p90 {load_test_results["p90_seconds"]:.3f} s, p99 {load_test_results["p99_seconds"]:.3f} s, max {load_test_results["max_seconds"]:.3f} s')
+        sys.exit()
+
+    if args.suite:
+        suite_results: dict[str, Any] = run_suite()
+        with open(args.output, 'w') as f:
+            json.dump(suite_results, f, indent=4)
+        baseline_results: dict[str, Any] | None = None
+        if args.baseline is not None:
+            with open(args.baseline) as f:
+                baseline_results = json.load(f)
+        print('')
+        print(format_suite_results(suite_results, baseline_results))
+        print(f'Saved results to {args.output}')
+        sys.exit()
+
+    # A fixed sample so results can be compared between runs
+    sample: list[tuple[int, int, int]] = [
+        common.decimal_to_rgb(int(decimal)) for decimal in np.random.default_rng(0).integers(0, 1 << 24, 20)
+    ]
+
+    results: dict[str, tuple[list[int], list[int], list[float]]] = {}
+    print('Benchmarking the legacy baseline (Euclidean A*)...')
+    results['Legacy baseline (Euclidean A*)'] = benchmark_legacy_search(sample)
+    print('Benchmarking solve() (CompactColorsSearch)...')
+    results['solve() (CompactColorsSearch)'] = benchmark_compact_search(sample)
+    print('Benchmarking solve_many()...')
+    many_layer_counts: list[int]
+    many_times: list[float]
+    many_layer_counts, many_times = benchmark_solve_many_per_color(sample)
+
+    print('')
+    print(f'{"Color":<8} | {"Legacy: layers, expansions, time":<34} | {"solve(): layers, expansions, time":<34} | {"solve_many(): layers, time":<26}')
+    for i, color in enumerate(sample):
+        columns: list[str] = []
+        for layer_counts, expansion_counts, times in results.values():
+            columns.append(f'{layer_counts[i]:>2} layers {expansion_counts[i]:>6} exp. {times[i]:>7.3f} s')
+        columns.append(f'{many_layer_counts[i]:>2} layers {many_times[i]:>7.3f} s')
+        print(f'{common.rgb_to_hex(color):<8} | {columns[0]:<34} | {columns[1]:<34} | {columns[2]:<26}')
+
+    print('')
+    for name, (layer_counts, expansion_counts, times) in results.items():
+        print(f'{name}: {np.mean(layer_counts):.2f} layers, {np.mean(expansion_counts):.1f} expansions, {np.mean(times):.3f} s per solve on average')
+    print(f'solve_many(): {np.mean(many_layer_counts):.2f} layers, {np.mean(many_times[1:]):.3f} s per solve on average after the first ({many_times[0]:.1f} s, with the shared search)')
+
+    print('')
+    throughput_sample: list[tuple[int, int, int]] = [
+        common.decimal_to_rgb(int(decimal)) for decimal in np.random.default_rng(1).integers(0, 1 << 24, 10000)
+    ]
+    print(f'Benchmarking solve() on {len(throughput_sample) // 100} colors...')
+    solve_times: list[float] = benchmark_solve(throughput_sample[:len(throughput_sample) // 100])
+    print(f'Benchmarking solve_many() on {len(throughput_sample)} colors...')
+    setup_time: float
+    solve_many_time: float
+    setup_time, solve_many_time = benchmark_solve_many(throughput_sample)
+
+    print('')
+    print(f'solve(): {len(solve_times) / sum(solve_times):.1f} solves per second')
+    print(f'solve_many(): {len(throughput_sample) / (setup_time + solve_many_time):.1f} solves per second ({setup_time:.1f} s of setup, {(len(throughput_sample) - 1) / solve_many_time:.1f} solves per second after)')
+
+    print('')
+    writer_sample: np.ndarray = np.random.default_rng(2).integers(0, 1 << 24, 1 << 20).astype(np.uint32)
+    print(f'Benchmarking writing {len(writer_sample)} colors...')
+    for name, (elapsed_time, syscall_count) in benchmark_result_writer(writer_sample, 'benchmark.dat.tmp').items():
+        formatted_syscall_count: str = 'unknown' if syscall_count is None else str(syscall_count)
+        print(f'{name}: {elapsed_time:.3f} s, {formatted_syscall_count} write system calls')
+
+    print('')
+    input('Press ENTER to close.')
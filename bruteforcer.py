@@ -1,25 +1,34 @@
 from __future__ import annotations
 
-from typing import Callable, Any, BinaryIO
+from typing import Iterable, Iterator
 from tqdm import tqdm
+import numpy as np
+import argparse
+import metrics
 import common
-import random
 import time
 
+# The maximum number of seconds between checkpoints of the writer of a search (see
+# common.ResultWriter.checkpoint())
+CHECKPOINT_INTERVAL: float = 60.0
+
 class Solution:
-    def __init__(self, steps: list[tuple[int, int]], target: tuple[int, int, int] | None = None):
+    def __init__(self, steps: list[tuple[int, int]], target: tuple[int, int, int] | None = None, palette: common.Palette = common.DEFAULT_PALETTE):
         """
         A list of steps to contruct a target color.
 
         :param steps: A list of steps. Each step should be a tuple with the first item an
-        integer to index into the common.BASE_COLORS array, and the second item an integer to index
-        into the common.BASE_OPACITIES array.
+        integer to index into the colors of the palette, and the second item an integer to index
+        into its opacities.
         :type steps: list[tuple[int, int]]
         :param target: An optional target color.
         :type target: tuple[int, int, int]
+        :param palette: The colors and opacities the steps can have.
+        :type palette: common.Palette
         """
         self.target: tuple[int, int, int] | None = target
         self.steps: list[tuple[int, int]] = steps
+        self.palette: common.Palette = palette
 
     def __repr__(self):
         return f'Solution(target={self.target}, steps={self.steps})'
@@ -33,11 +42,11 @@ class Solution:
         # Steps
         stringified_steps_list: list[str] = []
         for step in self.steps:
-            opacity: float = common.BASE_OPACITIES[step[1]]
+            opacity: float = self.palette.opacities[step[1]]
             if opacity == 0:
                 stringified_steps_list.append('(0%)')
                 continue
-            stringified_color: str = common.rgb_to_hex(common.BASE_COLORS[step[0]])
+            stringified_color: str = common.rgb_to_hex(self.palette.colors[step[0]])
             stringified_opacity: str = f'{opacity:.0%}'
             stringified_steps_list.append(f'({stringified_opacity} {stringified_color})')
         stringified_steps: str = f'Steps ({len(self.steps)}): ' + (' '.join(stringified_steps_list))
@@ -58,10 +67,12 @@ class Solution:
 
         return f'{status} {stringified_target} {stringified_result} {stringified_steps}'
 
-    def test(self) -> tuple[int, int, int]:
+    def test(self, model: common.BlendModel = common.DEFAULT_BLEND_MODEL) -> tuple[int, int, int]:
         """
         Tests the solution and returns the actual color produced.
 
+        :param model: The formula used to blend the layers.
+        :type model: common.BlendModel
         :return: The actual color produced by the solution.
         :rtype: tuple[int, int, int]
         """
@@ -69,144 +80,350 @@ class Solution:
         last_opaque_step: int | None = None
         for i in range(len(self.steps)):
             step: tuple[int, int] = self.steps[i]
-            if common.BASE_OPACITIES[step[1]] == 1:
+            if self.palette.opacities[step[1]] == 1:
                 last_opaque_step = i
         if last_opaque_step is None:
             raise ValueError('At least one solution step must have 100% opacity to prevent ambiguity regarding the background color')
 
         # Start from the last opaque step and simulate overlaying the colors
-        result: tuple[int, int, int] = common.BASE_COLORS[self.steps[last_opaque_step][0]]
+        result: int = common.rgb_to_decimal(self.palette.colors[self.steps[last_opaque_step][0]])
         for step in self.steps[last_opaque_step+1:]:
-            result = common.apply_layer(result, step)
+            result = common.apply_layer_decimal(result, step, model, self.palette)
+
+        return common.decimal_to_rgb(result)
+
+def get_layer_indexes(palette: common.Palette = common.DEFAULT_PALETTE) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Lists every layer of a palette, indexed like ``common.layer_to_index()``.
+
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :return: The index of the color and the index of the opacity of every layer.
+    :rtype: tuple[np.ndarray, np.ndarray]
+    """
+    return (
+        np.repeat(palette.color_indexes, len(palette.opacities)),
+        np.tile(palette.opacity_indexes, len(palette.colors)),
+    )
+
+def get_non_opaque_layer_indexes(palette: common.Palette = common.DEFAULT_PALETTE) -> np.ndarray:
+    """
+    Lists the layers that are worth putting above the bottom layer. Opaque layers are left out,
+    because they erase everything below them, so a stack with one above the bottom layer makes the
+    same color as the shorter stack that starts from it.
+
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :return: The indexes (from ``common.layer_to_index()``) of the layers, in order.
+    :rtype: np.ndarray
+    """
+    return np.flatnonzero(get_layer_indexes(palette)[1] != palette.fully_opaque_index)
 
-        return result
+def get_stack_counts(step_count: int, palette: common.Palette = common.DEFAULT_PALETTE) -> tuple[int, int]:
+    """
+    Counts the combinations of exactly ``step_count`` layers with an opaque bottom layer.
+
+    :param step_count: The number of layers.
+    :type step_count: int
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :return: The number of combinations, and the number left without opaque layers above the bottom
+    layer.
+    :rtype: tuple[int, int]
+    """
+    non_opaque_layer_count: int = len(palette.colors) * len(palette.non_opaque_indexes)
+    return (
+        len(palette.colors) * palette.layer_count ** (step_count - 1),
+        len(palette.colors) * non_opaque_layer_count ** (step_count - 1),
+    )
 
-def get_constructible_colors_from_n_steps(n: int = 2, file: BinaryIO | None = None) -> set[int]:
+def for_every_solution(step_count: int, model: common.BlendModel = common.DEFAULT_BLEND_MODEL, layer_indexes: np.ndarray | None = None, palette: common.Palette = common.DEFAULT_PALETTE) -> Iterator[tuple[np.ndarray, list[int]]]:
+    """
+    Iterates over every combination of ``step_count`` layers with an opaque bottom layer. Combinations
+    are enumerated without recursion and every partial stack of layers is only blended once.
+
+    Combinations that only differ in their top layer are grouped together, so every item is the colors
+    produced by one partial stack (the prefix) with every possible top layer on it. The prefix is a
+    list of layer indexes from the bottom up, where the bottom one indexes into the colors of the
+    palette and the others are indexes from ``common.layer_to_index()``. The same list is changed in
+    place for every item, so use ``get_solution()`` to keep a combination.
+
+    :param step_count: The number of layers.
+    :type step_count: int
+    :param model: The formula used to blend the layers.
+    :type model: common.BlendModel
+    :param layer_indexes: Optional array of the layers (from ``common.layer_to_index()``) to use above
+    the bottom layer. Every layer is used if not provided.
+    :type layer_indexes: np.ndarray | None
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :return: An iterator over the colors produced by every top layer on a prefix, in the same order as
+    the colors of the palette if there is only one layer and as ``layer_indexes`` otherwise, along
+    with the prefix.
+    :rtype: Iterator[tuple[np.ndarray, list[int]]]
+    """
+    if step_count < 1:
+        return
+    if step_count == 1:
+        yield palette.color_decimals, []
+        return
+
+    if layer_indexes is None:
+        layer_indexes = np.arange(palette.layer_count)
+    layer_index_list: list[int] = layer_indexes.tolist()
+    layer_color_indexes: np.ndarray
+    layer_opacity_indexes: np.ndarray
+    layer_color_indexes, layer_opacity_indexes = get_layer_indexes(palette)
+    color_indexes: np.ndarray = layer_color_indexes[layer_indexes]
+    opacity_indexes: np.ndarray = layer_opacity_indexes[layer_indexes]
+
+    prefix_length: int = step_count - 1
+    last_positions: list[int] = [len(palette.colors) - 1] + [len(layer_indexes) - 1] * (prefix_length - 1)
+    # The position of every layer of the prefix in the colors of the palette or layer_indexes, the layer
+    # indexes of the prefix, and the color after every layer of it
+    positions: list[int] = [0] * prefix_length
+    prefix: list[int] = [0] + [layer_index_list[0]] * (prefix_length - 1)
+    colors: list[int] = [0] * prefix_length
+
+    position: int = 0
+    while True:
+        # Blend the layers that changed on top of the ones that didn't
+        for changed_position in range(position, prefix_length):
+            if changed_position == 0:
+                colors[0] = int(palette.color_decimals[prefix[0]])
+            else:
+                colors[changed_position] = common.apply_layer_decimal(colors[changed_position - 1], common.index_to_layer(prefix[changed_position], palette), model, palette)
+
+        bottom_colors: np.ndarray = np.full(len(layer_indexes), colors[-1], dtype=np.uint32)
+        yield common.apply_layers_batch(bottom_colors, color_indexes, opacity_indexes, model, palette), prefix
+
+        # Move on to the next prefix like an odometer
+        position = prefix_length - 1
+        while position >= 0 and positions[position] == last_positions[position]:
+            positions[position] = 0
+            prefix[position] = 0 if position == 0 else layer_index_list[0]
+            position -= 1
+        if position < 0:
+            return
+        positions[position] += 1
+        prefix[position] = positions[0] if position == 0 else layer_index_list[positions[position]]
+
+def get_solution(prefix: list[int], top_layer_index: int, palette: common.Palette = common.DEFAULT_PALETTE) -> Solution:
+    """
+    Gets the solution for a combination of layers from ``for_every_solution()``.
+
+    :param prefix: The prefix of the combination.
+    :type prefix: list[int]
+    :param top_layer_index: The index of the top layer in the colors of the palette if the prefix is
+    empty, and from ``common.layer_to_index()`` otherwise.
+    :type top_layer_index: int
+    :param palette: The palette the combination was made from.
+    :type palette: common.Palette
+    :return: The solution.
+    :rtype: Solution
+    """
+    if len(prefix) == 0:
+        return Solution([(top_layer_index, palette.fully_opaque_index)], palette=palette)
+    steps: list[tuple[int, int]] = [(prefix[0], palette.fully_opaque_index)]
+    steps += [common.index_to_layer(layer_index, palette) for layer_index in prefix[1:]]
+    steps.append(common.index_to_layer(top_layer_index, palette))
+    return Solution(steps, palette=palette)
+
+def get_constructible_colors_from_n_steps(n: int = 2, model: common.BlendModel = common.DEFAULT_BLEND_MODEL, writer: common.ResultWriter | None = None, prune: bool = True, palette: common.Palette = common.DEFAULT_PALETTE) -> common.ColorSet:
     """
     Bruteforces every combination of up to n layers to find constructible colors.
 
     :param n: The number of layers.
     :type n: int
-    :param file: Optional file to write results to. Must be opened in ``wb`` mode.
-    :type file: BinaryIO | None
-    :return: A set of the constructible colors that were found in decimal form.
-    :rtype: set[int]
+    :param model: The formula used to blend the layers.
+    :type model: common.BlendModel
+    :param writer: Optional writer to save every new constructible color to as soon as it is found.
+    It is checkpointed every CHECKPOINT_INTERVAL seconds and after every number of layers.
+    :type writer: common.ResultWriter | None
+    :param prune: Whether to skip combinations with opaque layers above the bottom layer (see
+    ``get_non_opaque_layer_indexes()``). The same colors are found either way.
+    :type prune: bool
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :return: The constructible colors that were found.
+    :rtype: common.ColorSet
     """
-    constructible_colors: set[int] = set()
+    constructible_colors: common.ColorSet = common.ColorSet()
 
-    # Find optimal step counts to check to get all possibilities
-    # (all numbers from 1 to n, skipping numbers that are factors of larger ones)
+    layer_indexes: np.ndarray = np.arange(palette.layer_count)
     step_counts: list[int] = []
-    for step_count in range(1, n + 1):
-        should_check: bool = True
-        for potential_multiple in range(step_count + 1, n + 1):
-            if (potential_multiple % step_count) == 0:
-                should_check = False
-                break
-        if should_check:
-            step_counts.append(step_count)
+    if prune:
+        layer_indexes = get_non_opaque_layer_indexes(palette)
+        # Without opaque layers above the bottom layer, stacks with fewer layers aren't covered by
+        # stacks with more layers, so every number of layers is checked
+        step_counts = list(range(1, n + 1))
+    else:
+        # Find optimal step counts to check to get all possibilities
+        # (all numbers from 1 to n, skipping numbers that are factors of larger ones)
+        for step_count in range(1, n + 1):
+            should_check: bool = True
+            for potential_multiple in range(step_count + 1, n + 1):
+                if (potential_multiple % step_count) == 0:
+                    should_check = False
+                    break
+            if should_check:
+                step_counts.append(step_count)
 
     # Prepare progress bar and constructible colors bar
     total_combinations: float = 0
     for step_count in step_counts:
-        partial_combinations: float = (len(common.BASE_COLORS) * len(common.BASE_OPACITIES)) ** (step_count - 1)
-        partial_combinations *= len(common.BASE_COLORS)
+        partial_combinations: float = len(layer_indexes) ** (step_count - 1)
+        partial_combinations *= len(palette.colors)
         total_combinations += partial_combinations
     total_combinations: int = int(total_combinations)
     progress_bar: tqdm = tqdm(desc='Progress     ', total=total_combinations, ascii=(common.PY_IMPLEMENTATION == 'PyPy'))
     constructible_bar: tqdm = tqdm(desc='Constructible', total=(1 << 24), ascii=(common.PY_IMPLEMENTATION == 'PyPy'))
 
-    def for_every_solution(step_count: int, function: Callable[[list[tuple[int, int]]], Any], steps: list[tuple[int, int]] | None = None) -> None:
-        if steps is None:
-            steps = []
-        if step_count < 1:
-            progress_bar.update(1)
-
-            reversed_steps: list[tuple[int, int]] = steps.copy()
-            reversed_steps.reverse()
-            function(reversed_steps)
-            return
-        if step_count == 1:
-            for color in common.COLOR_INDEXES:
-                new_steps: list[tuple[int, int]] = steps.copy()
-                new_steps.append((color, common.FULLY_OPAQUE_INDEX))
-                for_every_solution(step_count - 1, function, new_steps)
-        else:
-            for color in common.COLOR_INDEXES:
-                for opacity in common.OPACITY_INDEXES:
-                    new_steps: list[tuple[int, int]] = steps.copy()
-                    new_steps.append((color, opacity))
-                    for_every_solution(step_count - 1, function, new_steps)
-
-    def add_result_to_constructible_colors(steps: list[tuple[int, int]]) -> None:
-        nonlocal constructible_colors
-
-        solution: Solution = Solution(steps)
-        initial_length: int = len(constructible_colors)
-        color: tuple[int, int, int] = solution.test()
-        constructible_colors.add(common.rgb_to_decimal(color))
-        final_length: int = len(constructible_colors)
-        if final_length > initial_length: # Color was added and therefore wasn't in set before
-            constructible_bar.update(1)
-            if file is not None:
-                file.write(common.rgb_to_bytes(color))
-
+    time_of_last_checkpoint: float = time.monotonic()
     for step_count in step_counts:
-        for_every_solution(step_count, add_result_to_constructible_colors)
+        for colors, _ in for_every_solution(step_count, model, layer_indexes, palette):
+            progress_bar.update(len(colors))
+            new_colors: np.ndarray = np.unique(colors[~constructible_colors.contains_many(colors)])
+            metrics.count('bruteforcer.stacks_evaluated', len(colors))
+            metrics.count('bruteforcer.new_colors', len(new_colors))
+            if len(new_colors) > 0:
+                constructible_colors.add_many(new_colors)
+                constructible_bar.update(len(new_colors))
+                if writer is not None:
+                    writer.add_many(new_colors)
+            if writer is not None and time.monotonic() - time_of_last_checkpoint >= CHECKPOINT_INTERVAL:
+                writer.checkpoint()
+                time_of_last_checkpoint = time.monotonic()
+        if writer is not None:
+            # Every color with this many layers is now on disk
+            writer.checkpoint()
+            time_of_last_checkpoint = time.monotonic()
     progress_bar.close()
     constructible_bar.close()
 
     return constructible_colors
 
-def randomized_search_with_n_layers(n: int = 2, cutoff_time: float = 5.0, known_constructible_colors: set[int] | None = None, file: BinaryIO | None = None) -> set[int]:
+def verify_pruning(layer_counts: Iterable[int] = (2, 3), model: common.BlendModel = common.DEFAULT_BLEND_MODEL, palette: common.Palette = common.DEFAULT_PALETTE) -> list[int]:
+    """
+    Checks that ``get_constructible_colors_from_n_steps()`` finds the same colors with and without
+    pruning, by running both.
+
+    :param layer_counts: The numbers of layers to check.
+    :type layer_counts: Iterable[int]
+    :param model: The formula used to blend the layers.
+    :type model: common.BlendModel
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :return: The numbers of layers where the two runs found different colors, which should be none.
+    :rtype: list[int]
     """
-    Randomly searches for constructible colors by checking combinations of n layers.
+    mismatched_layer_counts: list[int] = []
+    for layer_count in layer_counts:
+        pruned_colors: common.ColorSet = get_constructible_colors_from_n_steps(layer_count, model, prune=True, palette=palette)
+        unpruned_colors: common.ColorSet = get_constructible_colors_from_n_steps(layer_count, model, prune=False, palette=palette)
+        if not np.array_equal(pruned_colors.array, unpruned_colors.array):
+            mismatched_layer_counts.append(layer_count)
+    return mismatched_layer_counts
+
+def randomized_search_with_n_layers(
+    n: int = 2,
+    cutoff_time: float = 5.0,
+    known_constructible_colors: common.ColorSet | None = None,
+    batch_size: int = 1 << 18,
+    bias: float = 0.0,
+    seed: int | None = None,
+    model: common.BlendModel = common.DEFAULT_BLEND_MODEL,
+    writer: common.ResultWriter | None = None,
+    palette: common.Palette = common.DEFAULT_PALETTE,
+) -> common.ColorSet:
+    """
+    Randomly searches for constructible colors by checking combinations of n layers. Combinations
+    are drawn and tested in batches with numpy.
 
     :param n: The number of layers.
     :type n: int
     :param cutoff_time: When this many seconds pass before finding the next unique constructible
     color three consecutive times, the search will end.
     :type cutoff_time: float
-    :param known_constructible_colors: Optional set of already known constructible colors in decimal
-    form.
-    :type known_constructible_colors: set[int]
-    :param file: Optional file to write results to. Must be opened in ``wb`` mode.
-    :type file: BinaryIO | None
-    :return: A set of the constructible colors that were found in decimal form (including the colors
-    from ``known_constructible_colors`` if provided).
-    :rtype: set[int]
-    """
-    constructible_colors: set[int] = set()
+    :param known_constructible_colors: Optional set of already known constructible colors. New colors
+    are added to this set.
+    :type known_constructible_colors: common.ColorSet
+    :param batch_size: How many combinations are drawn and tested at once.
+    :type batch_size: int
+    :param bias: How strongly to favor layers that produced new colors in earlier batches, from 0
+    (uniform sampling) to 1 (only sample layers in proportion to how many new colors they produced).
+    :type bias: float
+    :param seed: Optional seed for the random number generator.
+    :type seed: int | None
+    :param model: The formula used to blend the layers.
+    :type model: common.BlendModel
+    :param writer: Optional writer to save every new constructible color to as soon as it is found.
+    It is checkpointed every CHECKPOINT_INTERVAL seconds.
+    :type writer: common.ResultWriter | None
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :return: The constructible colors that were found (including the colors from
+    ``known_constructible_colors`` if provided).
+    :rtype: common.ColorSet
+    """
+    if n < 1:
+        raise ValueError('At least one layer is needed to prevent ambiguity regarding the background color')
+
+    constructible_colors: common.ColorSet = common.ColorSet()
     if known_constructible_colors is not None:
         constructible_colors = known_constructible_colors
-    constructible_count: int = len(constructible_colors)
 
     constructible_bar: tqdm = tqdm(desc='Constructible', total=(1 << 24), ascii=(common.PY_IMPLEMENTATION == 'PyPy'))
-    constructible_bar.update(constructible_count)
+    constructible_bar.update(len(constructible_colors))
+
+    rng: np.random.Generator = np.random.default_rng(seed)
+    opacity_count: int = len(palette.opacities)
+    # The bottom layer is always opaque, so only its color is drawn; every other layer is drawn as
+    # color_index * opacity_count + opacity_index
+    choice_counts: list[int] = [len(palette.colors)] + [palette.layer_count] * (n - 1)
+    # How many new colors each choice has produced at each position, for biased sampling
+    new_color_counts: list[np.ndarray] = [np.zeros(choice_count, dtype=np.float64) for choice_count in choice_counts]
+
+    def draw(position: int) -> np.ndarray:
+        choice_count: int = choice_counts[position]
+        total: float = new_color_counts[position].sum()
+        if bias <= 0 or total <= 0:
+            return rng.integers(0, choice_count, batch_size)
+        probabilities: np.ndarray = (1 - bias) / choice_count + bias * (new_color_counts[position] / total)
+        return rng.choice(choice_count, size=batch_size, p=probabilities)
 
     time_of_last_new_color: float = time.time()
+    time_of_last_checkpoint: float = time.monotonic()
     consecutive_timeouts: int = 0
 
     while True:
         now: float = time.time()
 
-        test_layers: list[tuple[int, int]] = []
-        if n > 0:
-            test_layers.append((random.randint(0, len(common.BASE_COLORS) - 1), common.FULLY_OPAQUE_INDEX))
-        for _ in range(n - 1):
-            test_layers.append((random.randint(0, len(common.BASE_COLORS) - 1), random.randint(0, len(common.BASE_OPACITIES) - 1)))
-
-        solution: Solution = Solution(test_layers)
-        color: tuple[int, int, int] = solution.test()
-        constructible_colors.add(common.rgb_to_decimal(color))
-
-        new_constructible_count: int = len(constructible_colors)
-        if new_constructible_count > constructible_count:
-            constructible_bar.update(1)
-            constructible_count = new_constructible_count
+        # Fold every combination in the batch through the channel table one layer at a time
+        choices: list[np.ndarray] = [draw(position) for position in range(n)]
+        colors: np.ndarray = palette.color_decimals[choices[0]]
+        for layers in choices[1:]:
+            colors = common.apply_layers_batch(colors, layers // opacity_count, layers % opacity_count, model, palette)
+
+        unique_colors: np.ndarray
+        first_indexes: np.ndarray
+        unique_colors, first_indexes = np.unique(colors, return_index=True)
+        is_new: np.ndarray = ~constructible_colors.contains_many(unique_colors)
+        new_color_count: int = constructible_colors.add_many(unique_colors[is_new])
+        metrics.count('bruteforcer.stacks_evaluated', batch_size)
+        metrics.count('bruteforcer.new_colors', new_color_count)
+        if writer is not None:
+            writer.add_many(unique_colors[is_new])
+            if time.monotonic() - time_of_last_checkpoint >= CHECKPOINT_INTERVAL:
+                writer.checkpoint()
+                time_of_last_checkpoint = time.monotonic()
+
+        if new_color_count > 0:
+            constructible_bar.update(new_color_count)
             time_of_last_new_color = now
-            if file is not None:
-                file.write(common.rgb_to_bytes(color))
+            if bias > 0:
+                for position, layers in enumerate(choices):
+                    np.add.at(new_color_counts[position], layers[first_indexes[is_new]], 1)
 
         if now - time_of_last_new_color >= cutoff_time:
             consecutive_timeouts += 1
@@ -219,10 +436,38 @@ def randomized_search_with_n_layers(n: int = 2, cutoff_time: float = 5.0, known_
             consecutive_timeouts = 0
 
 if __name__ == '__main__':
-    with open(common.CONSTRUCTIBLE_COLORS_FILE_PATH, 'wb') as f:
-
-        print('Getting constructible colors...')
-        constructible_colors: set[int] = get_constructible_colors_from_n_steps(3, file=f)
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Bruteforces every combination of up to a number of layers.')
+    parser.add_argument('--layers', type=int, default=3, help='maximum number of layers (default: 3)')
+    parser.add_argument('--no-prune', action='store_true', help='also check redundant combinations of layers')
+    parser.add_argument('--verify', action='store_true', help='check that pruning finds the same colors as a run without it')
+    parser.add_argument('--blend-model', choices=[model.name for model in common.BLEND_MODELS], default=common.DEFAULT_BLEND_MODEL.name, help=f'formula used to blend layers (default: {common.DEFAULT_BLEND_MODEL.name})')
+    parser.add_argument('--palette', metavar='PATH', help='JSON file with the colors and opacities layers can have (default: PowerPoint\'s palette)')
+    args: argparse.Namespace = parser.parse_args()
+    blend_model: common.BlendModel = common.get_blend_model(args.blend_model)
+    palette: common.Palette = common.load_palette(args.palette) if args.palette is not None else common.DEFAULT_PALETTE
+
+    if not args.no_prune:
+        for step_count in range(1, args.layers + 1):
+            stack_count, non_opaque_stack_count = get_stack_counts(step_count, palette)
+            print(f'{step_count} {"layer" if step_count == 1 else "layers"}: {stack_count - non_opaque_stack_count} / {stack_count} stacks with opaque layers above the bottom layer pruned')
+        print('')
+
+    print('Getting constructible colors...')
+    constructible_colors: common.ColorSet
+    # Colors are saved as they are found, so they aren't lost if the program is stopped
+    with common.ResultWriter(model=blend_model, palette=palette) as writer:
+        constructible_colors = get_constructible_colors_from_n_steps(args.layers, blend_model, writer, prune=(not args.no_prune), palette=palette)
+        writer.close(depth=args.layers)
+
+    if args.verify:
+        # Repeat the run with pruning switched the other way
+        print('Verifying against a run with pruning switched ' + ('on...' if args.no_prune else 'off...'))
+        other_colors: common.ColorSet = get_constructible_colors_from_n_steps(args.layers, blend_model, prune=args.no_prune, palette=palette)
+        if np.array_equal(constructible_colors.array, other_colors.array):
+            print('Both runs found the same colors.')
+        else:
+            print(f'MISMATCH: {len(constructible_colors)} colors in the first run, {len(other_colors)} in the second.')
+        print('')
 
     print(f'{len(constructible_colors)} / {1 << 24} ({len(constructible_colors) / (1 << 24):.3%}) colors constructible.')
     print(f'{(1 << 24) - len(constructible_colors)} / {1 << 24} ({1 - (len(constructible_colors) / (1 << 24)):.3%}) colors unconstructible.')
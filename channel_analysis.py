@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import numpy as np
+import argparse
+import common
+
+# Layers act on the red, green and blue channels independently (with the same opacity), so a lot can
+# be learned about colors from 256-value channel domains without ever enumerating the 2^24 colors.
+#
+# Layer sequences are grouped into classes by the opacities of the layers above the bottom layer. For
+# a class, each channel can only take the values that layers with those opacities lead to, no matter
+# which color every layer has. A color can only be constructed by a sequence of the class if all three
+# of its channels are possible at once, which is a necessary condition only: the channels of a real
+# layer come from the same base color, while every channel here picks its own.
+
+# How many rows of class tables are compared with colors at once
+CLASS_CHUNK_SIZE: int = 1 << 9
+COLOR_CHUNK_SIZE: int = 1 << 14
+
+def build_channel_steps(model: common.BlendModel = common.DEFAULT_BLEND_MODEL, palette: common.Palette = common.DEFAULT_PALETTE) -> np.ndarray:
+    """
+    Precomputes which channel values every channel value can become with one layer of every opacity.
+
+    :param model: The formula used to blend the layers.
+    :type model: common.BlendModel
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :return: A bool array of shape ``(len(palette.non_opaque_indexes), 3, 256, 256)`` indexed by
+    ``[opacity, channel, old_value, new_value]``, where ``opacity`` indexes
+    ``palette.non_opaque_indexes``.
+    :rtype: np.ndarray
+    """
+    steps: np.ndarray = np.zeros((len(palette.non_opaque_indexes), 3, 256, 256), dtype=bool)
+    old_values: np.ndarray = np.arange(256)
+    channel_table: np.ndarray = model.get_channel_table(palette)
+    for opacity, opacity_index in enumerate(palette.non_opaque_indexes):
+        for channel in range(3):
+            # Only the values this channel has in some base color can be used by a layer
+            value_indexes: list[int] = sorted({value_indexes[channel] for value_indexes in palette.layer_channel_indexes})
+            for value_index in value_indexes:
+                steps[opacity, channel, old_values, channel_table[opacity_index, value_index]] = True
+    return steps
+
+# Tables derived from the channel table of a blend model are built the first time the model is used
+# with a palette, keyed by the model id and the palette hash
+_channel_steps: dict[tuple[int, str], np.ndarray] = {}
+_reachable_channel_values: dict[tuple[int, str], list[np.ndarray]] = {}
+
+def get_channel_steps(model: common.BlendModel = common.DEFAULT_BLEND_MODEL, palette: common.Palette = common.DEFAULT_PALETTE) -> np.ndarray:
+    key: tuple[int, str] = (model.id, palette.hash)
+    if key not in _channel_steps:
+        _channel_steps[key] = build_channel_steps(model, palette)
+    return _channel_steps[key]
+
+def _step_all(values: np.ndarray, steps: np.ndarray, backwards: bool) -> np.ndarray:
+    # Applies (or undoes) one more layer of every opacity to every row of a class table. The rows for
+    # each opacity are kept together, so the first layer of a sequence is the most significant digit
+    opacity_count: int = steps.shape[0]
+    new_values: np.ndarray = np.empty((opacity_count * len(values), 3, 256), dtype=bool)
+    for opacity in range(opacity_count):
+        rows: slice = slice(opacity * len(values), (opacity + 1) * len(values))
+        for channel in range(3):
+            step: np.ndarray = steps[opacity, channel].astype(np.float32)
+            if backwards:
+                step = step.T
+            new_values[rows, channel] = values[:, channel].astype(np.float32) @ step > 0
+    return new_values
+
+def get_reachable_channel_values(layer_count: int, model: common.BlendModel = common.DEFAULT_BLEND_MODEL, palette: common.Palette = common.DEFAULT_PALETTE) -> np.ndarray:
+    """
+    Finds the values every channel can have after a number of layers, for every class of layer
+    sequences given by the bottom color and the opacities of the layers above it.
+
+    :param layer_count: The number of layers, including the opaque bottom layer.
+    :type layer_count: int
+    :param model: The formula used to blend the layers.
+    :type model: common.BlendModel
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :return: A bool array of shape ``(len(palette.colors) * len(palette.non_opaque_indexes) ** (layer_count - 1), 3, 256)``
+    indexed by ``[class, channel, value]``. The class of a bottom color and a sequence of opacities is
+    the index of the color followed by the indexes of the opacities in ``palette.non_opaque_indexes``
+    as digits, from the lowest layer to the highest.
+    :rtype: np.ndarray
+    """
+    key: tuple[int, str] = (model.id, palette.hash)
+    if key not in _reachable_channel_values:
+        bottom_values: np.ndarray = np.zeros((len(palette.colors), 3, 256), dtype=bool)
+        for color_index, color in enumerate(palette.colors):
+            bottom_values[color_index, [0, 1, 2], color] = True
+        _reachable_channel_values[key] = [bottom_values]
+
+    tables: list[np.ndarray] = _reachable_channel_values[key]
+    while len(tables) < layer_count:
+        # Digits are added below the existing ones by _step_all(), so swap the axes around it to add
+        # the new opacity as the least significant digit instead
+        values: np.ndarray = _step_all(tables[-1], get_channel_steps(model, palette), backwards=False)
+        values = values.reshape(len(palette.non_opaque_indexes), len(tables[-1]), 3, 256).swapaxes(0, 1).reshape(-1, 3, 256)
+        tables.append(values)
+    return tables[layer_count - 1]
+
+def get_channel_preimages(target_rgb: tuple[int, int, int], layer_count: int, model: common.BlendModel = common.DEFAULT_BLEND_MODEL, palette: common.Palette = common.DEFAULT_PALETTE) -> np.ndarray:
+    """
+    Finds the values every channel can have before a number of layers that lead to a target color,
+    for every sequence of opacities those layers can have.
+
+    :param target_rgb: The target color.
+    :type target_rgb: tuple[int, int, int]
+    :param layer_count: The number of layers above the color.
+    :type layer_count: int
+    :param model: The formula used to blend the layers.
+    :type model: common.BlendModel
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :return: A bool array of shape ``(len(palette.non_opaque_indexes) ** layer_count, 3, 256)``
+    indexed by ``[sequence, channel, value]``. A sequence of opacities is given by their indexes in
+    ``palette.non_opaque_indexes`` as digits, from the lowest layer to the highest.
+    :rtype: np.ndarray
+    """
+    values: np.ndarray = np.zeros((1, 3, 256), dtype=bool)
+    values[0, [0, 1, 2], target_rgb] = True
+    steps: np.ndarray = get_channel_steps(model, palette)
+    for _ in range(layer_count):
+        # Undoing a layer adds the lowest layer of the sequence, which is the most significant digit
+        values = _step_all(values, steps, backwards=True)
+    return values
+
+def get_consistent_colors(colors: np.ndarray, class_values: np.ndarray) -> np.ndarray:
+    """
+    Checks which colors have all three channels in the values of at least one class at once.
+
+    :param colors: The colors in decimal form.
+    :type colors: np.ndarray
+    :param class_values: A class table from ``get_reachable_channel_values()`` or
+    ``get_channel_preimages()``.
+    :type class_values: np.ndarray
+    :return: A bool array with an element for every color.
+    :rtype: np.ndarray
+    """
+    colors = np.asarray(colors, dtype=np.uint32)
+    consistent: np.ndarray = np.zeros(len(colors), dtype=bool)
+    for color_start in range(0, len(colors), COLOR_CHUNK_SIZE):
+        chunk: np.ndarray = colors[color_start:color_start+COLOR_CHUNK_SIZE]
+        r: np.ndarray = (chunk >> 16) & 255
+        g: np.ndarray = (chunk >> 8) & 255
+        b: np.ndarray = chunk & 255
+        chunk_consistent: np.ndarray = consistent[color_start:color_start+COLOR_CHUNK_SIZE]
+        for class_start in range(0, len(class_values), CLASS_CHUNK_SIZE):
+            values: np.ndarray = class_values[class_start:class_start+CLASS_CHUNK_SIZE]
+            unknown: np.ndarray = ~chunk_consistent
+            chunk_consistent[unknown] = (values[:, 0][:, r[unknown]] & values[:, 1][:, g[unknown]] & values[:, 2][:, b[unknown]]).any(axis=0)
+            if chunk_consistent.all():
+                break
+    return consistent
+
+def get_layer_count_lower_bounds(colors: np.ndarray, max_layer_count: int, model: common.BlendModel = common.DEFAULT_BLEND_MODEL, palette: common.Palette = common.DEFAULT_PALETTE) -> np.ndarray:
+    """
+    Finds a lower bound on the number of layers needed for every color from the channels alone. A
+    bound above ``max_layer_count`` proves that the color can't be constructed with that many layers.
+
+    :param colors: The colors in decimal form.
+    :type colors: np.ndarray
+    :param max_layer_count: The highest number of layers to check. The tables grow by a factor of
+    ``len(palette.non_opaque_indexes)`` for every layer, so checking 5 layers with the default
+    palette takes about 150 MiB of RAM.
+    :type max_layer_count: int
+    :param model: The formula used to blend the layers.
+    :type model: common.BlendModel
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :return: A uint8 array with the lowest number of layers for which every color is channel
+    consistent, or ``max_layer_count + 1`` for colors that aren't consistent with any of them.
+    :rtype: np.ndarray
+    """
+    colors = np.asarray(colors, dtype=np.uint32)
+    bounds: np.ndarray = np.full(len(colors), max_layer_count + 1, dtype=np.uint8)
+    unknown: np.ndarray = np.arange(len(colors))
+    for layer_count in range(1, max_layer_count + 1):
+        consistent: np.ndarray = get_consistent_colors(colors[unknown], get_reachable_channel_values(layer_count, model, palette))
+        bounds[unknown[consistent]] = layer_count
+        unknown = unknown[~consistent]
+    return bounds
+
+def get_layer_count_lower_bound(rgb: tuple[int, int, int], max_layer_count: int = 4, model: common.BlendModel = common.DEFAULT_BLEND_MODEL, palette: common.Palette = common.DEFAULT_PALETTE) -> int:
+    """
+    Finds a lower bound on the number of layers needed for a color from its channels alone.
+
+    :param rgb: The color.
+    :type rgb: tuple[int, int, int]
+    :param max_layer_count: The highest number of layers to check.
+    :type max_layer_count: int
+    :param model: The formula used to blend the layers.
+    :type model: common.BlendModel
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :return: The lowest number of layers for which the color is channel consistent, or
+    ``max_layer_count + 1`` if it isn't consistent with any of them.
+    :rtype: int
+    """
+    return int(get_layer_count_lower_bounds(np.array([common.rgb_to_decimal(rgb)]), max_layer_count, model, palette)[0])
+
+if __name__ == '__main__':
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Proves lower bounds on the number of layers needed for colors from their channels alone.')
+    parser.add_argument('colors', nargs='*', metavar='HEX', help='colors to check, like #ff8000')
+    parser.add_argument('--max-layers', type=int, default=4, help='highest number of layers to check (default: 4)')
+    parser.add_argument('--sample', type=int, default=0, metavar='N', help='also check N random colors and summarize the bounds')
+    parser.add_argument('--blend-model', choices=[model.name for model in common.BLEND_MODELS], default=common.DEFAULT_BLEND_MODEL.name, help=f'formula used to blend layers (default: {common.DEFAULT_BLEND_MODEL.name})')
+    parser.add_argument('--palette', metavar='PATH', help='JSON file with the colors and opacities layers can have (default: PowerPoint\'s palette)')
+    args: argparse.Namespace = parser.parse_args()
+    blend_model: common.BlendModel = common.get_blend_model(args.blend_model)
+    palette: common.Palette = common.load_palette(args.palette) if args.palette is not None else common.DEFAULT_PALETTE
+
+    print('Channel values reachable by each class of layer sequences:')
+    for layer_count in range(1, args.max_layers + 1):
+        class_values: np.ndarray = get_reachable_channel_values(layer_count, blend_model, palette)
+        print(f'{layer_count} layer{"" if layer_count == 1 else "s"}: {len(class_values)} classes, {class_values.mean():.2%} of channel values on average')
+
+    for text in args.colors:
+        color: tuple[int, int, int] = common.decimal_to_rgb(int(text.lstrip('#'), 16))
+        bound: int = get_layer_count_lower_bound(color, args.max_layers, blend_model, palette)
+        if bound > args.max_layers:
+            print(f'{common.rgb_to_hex(color)} needs more than {args.max_layers} layers')
+        else:
+            print(f'{common.rgb_to_hex(color)} needs at least {bound} layer{"" if bound == 1 else "s"}')
+
+    if args.sample > 0:
+        sample: np.ndarray = np.random.default_rng(0).integers(0, 1 << 24, args.sample).astype(np.uint32)
+        bound_counts: np.ndarray = np.bincount(get_layer_count_lower_bounds(sample, args.max_layers, blend_model, palette), minlength=args.max_layers + 2)
+        print(f'Lower bounds of {args.sample} random colors:')
+        for layer_count in range(1, args.max_layers + 2):
+            print(f'At least {layer_count} layer{"" if layer_count == 1 else "s"}: {bound_counts[layer_count]} colors')
+
+    print('')
+    input('Press ENTER to close.')
@@ -1,58 +1,368 @@
+from __future__ import annotations
+
+from typing import TextIO, Any
+import numpy as np
+import channel_analysis
+import argparse
 import common
+import json
+import math
+import time
+import sys
 import os
 
 MAX_PRINTED_COLORS: int = 5000
 
+# Remaining colors are only grouped into clusters when there are at most this many of them
+MAX_CLUSTERED_COLORS: int = 1 << 22
+
+# Constructible neighbors are only looked for up to this Euclidean distance, and this many offsets
+# are checked for every color at once
+MAX_NEIGHBOR_DISTANCE: int = 8
+NEIGHBOR_BATCH_SIZE: int = 256
+
+# How many of the largest clusters and fullest cells are reported
+REPORTED_GROUP_COUNT: int = 10
+
+def find_clusters(decimals: np.ndarray) -> np.ndarray:
+    """
+    Groups colors into clusters of colors that are next to each other in RGB space, where neighbors
+    differ by 1 in a single channel.
+
+    :param decimals: The colors in decimal form, in ascending order.
+    :type decimals: np.ndarray
+    :return: An int array with the index of the cluster of every color. Clusters are numbered from 0
+    in the order of their first color.
+    :rtype: np.ndarray
+    """
+    decimals = np.asarray(decimals, dtype=np.uint32)
+    if len(decimals) == 0:
+        return np.zeros(0, dtype=np.intp)
+
+    # Find the neighbor one step up in every channel, skipping channels at 255 (which would carry
+    # into the next channel), through the index of every color (-1 for colors not in the array)
+    indexes: np.ndarray = np.full(1 << 24, -1, dtype=np.int32)
+    indexes[decimals] = np.arange(len(decimals), dtype=np.int32)
+    first_indexes: list[np.ndarray] = []
+    second_indexes: list[np.ndarray] = []
+    for shift in (16, 8, 0):
+        sources: np.ndarray = np.flatnonzero(((decimals >> shift) & 255) != 255)
+        positions: np.ndarray = indexes[decimals[sources] + np.uint32(1 << shift)]
+        present: np.ndarray = positions >= 0
+        first_indexes.append(sources[present])
+        second_indexes.append(positions[present])
+    del indexes
+    first: np.ndarray = np.concatenate(first_indexes)
+    second: np.ndarray = np.concatenate(second_indexes)
+
+    # Union-find over every edge at once: hook the larger root of every edge onto the smaller one,
+    # then point every color straight at its root, until no edge joins two different roots. Edges
+    # within a cluster stay that way, so they are dropped as soon as they are found
+    parents: np.ndarray = np.arange(len(decimals), dtype=np.int32)
+    while True:
+        first_roots: np.ndarray = parents[first]
+        second_roots: np.ndarray = parents[second]
+        different: np.ndarray = first_roots != second_roots
+        if not different.any():
+            break
+        first = first[different]
+        second = second[different]
+        first_roots = first_roots[different]
+        second_roots = second_roots[different]
+        np.minimum.at(parents, np.maximum(first_roots, second_roots), np.minimum(first_roots, second_roots))
+        while True:
+            grandparents: np.ndarray = parents[parents]
+            if np.array_equal(grandparents, parents):
+                break
+            parents = grandparents
+
+    return np.unique(parents, return_inverse=True)[1]
+
+def find_nearest_colors(colors: common.ColorSet, decimals: np.ndarray, max_distance: int = MAX_NEIGHBOR_DISTANCE) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the nearest color in a set to every color, by Euclidean distance in RGB space.
+
+    :param colors: The set to look in.
+    :type colors: common.ColorSet
+    :param decimals: The colors in decimal form.
+    :type decimals: np.ndarray
+    :param max_distance: The highest distance to look at.
+    :type max_distance: int
+    :return: An int64 array with the nearest color of every color in decimal form (-1 if there is
+    none within ``max_distance``) and a float array with the distances (infinity if there is none).
+    :rtype: tuple[np.ndarray, np.ndarray]
+    """
+    decimals = np.asarray(decimals, dtype=np.uint32)
+    rgb: np.ndarray = np.stack(((decimals >> 16) & 255, (decimals >> 8) & 255, decimals & 255), axis=1).astype(np.int32)
+
+    # Every offset within the distance, from nearest to farthest, so the first hit is the nearest
+    span: np.ndarray = np.arange(-max_distance, max_distance + 1)
+    offsets: np.ndarray = np.stack(np.meshgrid(span, span, span, indexing='ij'), axis=-1).reshape(-1, 3)
+    distances: np.ndarray = np.sqrt((offsets ** 2).sum(axis=1))
+    order: np.ndarray = np.argsort(distances, kind='stable')
+    order = order[(distances[order] > 0) & (distances[order] <= max_distance)]
+    offsets, distances = offsets[order], distances[order]
+
+    nearest: np.ndarray = np.full(len(decimals), -1, dtype=np.int64)
+    nearest_distances: np.ndarray = np.full(len(decimals), math.inf)
+    pending: np.ndarray = np.arange(len(decimals))
+    for start in range(0, len(offsets), NEIGHBOR_BATCH_SIZE):
+        if len(pending) == 0:
+            break
+        candidates: np.ndarray = rgb[pending, None, :] + offsets[None, start:start+NEIGHBOR_BATCH_SIZE, :]
+        in_range: np.ndarray = ((candidates >= 0) & (candidates <= 255)).all(axis=2)
+        candidate_decimals: np.ndarray = (np.clip(candidates, 0, 255) << np.array([16, 8, 0])).sum(axis=2).astype(np.uint32)
+        found: np.ndarray = in_range & colors.contains_many(candidate_decimals)
+        rows: np.ndarray = np.flatnonzero(found.any(axis=1))
+        columns: np.ndarray = found[rows].argmax(axis=1)
+        nearest[pending[rows]] = candidate_decimals[rows, columns]
+        nearest_distances[pending[rows]] = distances[start + columns]
+        pending = np.delete(pending, rows)
+    return nearest, nearest_distances
+
+def analyze_remaining_colors(
+    colors: common.ColorSet,
+    limit: int = MAX_PRINTED_COLORS,
+    cell_size: int = 16,
+    color_index: np.ndarray | None = None,
+    model: common.BlendModel = common.DEFAULT_BLEND_MODEL,
+    palette: common.Palette = common.DEFAULT_PALETTE,
+) -> dict[str, Any]:
+    """
+    Analyzes the colors that haven't been proven constructible yet.
+
+    :param colors: The colors proven constructible.
+    :type colors: common.ColorSet
+    :param limit: The maximum number of remaining colors to list along with their nearest
+    constructible colors and lower bounds on their number of layers.
+    :type limit: int
+    :param cell_size: The size of the cubes RGB space is divided into to count remaining colors in.
+    Must divide 256.
+    :type cell_size: int
+    :param color_index: Optional color index from ``common.load_color_index()`` to count colors by
+    their number of layers with.
+    :type color_index: np.ndarray | None
+    :param model: The blend model the colors were found with.
+    :type model: common.BlendModel
+    :param palette: The palette the colors were found with.
+    :type palette: common.Palette
+    :return: A JSON-serializable report.
+    :rtype: dict[str, Any]
+    """
+    remaining: np.ndarray = colors.to_array(missing=True)
+    r: np.ndarray = (remaining >> 16) & 255
+    g: np.ndarray = (remaining >> 8) & 255
+    b: np.ndarray = remaining & 255
+
+    report: dict[str, Any] = {
+        'constructible_count': len(colors),
+        'remaining_count': len(remaining),
+    }
+
+    if color_index is not None:
+        depths: np.ndarray = np.asarray(color_index['depth'])
+        report['constructible_depth_counts'] = {str(depth): int(count) for depth, count in enumerate(np.bincount(depths[colors.to_array()])) if count > 0}
+        report['remaining_depth_counts'] = {str(depth): int(count) for depth, count in enumerate(np.bincount(depths[remaining])) if count > 0}
+
+    report['channel_histograms'] = {name: np.bincount(channel, minlength=256).tolist() for name, channel in (('r', r), ('g', g), ('b', b))}
+
+    cells_per_channel: int = 256 // cell_size
+    cell_counts: np.ndarray = np.bincount(((r // cell_size) * cells_per_channel + g // cell_size) * cells_per_channel + b // cell_size, minlength=cells_per_channel ** 3)
+    fullest_cells: np.ndarray = np.argsort(cell_counts, kind='stable')[::-1][:REPORTED_GROUP_COUNT]
+    report['cells'] = [
+        {
+            'min': common.rgb_to_hex(tuple(int(index) * cell_size for index in np.unravel_index(cell, (cells_per_channel,) * 3))),
+            'size': cell_size,
+            'count': int(cell_counts[cell]),
+        }
+        for cell in fullest_cells.tolist() if cell_counts[cell] > 0
+    ]
+
+    report['clusters'] = None
+    if len(remaining) <= MAX_CLUSTERED_COLORS:
+        labels: np.ndarray = find_clusters(remaining)
+        sizes: np.ndarray = np.bincount(labels)
+        largest_clusters: np.ndarray = np.argsort(sizes, kind='stable')[::-1][:REPORTED_GROUP_COUNT]
+        # The bounding box of every cluster, from the colors sorted by cluster
+        order: np.ndarray = np.argsort(labels, kind='stable')
+        cluster_starts: np.ndarray = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        lower_bounds: list[np.ndarray] = [np.minimum.reduceat(channel[order], cluster_starts) for channel in (r, g, b)]
+        upper_bounds: list[np.ndarray] = [np.maximum.reduceat(channel[order], cluster_starts) for channel in (r, g, b)]
+        distinct_sizes: np.ndarray
+        size_counts: np.ndarray
+        distinct_sizes, size_counts = np.unique(sizes, return_counts=True)
+        report['clusters'] = {
+            'count': len(sizes),
+            'size_counts': {str(size): count for size, count in zip(distinct_sizes.tolist(), size_counts.tolist())},
+            'largest': [
+                {
+                    'size': int(sizes[cluster]),
+                    'min': common.rgb_to_hex(tuple(int(bounds[cluster]) for bounds in lower_bounds)),
+                    'max': common.rgb_to_hex(tuple(int(bounds[cluster]) for bounds in upper_bounds)),
+                }
+                for cluster in largest_clusters.tolist()
+            ],
+        }
+
+    listed: np.ndarray = remaining[:limit]
+    nearest: np.ndarray
+    nearest_distances: np.ndarray
+    nearest, nearest_distances = find_nearest_colors(colors, listed)
+    layer_count_lower_bounds: np.ndarray = channel_analysis.get_layer_count_lower_bounds(listed, 3, model, palette)
+    report['colors'] = [
+        {
+            'color': common.rgb_to_hex(common.decimal_to_rgb(decimal_color)),
+            'nearest_constructible': None if nearest_color < 0 else common.rgb_to_hex(common.decimal_to_rgb(nearest_color)),
+            'distance': None if nearest_color < 0 else distance,
+            'layer_count_lower_bound': lower_bound,
+        }
+        for decimal_color, nearest_color, distance, lower_bound in zip(listed.tolist(), nearest.tolist(), nearest_distances.tolist(), layer_count_lower_bounds.tolist())
+    ]
+
+    return report
+
+def format_report(report: dict[str, Any]) -> str:
+    """
+    Formats a report from ``analyze_remaining_colors()`` for people to read. The full channel
+    histograms are left out.
+
+    :param report: The report.
+    :type report: dict[str, Any]
+    :return: The formatted report.
+    :rtype: str
+    """
+    constructible_count: int = report['constructible_count']
+    remaining_count: int = report['remaining_count']
+    if remaining_count < 1:
+        return 'ALL COLORS ARE PROVEN CONSTRUCTIBLE!!!'
+
+    lines: list[str] = [
+        f'{constructible_count} / {1 << 24} ({constructible_count / (1 << 24):.6%}) colors have been proven constructible.',
+        f'{remaining_count} / {1 << 24} ({remaining_count / (1 << 24):.6%}) colors have not been proven constructible.',
+    ]
+
+    if 'remaining_depth_counts' in report:
+        lines.append('')
+        lines.append('Layers needed according to the color index:')
+        for depth, count in report['remaining_depth_counts'].items():
+            lines.append(f'{"unconstructible" if int(depth) == 255 else depth + " layers"}: {count} unproven colors ({report["constructible_depth_counts"].get(depth, 0)} proven)')
+
+    lines.append('')
+    lines.append('Most common channel values of unproven colors:')
+    for name, histogram in report['channel_histograms'].items():
+        values: np.ndarray = np.argsort(histogram, kind='stable')[::-1][:8]
+        lines.append(f'{name.upper()}: ' + ', '.join(f'{value} ({histogram[value]})' for value in values.tolist()))
+
+    lines.append('')
+    lines.append('Cells of RGB space with the most unproven colors:')
+    for cell in report['cells']:
+        lines.append(f'{cell["min"]} + {cell["size"] - 1}: {cell["count"]} colors')
+
+    if report['clusters'] is not None:
+        lines.append('')
+        lines.append(f'{report["clusters"]["count"]} clusters of neighboring unproven colors. The largest:')
+        for cluster in report['clusters']['largest']:
+            lines.append(f'{cluster["size"]} colors between {cluster["min"]} and {cluster["max"]}')
+
+    lines.append('')
+    lines.append(f'FIRST {len(report["colors"])} UNPROVEN COLORS (nearest constructible color, minimum number of layers)')
+    lines.append('')
+    for color in report['colors']:
+        nearest: str = 'none nearby' if color['nearest_constructible'] is None else f'{color["nearest_constructible"]} at {color["distance"]:.2f}'
+        lines.append(f'{color["color"]} ({nearest}, at least {color["layer_count_lower_bound"]} layers)')
+
+    return '\n'.join(lines)
+
+def write_json(data: dict[str, Any], path: str, lines: bool = False) -> None:
+    # A path of '-' is standard output; JSON lines are appended so a file can be followed
+    text: str = json.dumps(data) + '\n' if lines else json.dumps(data, indent=4) + '\n'
+    if path == '-':
+        sys.stdout.write(text)
+        sys.stdout.flush()
+    else:
+        with open(path, 'a' if lines else 'w') as f:
+            f.write(text)
+
 if __name__ == '__main__':
-    if os.path.isfile(common.CONSTRUCTIBLE_COLORS_FILE_PATH):
-        print('Reading data...')
-
-        with open(common.CONSTRUCTIBLE_COLORS_FILE_PATH, 'rb') as f:
-            data: bytes = f.read()
-
-        if len(data) % 3 == 0:
-            print('Converting data...')
-
-            constructible_colors: set[int] = set()
-            for i in range(0, len(data), 3):
-                color: tuple[int, int, int] = common.bytes_to_rgb(data[i:i+3])
-                constructible_colors.add(common.rgb_to_decimal(color))
-            constructible_count: int = len(constructible_colors)
-            
-            colors_to_be_printed: list[int] = []
-            maybe_unconstructible_count: int = 0
-            for decimal_color in range(1 << 24):
-                if decimal_color not in constructible_colors:
-                    if len(colors_to_be_printed) < MAX_PRINTED_COLORS:
-                        colors_to_be_printed.append(decimal_color)
-                    maybe_unconstructible_count += 1
-
-            del constructible_colors
-
-            print('')
-            
-            if maybe_unconstructible_count < 1:
-                print('ALL COLORS ARE PROVEN CONSTRUCTIBLE!!!')
-            else:
-                print(f'{constructible_count} / {1 << 24} ({constructible_count / (1 << 24):.6%}) colors have been proven constructible.')
-                print(f'{maybe_unconstructible_count} / {1 << 24} ({maybe_unconstructible_count / (1 << 24):.6%}) colors have not been proven constructible.')
-                print('')
-                if maybe_unconstructible_count <= MAX_PRINTED_COLORS:
-                    input('Press ENTER to see all unproven colors.')
-                    print('')
-                    print('UNPROVEN COLORS')
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Reports the colors that haven\'t been proven constructible yet.')
+    parser.add_argument('--path', default=common.CONSTRUCTIBLE_COLORS_FILE_PATH, help=f'constructible colors file (default: {common.CONSTRUCTIBLE_COLORS_FILE_PATH})')
+    parser.add_argument('--batch', action='store_true', help='never wait for ENTER')
+    parser.add_argument('--json', metavar='PATH', help='save the report as JSON to PATH (- for standard output); implies --batch')
+    parser.add_argument('--limit', type=int, default=MAX_PRINTED_COLORS, help=f'maximum number of unproven colors to list (default: {MAX_PRINTED_COLORS})')
+    parser.add_argument('--cell-size', type=int, choices=[1 << power for power in range(9)], default=16, help='size of the cubes of RGB space unproven colors are counted in (default: 16)')
+    parser.add_argument('--index', default=common.COLOR_INDEX_FILE_PATH, help=f'color index to count colors by number of layers with, if it exists (default: {common.COLOR_INDEX_FILE_PATH})')
+    parser.add_argument('--watch', type=float, metavar='SECONDS', help='keep reading the file as it is written, reporting progress every SECONDS until every color is proven constructible; implies --batch')
+    parser.add_argument('--blend-model', choices=[model.name for model in common.BLEND_MODELS], default=common.DEFAULT_BLEND_MODEL.name, help=f'formula used to blend layers (default: {common.DEFAULT_BLEND_MODEL.name})')
+    parser.add_argument('--palette', metavar='PATH', help='JSON file with the colors and opacities layers can have (default: PowerPoint\'s palette)')
+    args: argparse.Namespace = parser.parse_args()
+    blend_model: common.BlendModel = common.get_blend_model(args.blend_model)
+    palette: common.Palette = common.load_palette(args.palette) if args.palette is not None else common.DEFAULT_PALETTE
+    interactive: bool = not (args.batch or args.json is not None or args.watch is not None)
+    # Keep standard output clean for JSON
+    log: TextIO = sys.stderr if args.json == '-' else sys.stdout
+
+    reader: common.ConstructibleColorsReader = common.ConstructibleColorsReader(args.path, blend_model, palette=palette)
+    if args.watch is not None:
+        print(f'Watching {args.path}...', file=log)
+        time_of_last_refresh: float = time.monotonic()
+        try:
+            while True:
+                try:
+                    new_color_count: int = reader.refresh()
+                except ValueError as e:
+                    print(f'Corrupted data! ({e})', file=log)
+                    break
+                now: float = time.monotonic()
+                progress: dict[str, Any] = {
+                    'time': time.time(),
+                    'constructible_count': len(reader.colors),
+                    'remaining_count': (1 << 24) - len(reader.colors),
+                    'new_colors': new_color_count,
+                    'new_colors_per_second': new_color_count / max(now - time_of_last_refresh, 1e-9),
+                }
+                time_of_last_refresh = now
+                if args.json is not None:
+                    write_json(progress, args.json, lines=True)
                 else:
-                    input(f'Press ENTER to see the first {MAX_PRINTED_COLORS} unproven colors.')
-                    print('')
-                    print(f'FIRST {MAX_PRINTED_COLORS} UNPROVEN COLORS')
+                    print(f'{progress["constructible_count"]} constructible, {progress["remaining_count"]} remaining, {progress["new_colors_per_second"]:.1f} new colors per second', file=log)
+                if progress['remaining_count'] == 0:
+                    break
+                time.sleep(args.watch)
+        except KeyboardInterrupt:
+            pass
+        print('', file=log)
 
-                print('')
-                for decimal_color in colors_to_be_printed:
-                    print(common.rgb_to_hex(common.decimal_to_rgb(decimal_color)))
+    elif os.path.isfile(args.path):
+        print('Reading data...', file=log)
+
+        try:
+            reader.refresh()
+        except ValueError as e:
+            print(f'Corrupted data! ({e})', file=log)
         else:
-            print('Corrupted data!')
+            print('Scanning data...', file=log)
+
+            color_index: np.ndarray | None = None
+            if os.path.isfile(args.index):
+                try:
+                    color_index = common.load_color_index(args.index, blend_model, palette)
+                except ValueError as e:
+                    print(f'Ignoring color index ({e})', file=log)
+
+            remaining_report: dict[str, Any] = analyze_remaining_colors(reader.colors, args.limit, args.cell_size, color_index, blend_model, palette)
+            if args.json is not None:
+                write_json(remaining_report, args.json)
+                if args.json != '-':
+                    print(f'Saved report to {args.json}', file=log)
+            else:
+                if interactive and remaining_report['remaining_count'] > 0:
+                    print('')
+                    input('Press ENTER to see the report.')
+                print('')
+                print(format_report(remaining_report))
     else:
-        print('No data found.')
+        print('No data found.', file=log)
 
-    print('')
-    input('Press ENTER to close.')
+    if interactive:
+        print('')
+        input('Press ENTER to close.')
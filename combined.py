@@ -1,55 +1,314 @@
 from __future__ import annotations
 
+from concurrent.futures import ProcessPoolExecutor, Future, as_completed
+from multiprocessing import shared_memory
+from typing import Iterator, Any
 from tqdm import tqdm
-import bruteforcer
+import numpy as np
+import argparse
+import json
+import frontier
+import metrics
 import search
 import common
+import os
 
-BRUTE_FORCE_DEPTH: int = 3
-RANDOM_SEARCH_DEPTH: int = 5
-RANDOM_SEARCH_CUTOFF_TIME: float = 30.0
+# None keeps going until the frontier runs dry, which proves every remaining color unconstructible
+FRONTIER_MAX_DEPTH: int | None = None
+
+# How many consecutive colors (in decimal form) each shard of stage 2 covers
+SHARD_SIZE: int = 1 << 16
+
+# Where progress is saved so an interrupted run can be resumed with --resume
+CHECKPOINT_FILE_PATH: str = f'{common.CONSTRUCTIBLE_COLORS_FILE_PATH}.checkpoint'
+DEPTHS_CHECKPOINT_FILE_PATH: str = f'{common.CONSTRUCTIBLE_COLORS_FILE_PATH}.depths'
+CHECKPOINT_INTERVAL: float = 60.0
+
+# Colors already known to be constructible and the breadth-first search shared by search.solve_many(),
+# attached to shared memory in each worker, and the blend model and palette of the run
+_known_colors_memory: shared_memory.SharedMemory | None = None
+_known_colors: common.ColorSet | None = None
+_shared_search_memory: shared_memory.SharedMemory | None = None
+_shared_search: tuple[np.ndarray, np.ndarray] | None = None
+_blend_model: common.BlendModel = common.DEFAULT_BLEND_MODEL
+_palette: common.Palette = common.DEFAULT_PALETTE
+
+def get_shard_path(shard_index: int) -> str:
+    return f'{common.CONSTRUCTIBLE_COLORS_FILE_PATH}.shard{shard_index}'
+
+def save_checkpoint(state: dict[str, Any], depths: np.ndarray | None = None) -> None:
+    """
+    Atomically saves a checkpoint of a run.
+
+    :param state: JSON-serializable state of the run, including the current stage.
+    :type state: dict[str, Any]
+    :param depths: The color depths of the breadth-first search in stage 1, if it is still running.
+    :type depths: np.ndarray | None
+    """
+    if depths is not None:
+        common.write_file_atomically(DEPTHS_CHECKPOINT_FILE_PATH, depths.tobytes())
+    common.write_file_atomically(CHECKPOINT_FILE_PATH, json.dumps(state).encode())
+
+def load_checkpoint() -> dict[str, Any] | None:
+    if not os.path.isfile(CHECKPOINT_FILE_PATH):
+        return None
+    with open(CHECKPOINT_FILE_PATH, 'rb') as f:
+        return json.loads(f.read())
+
+def remove_checkpoint() -> None:
+    for path in (CHECKPOINT_FILE_PATH, DEPTHS_CHECKPOINT_FILE_PATH):
+        if os.path.isfile(path):
+            os.remove(path)
+
+def initialize_worker(name: str, shared_search_name: str | None, blend_model_name: str, palette_data: dict[str, Any] | None = None, metrics_path: str | None = None, metrics_interval: float = 10.0, profile_directory: str | None = None) -> None:
+    """
+    Attaches a worker process to the shared bitset of colors that are already known to be
+    constructible and to the breadth-first search shared by ``search.solve_many()``, and sets the
+    blend model and palette of the run.
+
+    :param name: The name of the shared memory block holding the bitset.
+    :type name: str
+    :param shared_search_name: The name of the shared memory block holding the breadth-first search
+    from ``search.build_shared_search()``, so workers don't each run it again, or None to run it in
+    the worker.
+    :type shared_search_name: str | None
+    :param blend_model_name: The name of the blend model.
+    :type blend_model_name: str
+    :param palette_data: The palette in the format of ``common.Palette.to_dict()``, or None for the
+    default palette.
+    :type palette_data: dict[str, Any] | None
+    :param metrics_path: Optional file to append metrics snapshots of the worker to. Metrics are only
+    recorded if this is given.
+    :type metrics_path: str | None
+    :param metrics_interval: The minimum number of seconds between metrics snapshots.
+    :type metrics_interval: float
+    :param profile_directory: Optional directory to save a profile of every shard to.
+    :type profile_directory: str | None
+    """
+    global _known_colors_memory, _known_colors, _shared_search_memory, _shared_search, _blend_model, _palette
+
+    _known_colors_memory = shared_memory.SharedMemory(name=name)
+    _known_colors = common.ColorSet(_known_colors_memory.buf)
+    if shared_search_name is not None:
+        _shared_search_memory = shared_memory.SharedMemory(name=shared_search_name)
+        _shared_search = search.view_shared_search(_shared_search_memory.buf)
+    _blend_model = common.get_blend_model(blend_model_name)
+    _palette = common.Palette.from_dict(palette_data) if palette_data is not None else common.DEFAULT_PALETTE
+    if metrics_path is not None and not metrics.is_enabled():
+        metrics.enable(metrics_path, metrics_interval, profile_directory)
+
+def search_shard(shard_index: int) -> tuple[int, int]:
+    """
+    Searches every color in a shard that isn't already known to be constructible and writes the
+    constructible ones to the shard's own file.
+
+    :param shard_index: The index of the shard. The shard covers the colors from
+    ``shard_index * SHARD_SIZE`` up to (but not including) ``(shard_index + 1) * SHARD_SIZE`` in
+    decimal form.
+    :type shard_index: int
+    :return: The number of colors searched and the number of those that are constructible.
+    :rtype: tuple[int, int]
+    """
+    with metrics.stage('search_shard'):
+        remaining_colors: np.ndarray = _known_colors.to_array(shard_index * SHARD_SIZE, (shard_index + 1) * SHARD_SIZE, missing=True)
+        searched_count: int = len(remaining_colors)
+        constructible_colors: list[int] = []
+        targets: Iterator[tuple[int, int, int]] = (common.decimal_to_rgb(decimal_color) for decimal_color in remaining_colors.tolist())
+        for target_rgb, solver_result in search.solve_many(targets, _blend_model, _palette, _shared_search):
+            if solver_result is not None:
+                constructible_colors.append(common.rgb_to_decimal(target_rgb))
+
+        if len(constructible_colors) > 0:
+            common.write_file_atomically(get_shard_path(shard_index), common.decimals_to_bytes(np.array(constructible_colors, dtype=np.uint32)))
+            metrics.count('writer.bytes_written', 3 * len(constructible_colors))
+
+    # Workers can be stopped without warning when the run ends, so every shard is recorded
+    metrics.count('combined.colors_searched', searched_count)
+    metrics.count('combined.new_colors', len(constructible_colors))
+    metrics.write_snapshot()
+    return searched_count, len(constructible_colors)
 
 if __name__ == '__main__':
-    with open(common.CONSTRUCTIBLE_COLORS_FILE_PATH, 'wb') as f:
-
-        constructible_count: int = 0
-
-        print(f'STAGE 1: Brute forcing every combination of up to {BRUTE_FORCE_DEPTH} layers...')
-        constructible_colors: set[int] = bruteforcer.get_constructible_colors_from_n_steps(BRUTE_FORCE_DEPTH, file=f)
-        constructible_count += len(constructible_colors)
-
-        print('')
-        print(f'STAGE 2: Randomly checking combinations of {RANDOM_SEARCH_DEPTH} layers...')
-        constructible_colors = bruteforcer.randomized_search_with_n_layers(
-            n=RANDOM_SEARCH_DEPTH,
-            cutoff_time=RANDOM_SEARCH_CUTOFF_TIME,
-            known_constructible_colors=constructible_colors,
-            file=f,
-        )
-        constructible_count = len(constructible_colors)
-
-        print('')
-        print('STAGE 3: Searching remaining colors...')
-        remaining_color_count: int = (1 << 24) - constructible_count
-        progress_bar: tqdm = tqdm(desc='Progress     ', total=remaining_color_count, ascii=(common.PY_IMPLEMENTATION == 'PyPy'))
-        constructible_bar: tqdm = tqdm(desc='Constructible', total=(1 << 24), ascii=(common.PY_IMPLEMENTATION == 'PyPy'))
-        unconstructible_bar: tqdm = tqdm(desc='Unconstruct. ', total=(1 << 24), ascii=(common.PY_IMPLEMENTATION == 'PyPy'))
-        constructible_bar.update(constructible_count)
-
-        for r in range(256):
-            for g in range(256):
-                for b in range(256):
-                    if (r, g, b) in constructible_colors:
-                        continue
-                    solver_result: list[search.SearchNode] | None = search.solve((r, g, b))
-                    progress_bar.update(1)
-                    if solver_result is None:
-                        unconstructible_bar.update(1)
-                    else:
-                        constructible_bar.update(1)
-                        constructible_colors.add(common.rgb_to_decimal((r, g, b)))
-                        constructible_count += 1
-                        f.write(common.rgb_to_bytes((r, g, b)))
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Searches for every constructible color.')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes to search remaining colors with (default: 1)')
+    parser.add_argument('--max-depth', type=int, default=FRONTIER_MAX_DEPTH, help='maximum number of layers for the breadth-first search (default: no limit)')
+    parser.add_argument('--resume', action='store_true', help='continue an interrupted run from its last checkpoint')
+    parser.add_argument('--blend-model', choices=[model.name for model in common.BLEND_MODELS], default=common.DEFAULT_BLEND_MODEL.name, help=f'formula used to blend layers (default: {common.DEFAULT_BLEND_MODEL.name})')
+    parser.add_argument('--palette', metavar='PATH', help='JSON file with the colors and opacities layers can have (default: PowerPoint\'s palette)')
+    parser.add_argument('--incremental', action='store_true', help=f'start the breadth-first search from the cached results of the largest subset of the palette in {frontier.REACHABILITY_CACHE_DIRECTORY}')
+    parser.add_argument('--no-cache', action='store_true', help=f'don\'t read or write {frontier.REACHABILITY_CACHE_DIRECTORY}')
+    parser.add_argument('--metrics', nargs='?', const=metrics.METRICS_FILE_PATH, metavar='PATH', help=f'append metrics snapshots as JSON lines to PATH (default: {metrics.METRICS_FILE_PATH})')
+    parser.add_argument('--metrics-interval', type=float, default=10.0, metavar='SECONDS', help='minimum number of seconds between metrics snapshots (default: 10)')
+    parser.add_argument('--profile', metavar='DIRECTORY', help='save a cProfile profile of every stage to DIRECTORY (needs --metrics)')
+    args: argparse.Namespace = parser.parse_args()
+    if args.profile is not None and args.metrics is None:
+        parser.error('--profile needs --metrics')
+    if args.metrics is not None:
+        metrics.enable(args.metrics, args.metrics_interval, args.profile)
+
+    palette: common.Palette = common.load_palette(args.palette) if args.palette is not None else common.DEFAULT_PALETTE
+    checkpoint_state: dict[str, Any] | None = None
+    if args.resume:
+        checkpoint_state = load_checkpoint()
+        if checkpoint_state is None:
+            print('No checkpoint found, starting from the beginning.')
+        else:
+            # The depth limit, blend model and palette can't change halfway through a run
+            args.max_depth = checkpoint_state['max_depth']
+            args.blend_model = checkpoint_state.get('blend_model', common.DEFAULT_BLEND_MODEL.name)
+            palette = common.Palette.from_dict(checkpoint_state['palette']) if 'palette' in checkpoint_state else common.DEFAULT_PALETTE
+            print(f'Resuming from stage {checkpoint_state["stage"]}.')
+            print('')
+    blend_model: common.BlendModel = common.get_blend_model(args.blend_model)
+
+    known_colors: common.ColorSet
+    reached_depth: int
+    completed_shard_indexes: set[int] = set()
+
+    if checkpoint_state is None or checkpoint_state['stage'] == 1:
+        if args.max_depth is None:
+            print('STAGE 1: Breadth-first searching every color reachable with any number of layers...')
+        else:
+            print(f'STAGE 1: Breadth-first searching every color reachable with up to {args.max_depth} layers...')
+
+        def save_stage_1_checkpoint(depths: np.ndarray, depth: int, cursor: int) -> None:
+            save_checkpoint({'stage': 1, 'max_depth': args.max_depth, 'blend_model': blend_model.name, 'palette': palette.to_dict(), 'depth': depth, 'cursor': cursor}, depths)
+
+        color_depths: np.ndarray
+        with metrics.stage('frontier'):
+            if checkpoint_state is None and args.no_cache:
+                color_depths = frontier.get_color_depths(args.max_depth, checkpoint=save_stage_1_checkpoint, checkpoint_interval=CHECKPOINT_INTERVAL, model=blend_model, palette=palette)
+            elif checkpoint_state is None:
+                # Palettes that were searched before come straight from the reachability cache
+                color_depths = frontier.get_cached_color_depths(
+                    args.max_depth,
+                    args.incremental,
+                    blend_model,
+                    palette,
+                    checkpoint=save_stage_1_checkpoint,
+                    checkpoint_interval=CHECKPOINT_INTERVAL,
+                )
+            else:
+                color_depths = frontier.get_color_depths(
+                    args.max_depth,
+                    resume_depths=np.fromfile(DEPTHS_CHECKPOINT_FILE_PATH, dtype=np.uint8),
+                    resume_depth=checkpoint_state['depth'],
+                    resume_cursor=checkpoint_state['cursor'],
+                    checkpoint=save_stage_1_checkpoint,
+                    checkpoint_interval=CHECKPOINT_INTERVAL,
+                    model=blend_model,
+                    palette=palette,
+                )
+                if not args.no_cache:
+                    frontier.save_reachability(color_depths, args.max_depth, blend_model, palette)
+        reached: np.ndarray = color_depths != frontier.UNREACHED
+        known_colors = common.ColorSet(np.packbits(reached, bitorder='little'))
+        reached_depth = int(color_depths[reached].max()) if args.max_depth is None else args.max_depth
+        common.save_constructible_colors(known_colors, depth=reached_depth, complete=(args.max_depth is None), model=blend_model, palette=palette)
+        save_checkpoint({'stage': 2, 'max_depth': args.max_depth, 'blend_model': blend_model.name, 'palette': palette.to_dict(), 'reached_depth': reached_depth, 'completed_shards': []})
+        if os.path.isfile(DEPTHS_CHECKPOINT_FILE_PATH):
+            os.remove(DEPTHS_CHECKPOINT_FILE_PATH)
+        del color_depths, reached
+    else:
+        # Stage 1 already finished and saved the colors it found
+        known_colors = common.ColorSet(bytearray(common.load_constructible_colors(model=blend_model, palette=palette).array.tobytes()))
+        reached_depth = checkpoint_state['reached_depth']
+        completed_shard_indexes = set(checkpoint_state['completed_shards'])
+
+    # Only shards with remaining colors need to be searched, and nothing is left to search when the
+    # frontier already found everything reachable
+    shard_indexes: list[int] = []
+    if args.max_depth is not None:
+        shard_indexes = np.flatnonzero((known_colors.array != 255).reshape(-1, SHARD_SIZE >> 3).any(axis=1)).tolist()
+
+    # Colors found by stage 2 are added to the constructible colors file as every shard finishes
+    writer: common.ResultWriter = common.ResultWriter(append=True, model=blend_model, palette=palette)
+
+    # Colors found by shards that finished before the run was interrupted are already in shard files
+    for shard_index in sorted(completed_shard_indexes):
+        shard_path: str = get_shard_path(shard_index)
+        if os.path.isfile(shard_path):
+            shard_colors: common.ColorSet = common.load_legacy_constructible_colors(shard_path)
+            known_colors.update(shard_colors)
+            writer.add_many(shard_colors.to_array())
+    remaining_shard_indexes: list[int] = [shard_index for shard_index in shard_indexes if shard_index not in completed_shard_indexes]
+    remaining_color_count: int = int(np.bitwise_count(~known_colors.array.reshape(-1, SHARD_SIZE >> 3)[remaining_shard_indexes]).sum())
+    constructible_count: int = len(known_colors)
+
+    print('')
+    if len(remaining_shard_indexes) > 0:
+        print(f'STAGE 2: Searching remaining colors with {args.workers} worker(s)...')
+    elif args.max_depth is None:
+        print('STAGE 2: Skipped, the breadth-first search already found every reachable color.')
+    else:
+        print('STAGE 2: Skipped, every shard was already searched.')
+
+    progress_bar: tqdm = tqdm(desc='Progress     ', total=remaining_color_count, ascii=(common.PY_IMPLEMENTATION == 'PyPy'))
+    constructible_bar: tqdm = tqdm(desc='Constructible', total=(1 << 24), ascii=(common.PY_IMPLEMENTATION == 'PyPy'))
+    unconstructible_bar: tqdm = tqdm(desc='Unconstruct. ', total=(1 << 24), ascii=(common.PY_IMPLEMENTATION == 'PyPy'))
+    constructible_bar.update(constructible_count)
+
+    known_colors_memory: shared_memory.SharedMemory = shared_memory.SharedMemory(create=True, size=common.BITSET_SIZE)
+    shared_search_memory: shared_memory.SharedMemory | None = None
+    try:
+        known_colors_memory.buf[:] = known_colors.array.tobytes()
+        if len(remaining_shard_indexes) > 0:
+            # The breadth-first search that search.solve_many() shares between targets is run once
+            # here instead of in every worker
+            shared_search_memory = shared_memory.SharedMemory(create=True, size=search.SHARED_SEARCH_SIZE)
+            search.build_shared_search(blend_model, palette, shared_search_memory.buf)
+        shared_search_name: str | None = shared_search_memory.name if shared_search_memory is not None else None
+
+        def finish_shard(shard_index: int, shard_result: tuple[int, int]) -> None:
+            global constructible_count
+
+            shard_searched_count, shard_constructible_count = shard_result
+            progress_bar.update(shard_searched_count)
+            constructible_bar.update(shard_constructible_count)
+            unconstructible_bar.update(shard_searched_count - shard_constructible_count)
+            constructible_count += shard_constructible_count
+
+            shard_path: str = get_shard_path(shard_index)
+            if os.path.isfile(shard_path):
+                writer.add_many(common.load_legacy_constructible_colors(shard_path).to_array(shard_index * SHARD_SIZE, (shard_index + 1) * SHARD_SIZE))
+            # The colors of the shard are on disk before the checkpoint records it as done
+            writer.checkpoint()
+            completed_shard_indexes.add(shard_index)
+            save_checkpoint({'stage': 2, 'max_depth': args.max_depth, 'blend_model': blend_model.name, 'palette': palette.to_dict(), 'reached_depth': reached_depth, 'completed_shards': sorted(completed_shard_indexes)})
+
+        if args.workers > 1:
+            worker_arguments: tuple[Any, ...] = (known_colors_memory.name, shared_search_name, blend_model.name, palette.to_dict(), args.metrics, args.metrics_interval, args.profile)
+            with ProcessPoolExecutor(max_workers=args.workers, initializer=initialize_worker, initargs=worker_arguments) as executor:
+                futures: dict[Future, int] = {executor.submit(search_shard, shard_index): shard_index for shard_index in remaining_shard_indexes}
+                for future in as_completed(futures):
+                    finish_shard(futures[future], future.result())
+        else:
+            initialize_worker(known_colors_memory.name, shared_search_name, blend_model.name, palette.to_dict(), args.metrics, args.metrics_interval, args.profile)
+            for shard_index in remaining_shard_indexes:
+                finish_shard(shard_index, search_shard(shard_index))
+            _known_colors = None
+            _known_colors_memory.close()
+            if _shared_search_memory is not None:
+                _shared_search = None
+                _shared_search_memory.close()
+    finally:
+        known_colors_memory.close()
+        known_colors_memory.unlink()
+        if shared_search_memory is not None:
+            shared_search_memory.close()
+            shared_search_memory.unlink()
+
+    progress_bar.close()
+    constructible_bar.close()
+    unconstructible_bar.close()
+
+    # The colors of every shard are already in the file
+    writer.close(depth=reached_depth, complete=True)
+    shard_paths: list[str] = [get_shard_path(shard_index) for shard_index in shard_indexes if os.path.isfile(get_shard_path(shard_index))]
+    remove_checkpoint()
+    for shard_path in shard_paths:
+        os.remove(shard_path)
+    metrics.disable()
 
     print(f'{constructible_count} / {1 << 24} ({constructible_count / (1 << 24):.3%}) colors constructible.')
     print(f'{(1 << 24) - constructible_count} / {1 << 24} ({1 - (constructible_count / (1 << 24)):.3%}) colors unconstructible.')
@@ -1,6 +1,15 @@
 from __future__ import annotations
 
+from typing import Iterable, Iterator, BinaryIO, Any
+import numpy as np
+import metrics
 import platform
+import hashlib
+import struct
+import json
+import time
+import abc
+import os
 
 # I don't own PowerPoint, so here is the image I used to extract these colors:
 # https://www.empowersuite.com/hs-fs/hubfs/Marketing/Blog/Snips/custom-color-palette-powerpoint-master3.png?width=477&name=custom-color-palette-powerpoint-master3.png
@@ -13,12 +22,34 @@ FULLY_OPAQUE_INDEX: int = BASE_OPACITIES.index(1)
 
 CONSTRUCTIBLE_COLORS_FILE_PATH: str = 'constructible_colors.dat'
 
+# Constructible colors files start with this header and are followed by a bitset with one bit per
+# color, where the color with decimal form d is bit (d & 7) of byte (d >> 3)
+# Fields: magic, format version, blend model id (see BlendModel), depth, flags, palette id (see
+# Palette; files from before palettes could be changed have 0 there, the id of the default palette)
+CONSTRUCTIBLE_COLORS_HEADER: struct.Struct = struct.Struct('<4sHHHHI')
+CONSTRUCTIBLE_COLORS_MAGIC: bytes = b'PPCC'
+CONSTRUCTIBLE_COLORS_VERSION: int = 1
+BITSET_SIZE: int = (1 << 24) >> 3
+# Set when every color missing from the file has been proven unconstructible
+COMPLETE_FLAG: int = 1
+
+# The color index file stores how every color can be constructed with as few layers as possible.
+# It starts with this header and is followed by one COLOR_INDEX_DTYPE entry per color in decimal
+# order, holding the minimum number of layers (255 if unconstructible), the color before the top
+# layer as 3 bytes, and the index of the top layer (see layer_to_index()).
+# Fields: magic, format version, blend model id (see BlendModel), palette id (see Palette)
+COLOR_INDEX_FILE_PATH: str = 'color_index.dat'
+COLOR_INDEX_HEADER: struct.Struct = struct.Struct('<4sHHI4x')
+COLOR_INDEX_MAGIC: bytes = b'PPCI'
+COLOR_INDEX_VERSION: int = 1
+COLOR_INDEX_DTYPE: np.dtype = np.dtype([('depth', np.uint8), ('previous', np.uint8, (3,)), ('layer', '<u2')])
+
 PY_IMPLEMENTATION: str = platform.python_implementation()
 
 
 
 def rgb_to_hex(rgb: tuple[int, int, int]) -> str:
-    return f'#{hex(rgb[0])[2:]:02}{hex(rgb[1])[2:]:02}{hex(rgb[2])[2:]:02}'
+    return f'#{rgb[0]:02x}{rgb[1]:02x}{rgb[2]:02x}'
 
 def rgb_to_decimal(rgb: tuple[int, int, int]) -> int:
     return (rgb[0] << 16) | (rgb[1] << 8) | rgb[2]
@@ -26,6 +57,10 @@ def rgb_to_decimal(rgb: tuple[int, int, int]) -> int:
 def rgb_to_bytes(rgb: tuple[int, int, int]) -> bytes:
     return rgb[0].to_bytes() + rgb[1].to_bytes() + rgb[2].to_bytes()
 
+def decimals_to_bytes(decimals: np.ndarray) -> bytes:
+    decimals = np.asarray(decimals, dtype=np.uint32)
+    return np.stack(((decimals >> 16) & 255, (decimals >> 8) & 255, decimals & 255), axis=-1).astype(np.uint8).tobytes()
+
 def decimal_to_rgb(decimal: int) -> tuple[int, int, int]:
     return (
         (decimal >> 16) & 255,
@@ -36,20 +71,299 @@ def decimal_to_rgb(decimal: int) -> tuple[int, int, int]:
 def bytes_to_rgb(data: bytes) -> tuple[int, int, int]:
     return data[0], data[1], data[2]
 
-def apply_layer(old_rgb: tuple[int, int, int] | None, layer: tuple[int, int]) -> tuple[int, int, int] | None:
+class Palette:
+    def __init__(self, colors: Iterable[tuple[int, int, int]], opacities: Iterable[float], name: str = 'custom'):
+        """
+        The colors and opacities layers can have. Palettes can't be changed once they are made, so
+        they can be passed around freely, and everything derived from them is cached by their hash.
+
+        :param colors: The colors of the layers, without repeats.
+        :type colors: Iterable[tuple[int, int, int]]
+        :param opacities: The opacities of the layers, without repeats, from 0 (exclusive) to 1. Must
+        include 1, because the bottom layer has to be opaque.
+        :type opacities: Iterable[float]
+        :param name: A short name for the palette.
+        :type name: str
+        """
+        colors = tuple((int(color[0]), int(color[1]), int(color[2])) for color in colors)
+        opacities = tuple(float(opacity) for opacity in opacities)
+        if len(colors) == 0:
+            raise ValueError('A palette needs at least one color')
+        if len(set(colors)) != len(colors) or len(set(opacities)) != len(opacities):
+            raise ValueError('Palette colors and opacities must not repeat')
+        if any(not 0 <= channel <= 255 for color in colors for channel in color):
+            raise ValueError('Palette color channels must be from 0 to 255')
+        if any(not 0 < opacity <= 1 for opacity in opacities) or 1 not in opacities:
+            raise ValueError('Palette opacities must be more than 0 and at most 1, and include 1')
+        # Layers are stored in 16 bits in color index files (see layer_to_index())
+        if len(colors) * len(opacities) > 1 << 16:
+            raise ValueError(f'A palette can have at most {1 << 16} layers, not {len(colors) * len(opacities)}')
+
+        self.name: str = name
+        self.colors: tuple[tuple[int, int, int], ...] = colors
+        self.opacities: tuple[float, ...] = opacities
+        self.color_indexes: tuple[int, ...] = tuple(range(len(colors)))
+        self.opacity_indexes: tuple[int, ...] = tuple(range(len(opacities)))
+        self.fully_opaque_index: int = opacities.index(1)
+        # Only the bottom layer needs to be opaque; an opaque layer anywhere else discards what is below it
+        self.non_opaque_indexes: tuple[int, ...] = tuple(index for index in self.opacity_indexes if index != self.fully_opaque_index)
+
+        # Every layer color only uses a few distinct channel values, so the blend of a single channel
+        # only depends on the old channel value, the layer channel value and the opacity
+        self.channel_values: tuple[int, ...] = tuple(sorted({channel for color in colors for channel in color}))
+        self.layer_channel_indexes: tuple[tuple[int, int, int], ...] = tuple(
+            (self.channel_values.index(color[0]), self.channel_values.index(color[1]), self.channel_values.index(color[2]))
+            for color in colors
+        )
+        self.layer_channel_index_array: np.ndarray = np.array(self.layer_channel_indexes, dtype=np.intp)
+        self.layer_channel_index_array.flags.writeable = False
+        self.color_decimals: np.ndarray = np.array([rgb_to_decimal(color) for color in colors], dtype=np.uint32)
+        self.color_decimals.flags.writeable = False
+
+        # The name isn't part of the hash, so renaming a palette keeps its cached results
+        self.hash: str = hashlib.sha256(json.dumps([colors, opacities]).encode()).hexdigest()
+        # The id stored in output files, which is 0 for the default palette like in files from before
+        # palettes could be changed
+        self.id: int = int(self.hash[:8], 16) or 1
+        if colors == tuple(BASE_COLORS) and opacities == tuple(BASE_OPACITIES):
+            self.id = 0
+
+        self._frozen: bool = True
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if getattr(self, '_frozen', False):
+            raise AttributeError(f'{type(self).__name__} objects can\'t be changed')
+        super().__setattr__(name, value)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Palette) and self.hash == other.hash
+
+    def __hash__(self) -> int:
+        return hash(self.hash)
+
+    def __repr__(self) -> str:
+        return f'Palette(name={self.name!r}, colors={len(self.colors)}, opacities={len(self.opacities)}, hash={self.hash[:12]!r})'
+
+    @property
+    def layer_count(self) -> int:
+        return len(self.colors) * len(self.opacities)
+
+    def is_subset_of(self, other: Palette) -> bool:
+        """
+        Checks whether every color and opacity of this palette is also in another palette, so every
+        layer of this palette is a layer of the other one.
+
+        :param other: The other palette.
+        :type other: Palette
+        :return: Whether this palette is a subset of the other one.
+        :rtype: bool
+        """
+        return set(self.colors) <= set(other.colors) and set(self.opacities) <= set(other.opacities)
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        Converts the palette to the format of palette files.
+
+        :return: A JSON-serializable dictionary with the name, the colors as hex codes and the
+        opacities.
+        :rtype: dict[str, Any]
+        """
+        return {
+            'name': self.name,
+            'colors': [rgb_to_hex(color) for color in self.colors],
+            'opacities': list(self.opacities),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Palette:
+        """
+        Reads a palette in the format of palette files.
+
+        :param data: A dictionary with the colors as hex codes like ``'#ff8000'`` or ``[r, g, b]``
+        lists, the opacities, and optionally a name.
+        :type data: dict[str, Any]
+        :return: The palette.
+        :rtype: Palette
+        """
+        colors: list[tuple[int, int, int]] = [
+            decimal_to_rgb(int(color.lstrip('#'), 16)) if isinstance(color, str) else tuple(color)
+            for color in data['colors']
+        ]
+        return cls(colors, data['opacities'], data.get('name', 'custom'))
+
+# The palette of PowerPoint's color picker, which is used unless another palette is given
+DEFAULT_PALETTE: Palette = Palette(BASE_COLORS, BASE_OPACITIES, 'powerpoint')
+
+def load_palette(path: str) -> Palette:
+    """
+    Loads a palette file, a JSON object like ``{"name": "...", "colors": ["#003366", ...],
+    "opacities": [0.05, ..., 1]}`` (see ``Palette.to_dict()``).
+
+    :param path: The path to the file.
+    :type path: str
+    :return: The palette.
+    :rtype: Palette
+    """
+    with open(path) as f:
+        data: Any = json.load(f)
+    try:
+        return Palette.from_dict(data)
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f'Palette file {path!r} is invalid ({e})') from e
+
+def save_palette(palette: Palette, path: str) -> None:
+    with open(path, 'w') as f:
+        json.dump(palette.to_dict(), f, indent=4)
+
+def layer_to_index(layer: tuple[int, int], palette: Palette = DEFAULT_PALETTE) -> int:
+    return layer[0] * len(palette.opacities) + layer[1]
+
+def index_to_layer(index: int, palette: Palette = DEFAULT_PALETTE) -> tuple[int, int]:
+    return index // len(palette.opacities), index % len(palette.opacities)
+
+class BlendModel(abc.ABC):
+    def __init__(self, blend_model_id: int, name: str):
+        """
+        A formula for the color of a single channel after applying a layer. PowerPoint's exact formula
+        is unknown, so several models are available. Every model is compiled to a channel table the
+        first time it is used, so all models are equally fast. Subclasses must implement ``blend()``.
+
+        :param blend_model_id: The id stored in output files so results from different models aren't
+        mixed. Must be unique.
+        :type blend_model_id: int
+        :param name: A short name for the model, used on the command line.
+        :type name: str
+        """
+        self.id: int = blend_model_id
+        self.name: str = name
+        # Channel tables are built the first time a palette is used, keyed by the palette hash
+        self._channel_tables: dict[str, np.ndarray] = {}
+        self._channel_table_rows: dict[str, list[list[bytes]]] = {}
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}(id={self.id}, name={self.name!r})'
+
+    @abc.abstractmethod
+    def blend(self, old_value: int, layer_value: int, layer_opacity: float) -> int:
+        """
+        Blends a single channel.
+
+        :param old_value: The channel value of the color the layer is being applied to.
+        :type old_value: int
+        :param layer_value: The channel value of the layer color.
+        :type layer_value: int
+        :param layer_opacity: The opacity of the layer, from 0 to 1.
+        :type layer_opacity: float
+        :return: The resulting channel value.
+        :rtype: int
+        """
+
+    def get_channel_table(self, palette: Palette = DEFAULT_PALETTE) -> np.ndarray:
+        # See build_channel_table()
+        if palette.hash not in self._channel_tables:
+            self._channel_tables[palette.hash] = build_channel_table(self, palette)
+        return self._channel_tables[palette.hash]
+
+    def get_channel_table_rows(self, palette: Palette = DEFAULT_PALETTE) -> list[list[bytes]]:
+        # The channel table as bytes, because indexing bytes is much faster than indexing numpy arrays
+        # one element at a time
+        if palette.hash not in self._channel_table_rows:
+            self._channel_table_rows[palette.hash] = [[row.tobytes() for row in rows] for rows in self.get_channel_table(palette)]
+        return self._channel_table_rows[palette.hash]
+
+    @property
+    def channel_table(self) -> np.ndarray:
+        # The channel table of the default palette
+        return self.get_channel_table()
+
+    @property
+    def channel_table_rows(self) -> list[list[bytes]]:
+        return self.get_channel_table_rows()
+
+class RoundHalfEvenBlendModel(BlendModel):
+    """
+    ``round(B + α * (L - B))`` in double precision, where halves are rounded to even like Python's
+    ``round()``. This is the default model.
+    """
+    def __init__(self):
+        super().__init__(0, 'round-half-even')
+
+    def blend(self, old_value: int, layer_value: int, layer_opacity: float) -> int:
+        return round(old_value + layer_opacity * (layer_value - old_value))
+
+class FixedPointBlendModel(BlendModel):
+    """
+    ``B + α * (L - B)`` in integer arithmetic with the opacity as a 16-bit fixed-point fraction, where
+    halves are rounded up.
+    """
+    FRACTION_BITS: int = 16
+
+    def __init__(self):
+        super().__init__(1, 'fixed-point')
+
+    def blend(self, old_value: int, layer_value: int, layer_opacity: float) -> int:
+        fixed_opacity: int = round(layer_opacity * (1 << self.FRACTION_BITS))
+        half: int = 1 << (self.FRACTION_BITS - 1)
+        return ((old_value << self.FRACTION_BITS) + fixed_opacity * (layer_value - old_value) + half) >> self.FRACTION_BITS
+
+class TruncatingBlendModel(BlendModel):
+    """
+    ``B + α * (L - B)`` in double precision, where the fractional part is dropped instead of rounded.
+    """
+    def __init__(self):
+        super().__init__(2, 'truncating')
+
+    def blend(self, old_value: int, layer_value: int, layer_opacity: float) -> int:
+        return int(old_value + layer_opacity * (layer_value - old_value))
+
+class Alpha8BlendModel(BlendModel):
+    """
+    ``(B * (255 - a) + L * a) / 255`` rounded to the nearest integer, where the opacity is first
+    quantized to an 8-bit alpha value ``a``, like in most 8-bit-per-channel image formats.
+    """
+    def __init__(self):
+        super().__init__(3, 'alpha8')
+
+    def blend(self, old_value: int, layer_value: int, layer_opacity: float) -> int:
+        alpha: int = round(layer_opacity * 255)
+        # 255 is odd, so there are never halves to round
+        return (old_value * (255 - alpha) + layer_value * alpha + 127) // 255
+
+BLEND_MODELS: list[BlendModel] = [RoundHalfEvenBlendModel(), FixedPointBlendModel(), TruncatingBlendModel(), Alpha8BlendModel()]
+DEFAULT_BLEND_MODEL: BlendModel = BLEND_MODELS[0]
+
+def get_blend_model(name: str) -> BlendModel:
+    """
+    Gets a blend model by its name.
+
+    :param name: The name of the model.
+    :type name: str
+    :return: The model.
+    :rtype: BlendModel
+    """
+    for model in BLEND_MODELS:
+        if model.name == name:
+            return model
+    raise ValueError(f'Unknown blend model {name!r}')
+
+def apply_layer(old_rgb: tuple[int, int, int] | None, layer: tuple[int, int], model: BlendModel = DEFAULT_BLEND_MODEL, palette: Palette = DEFAULT_PALETTE) -> tuple[int, int, int] | None:
     """
     Applies a layer to a color.
 
     :param old_rgb: The color the layer is being applied to, or None if dependent on the background color.
     :type old_rgb: tuple[int, int, int] | None
     :param layer: The layer to apply to the color as a tuple of two indexes. The first index is for the
-    BASE_COLORS list, and the other is for the BASE_OPACITIES list.
+    colors of the palette, and the other is for its opacities.
     :type layer: tuple[int, int]
+    :param model: The formula used to blend the layer.
+    :type model: BlendModel
+    :param palette: The colors and opacities layers can have.
+    :type palette: Palette
     :return: The resulting color, or None if dependent on the background color.
     :rtype: tuple[int, int, int] | None
     """
-    layer_color: tuple[int, int, int] = BASE_COLORS[layer[0]]
-    layer_opacity: float = BASE_OPACITIES[layer[1]]
+    layer_color: tuple[int, int, int] = palette.colors[layer[0]]
+    layer_opacity: float = palette.opacities[layer[1]]
 
     if old_rgb is None:
         if layer_opacity == 1:
@@ -62,10 +376,680 @@ def apply_layer(old_rgb: tuple[int, int, int] | None, layer: tuple[int, int]) ->
     # - 50% opacity #ffffff on top of 100% opacity #fefefe; expected: #fefefe, actual: #ffffff (what the f-string)
     # - 1% opacity #d4d4d4 (stacked a whole bunch) on top of 100% opacity #ffffff; expected: something close to #d4d4d4, actual: #dcdcdc (checks out)
     # - 1% opacity #d5d5d5 (stacked a whole bunch) on top of 100% opacity #ffffff; expected: something close to #d5d5d5, actual: #ffffff, but only in Firefox (????)
+    # Every BlendModel is an attempt at matching this behavior
     result: tuple[int, int, int] = (
-        round(old_rgb[0] + layer_opacity * (layer_color[0] - old_rgb[0])),
-        round(old_rgb[1] + layer_opacity * (layer_color[1] - old_rgb[1])),
-        round(old_rgb[2] + layer_opacity * (layer_color[2] - old_rgb[2])),
+        model.blend(old_rgb[0], layer_color[0], layer_opacity),
+        model.blend(old_rgb[1], layer_color[1], layer_opacity),
+        model.blend(old_rgb[2], layer_color[2], layer_opacity),
     )
 
     return result
+
+class ColorSet:
+    def __init__(self, bits: bytearray | memoryview | np.ndarray | None = None):
+        """
+        A set of colors stored as a bitset with one bit per color, so it always takes 2 MiB no matter
+        how many colors it holds. The color with decimal form d is bit (d & 7) of byte (d >> 3).
+
+        :param bits: Optional buffer of BITSET_SIZE bytes to use as the bitset without copying it, such
+        as a memory-mapped file or shared memory. An empty set is created if not provided.
+        :type bits: bytearray | memoryview | np.ndarray | None
+        """
+        if bits is None:
+            bits = bytearray(BITSET_SIZE)
+        self.array: np.ndarray = np.frombuffer(bits, dtype=np.uint8) if not isinstance(bits, np.ndarray) else bits
+        if len(self.array) != BITSET_SIZE:
+            raise ValueError(f'Color set bitset must be {BITSET_SIZE} bytes, not {len(self.array)}')
+        # Indexing a bytearray or memoryview one byte at a time is much faster than indexing numpy arrays
+        self.bits: bytearray | memoryview = bits if isinstance(bits, bytearray) else memoryview(self.array)
+        self._length: int = int(np.bitwise_count(self.array).sum(dtype=np.int64))
+
+    @classmethod
+    def from_decimals(cls, decimals: np.ndarray | list[int]) -> ColorSet:
+        color_set: ColorSet = cls()
+        color_set.add_many(decimals)
+        return color_set
+
+    def __repr__(self) -> str:
+        return f'ColorSet(len={self._length})'
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __contains__(self, color: int | tuple[int, int, int]) -> bool:
+        if isinstance(color, tuple):
+            color = rgb_to_decimal(color)
+        return bool((self.bits[color >> 3] >> (color & 7)) & 1)
+
+    def contains_many(self, decimals: np.ndarray) -> np.ndarray:
+        """
+        Checks which colors in an array are in the set at once.
+
+        :param decimals: The colors in decimal form.
+        :type decimals: np.ndarray
+        :return: A boolean array that is True for every color in the set.
+        :rtype: np.ndarray
+        """
+        decimals = np.asarray(decimals, dtype=np.uint32)
+        return ((self.array[decimals >> 3] >> (decimals & 7)) & 1).astype(bool)
+
+    def __iter__(self) -> Iterator[int]:
+        for start in range(0, 1 << 24, 1 << 20):
+            yield from self.to_array(start, start + (1 << 20)).tolist()
+
+    def __or__(self, other: ColorSet) -> ColorSet:
+        result: ColorSet = self.copy()
+        result.update(other)
+        return result
+
+    def add(self, color: int | tuple[int, int, int]) -> bool:
+        """
+        Adds a color to the set.
+
+        :param color: The color in decimal or RGB form.
+        :type color: int | tuple[int, int, int]
+        :return: True if the color wasn't already in the set.
+        :rtype: bool
+        """
+        if isinstance(color, tuple):
+            color = rgb_to_decimal(color)
+        index: int = color >> 3
+        byte: int = self.bits[index]
+        mask: int = 1 << (color & 7)
+        if byte & mask:
+            return False
+        self.bits[index] = byte | mask
+        self._length += 1
+        return True
+
+    def add_many(self, decimals: np.ndarray | list[int]) -> int:
+        """
+        Adds an array of colors to the set at once.
+
+        :param decimals: The colors in decimal form.
+        :type decimals: np.ndarray | list[int]
+        :return: The number of colors that weren't already in the set.
+        :rtype: int
+        """
+        decimals = np.asarray(decimals, dtype=np.uint32)
+        # Only the bytes that change need to be recounted
+        byte_indexes: np.ndarray = np.unique(decimals >> 3)
+        old_count: int = int(np.bitwise_count(self.array[byte_indexes]).sum(dtype=np.int64))
+        np.bitwise_or.at(self.array, decimals >> 3, (1 << (decimals & 7)).astype(np.uint8))
+        added_count: int = int(np.bitwise_count(self.array[byte_indexes]).sum(dtype=np.int64)) - old_count
+        self._length += added_count
+        return added_count
+
+    def update(self, other: ColorSet) -> int:
+        """
+        Adds every color from another set to this set.
+
+        :param other: The other set.
+        :type other: ColorSet
+        :return: The number of colors that weren't already in this set.
+        :rtype: int
+        """
+        self.array |= other.array
+        return self._recount()
+
+    def copy(self) -> ColorSet:
+        return ColorSet(bytearray(self.array.tobytes()))
+
+    def to_array(self, start: int = 0, stop: int = 1 << 24, missing: bool = False) -> np.ndarray:
+        """
+        Gets the colors in the set (or missing from it) in a range of colors.
+
+        :param start: The first color of the range in decimal form. Must be a multiple of 8.
+        :type start: int
+        :param stop: The end of the range in decimal form (exclusive). Must be a multiple of 8.
+        :type stop: int
+        :param missing: Whether to get the colors missing from the set instead.
+        :type missing: bool
+        :return: A uint32 array of the colors in decimal form, in ascending order.
+        :rtype: np.ndarray
+        """
+        colors: np.ndarray = np.unpackbits(self.array[start >> 3:stop >> 3], bitorder='little').view(bool)
+        if missing:
+            colors = ~colors
+        return np.flatnonzero(colors).astype(np.uint32) + np.uint32(start)
+
+    def missing(self) -> Iterator[int]:
+        """
+        Iterates over every color that isn't in the set in ascending order.
+
+        :return: An iterator of the missing colors in decimal form.
+        :rtype: Iterator[int]
+        """
+        for start in range(0, 1 << 24, 1 << 20):
+            yield from self.to_array(start, start + (1 << 20), missing=True).tolist()
+
+    def _recount(self) -> int:
+        old_length: int = self._length
+        self._length = int(np.bitwise_count(self.array).sum(dtype=np.int64))
+        return self._length - old_length
+
+def write_file_atomically(path: str, data: bytes) -> None:
+    """
+    Writes a file by writing a temporary file first and then replacing the file with it, so the file
+    is never left half-written if the program stops.
+
+    :param path: The path to the file.
+    :type path: str
+    :param data: The new contents of the file.
+    :type data: bytes
+    """
+    temporary_path: str = f'{path}.tmp'
+    with open(temporary_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_path, path)
+
+def read_constructible_colors_header(path: str = CONSTRUCTIBLE_COLORS_FILE_PATH) -> tuple[int, int, int, int, int] | None:
+    """
+    Reads the header of a constructible colors file.
+
+    :param path: The path to the file.
+    :type path: str
+    :return: The format version, blend model id, depth, flags and palette id, or None if the file is
+    in the legacy format (a stream of 3-byte colors).
+    :rtype: tuple[int, int, int, int, int] | None
+    """
+    with open(path, 'rb') as f:
+        header: bytes = f.read(CONSTRUCTIBLE_COLORS_HEADER.size)
+    if len(header) < CONSTRUCTIBLE_COLORS_HEADER.size or not header.startswith(CONSTRUCTIBLE_COLORS_MAGIC):
+        return None
+    _, version, blend_model_id, depth, flags, palette_id = CONSTRUCTIBLE_COLORS_HEADER.unpack(header)
+    return version, blend_model_id, depth, flags, palette_id
+
+def load_legacy_constructible_colors(path: str) -> ColorSet:
+    """
+    Loads a legacy constructible colors file, which is a stream of colors in 3-byte form.
+
+    :param path: The path to the file.
+    :type path: str
+    :return: The colors in the file.
+    :rtype: ColorSet
+    """
+    data: np.ndarray = np.fromfile(path, dtype=np.uint8)
+    if len(data) % 3 != 0:
+        raise ValueError(f'Legacy constructible colors file {path!r} is corrupted')
+    data = data.reshape(-1, 3).astype(np.uint32)
+    return ColorSet.from_decimals((data[:, 0] << 16) | (data[:, 1] << 8) | data[:, 2])
+
+def load_constructible_colors(path: str = CONSTRUCTIBLE_COLORS_FILE_PATH, writable: bool = False, model: BlendModel = DEFAULT_BLEND_MODEL, palette: Palette = DEFAULT_PALETTE) -> ColorSet:
+    """
+    Loads a constructible colors file. Files in the bitset format are memory-mapped instead of being
+    read, and legacy files are converted in memory.
+
+    :param path: The path to the file.
+    :type path: str
+    :param writable: Whether changes to the set should be written back to the file. Only supported
+    for files in the bitset format.
+    :type writable: bool
+    :param model: The blend model the file must have been made with. Legacy files were always made
+    with the default model.
+    :type model: BlendModel
+    :param palette: The palette the file must have been made with. Legacy files were always made with
+    the default palette.
+    :type palette: Palette
+    :return: The colors in the file.
+    :rtype: ColorSet
+    """
+    header: tuple[int, int, int, int, int] | None = read_constructible_colors_header(path)
+    if header is None:
+        if writable:
+            raise ValueError(f'Legacy constructible colors file {path!r} must be converted before writing to it')
+        if model is not DEFAULT_BLEND_MODEL:
+            raise ValueError(f'Legacy constructible colors file {path!r} was made with blend model {DEFAULT_BLEND_MODEL.name!r}, not {model.name!r}')
+        if palette != DEFAULT_PALETTE:
+            raise ValueError(f'Legacy constructible colors file {path!r} was made with palette {DEFAULT_PALETTE.name!r}, not {palette.name!r}')
+        return load_legacy_constructible_colors(path)
+
+    version, blend_model_id, _, _, palette_id = header
+    if version != CONSTRUCTIBLE_COLORS_VERSION:
+        raise ValueError(f'Constructible colors file {path!r} has unsupported version {version}')
+    if blend_model_id != model.id:
+        raise ValueError(f'Constructible colors file {path!r} was made with blend model {blend_model_id}, not {model.id} ({model.name!r})')
+    if palette_id != palette.id:
+        raise ValueError(f'Constructible colors file {path!r} was made with palette {palette_id:08x}, not {palette.id:08x} ({palette.name!r})')
+    if os.path.getsize(path) != CONSTRUCTIBLE_COLORS_HEADER.size + BITSET_SIZE:
+        raise ValueError(f'Constructible colors file {path!r} is corrupted')
+    return ColorSet(np.memmap(path, dtype=np.uint8, mode=('r+' if writable else 'r'), offset=CONSTRUCTIBLE_COLORS_HEADER.size, shape=(BITSET_SIZE,)))
+
+def save_constructible_colors(colors: ColorSet, path: str = CONSTRUCTIBLE_COLORS_FILE_PATH, depth: int = 0, complete: bool = False, model: BlendModel = DEFAULT_BLEND_MODEL, palette: Palette = DEFAULT_PALETTE) -> None:
+    """
+    Saves a set of constructible colors. The file is replaced atomically, so it is never left
+    half-written.
+
+    :param colors: The constructible colors.
+    :type colors: ColorSet
+    :param path: The path to the file.
+    :type path: str
+    :param depth: Every color that can be constructed with up to this many layers is in the set, or 0
+    if unknown.
+    :type depth: int
+    :param complete: Whether every color missing from the set is proven unconstructible.
+    :type complete: bool
+    :param model: The blend model the colors were found with.
+    :type model: BlendModel
+    :param palette: The palette the colors were found with.
+    :type palette: Palette
+    """
+    header: bytes = CONSTRUCTIBLE_COLORS_HEADER.pack(
+        CONSTRUCTIBLE_COLORS_MAGIC,
+        CONSTRUCTIBLE_COLORS_VERSION,
+        model.id,
+        depth,
+        COMPLETE_FLAG if complete else 0,
+        palette.id,
+    )
+    write_file_atomically(path, header + colors.array.tobytes())
+
+class ResultWriter:
+    def __init__(
+        self,
+        path: str = CONSTRUCTIBLE_COLORS_FILE_PATH,
+        bitset: bool = True,
+        buffer_size: int = 1 << 16,
+        flush_interval: float = 10.0,
+        append: bool = False,
+        model: BlendModel = DEFAULT_BLEND_MODEL,
+        palette: Palette = DEFAULT_PALETTE,
+    ):
+        """
+        Writes newly found constructible colors to a file in large chunks instead of one at a time.
+        Colors are collected in a preallocated buffer, which is written out when it is full or when
+        ``flush_interval`` seconds have passed since it was last written. Call ``close()`` (or use the
+        writer in a ``with`` statement) to write the rest.
+
+        :param path: The path to the file.
+        :type path: str
+        :param bitset: Whether to write the bitset format, by updating the memory-mapped file in
+        place, or the legacy format (a stream of 3-byte colors), which is only ever appended to.
+        :type bitset: bool
+        :param buffer_size: The number of colors to collect before writing them.
+        :type buffer_size: int
+        :param flush_interval: The maximum number of seconds to hold colors before writing them.
+        :type flush_interval: float
+        :param append: Whether to keep the colors already in the file instead of starting a new file.
+        :type append: bool
+        :param model: The blend model the colors are found with. The legacy format can't record it,
+        so it only supports the default model.
+        :type model: BlendModel
+        :param palette: The palette the colors are found with. Like the blend model, the legacy format
+        only supports the default palette.
+        :type palette: Palette
+        """
+        self.path: str = path
+        self.bitset: bool = bitset
+        self.flush_interval: float = flush_interval
+        self.model: BlendModel = model
+        self.palette: Palette = palette
+        self.buffer: np.ndarray = np.empty(buffer_size, dtype=np.uint32)
+        self.count: int = 0
+        self.time_of_last_flush: float = time.monotonic()
+        self.closed: bool = False
+
+        self.colors: ColorSet | None = None
+        self.file: BinaryIO | None = None
+        if bitset:
+            if not append or not os.path.isfile(path):
+                save_constructible_colors(ColorSet(), path, model=model, palette=palette)
+            self.colors = load_constructible_colors(path, writable=True, model=model, palette=palette)
+        else:
+            if model is not DEFAULT_BLEND_MODEL:
+                raise ValueError(f'The legacy format can only be written with blend model {DEFAULT_BLEND_MODEL.name!r}')
+            if palette != DEFAULT_PALETTE:
+                raise ValueError(f'The legacy format can only be written with palette {DEFAULT_PALETTE.name!r}')
+            # Unbuffered, so every flush is a single write
+            self.file = open(path, 'ab' if append else 'wb', buffering=0)
+
+    def __enter__(self) -> ResultWriter:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def add(self, color: int | tuple[int, int, int]) -> None:
+        """
+        Adds a color to the buffer.
+
+        :param color: The color in decimal form (a Python or numpy integer) or as an RGB tuple.
+        :type color: int | tuple[int, int, int]
+        """
+        if not isinstance(color, (int, np.integer)):
+            color = rgb_to_decimal(color)
+        self.buffer[self.count] = color
+        self.count += 1
+        if self.count == len(self.buffer) or time.monotonic() - self.time_of_last_flush >= self.flush_interval:
+            self.flush()
+
+    def add_many(self, decimals: np.ndarray | list[int]) -> None:
+        """
+        Adds an array of colors to the buffer at once.
+
+        :param decimals: The colors in decimal form.
+        :type decimals: np.ndarray | list[int]
+        """
+        decimals = np.asarray(decimals, dtype=np.uint32)
+        while len(decimals) > 0:
+            chunk: np.ndarray = decimals[:len(self.buffer) - self.count]
+            self.buffer[self.count:self.count + len(chunk)] = chunk
+            self.count += len(chunk)
+            decimals = decimals[len(chunk):]
+            if self.count == len(self.buffer):
+                self.flush()
+        if time.monotonic() - self.time_of_last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes the colors in the buffer to the file. They might only be in the operating system's
+        cache until ``checkpoint()`` is called.
+        """
+        if self.count > 0:
+            if self.bitset:
+                self.colors.add_many(self.buffer[:self.count])
+            else:
+                # The bitset is written by the operating system, so only this format counts bytes
+                metrics.count('writer.bytes_written', self.file.write(decimals_to_bytes(self.buffer[:self.count])))
+            metrics.count('writer.colors_written', self.count)
+            self.count = 0
+        self.time_of_last_flush = time.monotonic()
+
+    def checkpoint(self) -> None:
+        """
+        Writes the colors in the buffer to the file and waits until everything written so far is
+        stored on disk.
+        """
+        self.flush()
+        if self.bitset:
+            self.colors.array.flush()
+        else:
+            os.fsync(self.file.fileno())
+
+    def close(self, depth: int = 0, complete: bool = False) -> None:
+        """
+        Writes the remaining colors and closes the file. Closing a writer more than once does nothing.
+
+        :param depth: For the bitset format, every color that can be constructed with up to this many
+        layers is in the file, or 0 if unknown.
+        :type depth: int
+        :param complete: For the bitset format, whether every color missing from the file is proven
+        unconstructible.
+        :type complete: bool
+        """
+        if self.closed:
+            return
+        self.checkpoint()
+        if self.bitset:
+            header: bytes = CONSTRUCTIBLE_COLORS_HEADER.pack(
+                CONSTRUCTIBLE_COLORS_MAGIC,
+                CONSTRUCTIBLE_COLORS_VERSION,
+                self.model.id,
+                depth,
+                COMPLETE_FLAG if complete else 0,
+                self.palette.id,
+            )
+            self.colors = None
+            with open(self.path, 'r+b') as f:
+                f.write(header)
+                f.flush()
+                os.fsync(f.fileno())
+        else:
+            self.file.close()
+        self.closed = True
+
+class ConstructibleColorsReader:
+    def __init__(self, path: str = CONSTRUCTIBLE_COLORS_FILE_PATH, model: BlendModel = DEFAULT_BLEND_MODEL, shards: bool = True, palette: Palette = DEFAULT_PALETTE):
+        """
+        Follows a constructible colors file while another process is still writing to it, like
+        ``tail -f``. Every call to ``refresh()`` only reads what can have changed since the last one:
+        the bytes appended to a legacy file, the memory-mapped bitset of a bitset file (which is
+        mapped again if the file is replaced) and shard files that haven't been read yet. Colors are
+        never removed from ``colors``.
+
+        :param path: The path to the file. It doesn't have to exist yet.
+        :type path: str
+        :param model: The blend model the file must have been made with.
+        :type model: BlendModel
+        :param shards: Whether to also read the shard files ``combined.py`` writes next to the file
+        during its second stage. Each one is written atomically, so it is only read once.
+        :type shards: bool
+        :param palette: The palette the file must have been made with.
+        :type palette: Palette
+        """
+        self.path: str = path
+        self.model: BlendModel = model
+        self.shards: bool = shards
+        self.palette: Palette = palette
+        self.colors: ColorSet = ColorSet()
+        # The header of a bitset file, or None for a legacy file (or no file)
+        self.header: tuple[int, int, int, int, int] | None = None
+
+        self._file_id: tuple[int, int] | None = None
+        self._mapped_colors: ColorSet | None = None
+        # How far a legacy file has been read, and the start of a color that was only partly written
+        self._offset: int = 0
+        self._partial_color: bytes = b''
+        self._read_shard_paths: set[str] = set()
+
+    def refresh(self) -> int:
+        """
+        Reads the colors written since the last call.
+
+        :return: The number of colors that weren't read before.
+        :rtype: int
+        """
+        new_color_count: int = 0
+
+        if os.path.isfile(self.path):
+            stat: os.stat_result = os.stat(self.path)
+            file_id: tuple[int, int] = (stat.st_dev, stat.st_ino)
+            if file_id != self._file_id or stat.st_size < self._offset:
+                # A new file, or the file was replaced
+                self._file_id = file_id
+                self.header = read_constructible_colors_header(self.path)
+                self._offset = 0
+                self._partial_color = b''
+                self._mapped_colors = None
+                if self.header is not None:
+                    self._mapped_colors = load_constructible_colors(self.path, model=self.model, palette=self.palette)
+                elif self.model is not DEFAULT_BLEND_MODEL:
+                    raise ValueError(f'Legacy constructible colors file {self.path!r} was made with blend model {DEFAULT_BLEND_MODEL.name!r}, not {self.model.name!r}')
+                elif self.palette != DEFAULT_PALETTE:
+                    raise ValueError(f'Legacy constructible colors file {self.path!r} was made with palette {DEFAULT_PALETTE.name!r}, not {self.palette.name!r}')
+
+            if self._mapped_colors is not None:
+                new_color_count += self.colors.update(self._mapped_colors)
+            else:
+                with open(self.path, 'rb') as f:
+                    f.seek(self._offset)
+                    data: bytes = f.read()
+                self._offset += len(data)
+                data = self._partial_color + data
+                complete_length: int = len(data) - len(data) % 3
+                self._partial_color = data[complete_length:]
+                channels: np.ndarray = np.frombuffer(data, dtype=np.uint8, count=complete_length).reshape(-1, 3).astype(np.uint32)
+                new_color_count += self.colors.add_many((channels[:, 0] << 16) | (channels[:, 1] << 8) | channels[:, 2])
+
+        if self.shards:
+            directory: str = os.path.dirname(self.path) or '.'
+            shard_prefix: str = f'{os.path.basename(self.path)}.shard'
+            for file_name in os.listdir(directory):
+                # Temporary files from write_file_atomically() end with .tmp
+                if not file_name.startswith(shard_prefix) or not file_name[len(shard_prefix):].isdigit():
+                    continue
+                shard_path: str = os.path.join(directory, file_name)
+                if shard_path in self._read_shard_paths:
+                    continue
+                try:
+                    new_color_count += self.colors.update(load_legacy_constructible_colors(shard_path))
+                except FileNotFoundError:
+                    # Shards are merged into the file and removed at the end of a run
+                    continue
+                self._read_shard_paths.add(shard_path)
+
+        return new_color_count
+
+def convert_legacy_constructible_colors(legacy_path: str, path: str = CONSTRUCTIBLE_COLORS_FILE_PATH) -> None:
+    """
+    Converts a legacy constructible colors file (a stream of 3-byte colors) to the bitset format.
+
+    :param legacy_path: The path to the legacy file.
+    :type legacy_path: str
+    :param path: The path to write the converted file to. May be the same as ``legacy_path``.
+    :type path: str
+    """
+    save_constructible_colors(load_legacy_constructible_colors(legacy_path), path)
+
+def save_color_index(depths: np.ndarray, predecessors: np.ndarray, path: str = COLOR_INDEX_FILE_PATH, model: BlendModel = DEFAULT_BLEND_MODEL, palette: Palette = DEFAULT_PALETTE) -> None:
+    """
+    Saves a color index built by a breadth-first search.
+
+    :param depths: The minimum number of layers for every color, or 255 if unconstructible.
+    :type depths: np.ndarray
+    :param predecessors: How every color was reached, as ``(previous_color << 16) | layer_index``.
+    :type predecessors: np.ndarray
+    :param path: The path to the file.
+    :type path: str
+    :param model: The blend model used by the breadth-first search.
+    :type model: BlendModel
+    :param palette: The palette used by the breadth-first search.
+    :type palette: Palette
+    """
+    entries: np.ndarray = np.zeros(1 << 24, dtype=COLOR_INDEX_DTYPE)
+    entries['depth'] = depths
+    previous_colors: np.ndarray = predecessors >> 16
+    for channel, shift in enumerate((16, 8, 0)):
+        entries['previous'][:, channel] = (previous_colors >> shift) & 255
+    entries['layer'] = predecessors & 0xffff
+    header: bytes = COLOR_INDEX_HEADER.pack(COLOR_INDEX_MAGIC, COLOR_INDEX_VERSION, model.id, palette.id)
+    write_file_atomically(path, header + entries.tobytes())
+
+def load_color_index(path: str = COLOR_INDEX_FILE_PATH, model: BlendModel = DEFAULT_BLEND_MODEL, palette: Palette = DEFAULT_PALETTE) -> np.ndarray:
+    """
+    Memory-maps a color index file, so loading it is instant and the memory is shared between every
+    process that loads it.
+
+    :param path: The path to the file.
+    :type path: str
+    :param model: The blend model the index must have been made with.
+    :type model: BlendModel
+    :param palette: The palette the index must have been made with.
+    :type palette: Palette
+    :return: A read-only array of COLOR_INDEX_DTYPE entries indexed by colors in decimal form.
+    :rtype: np.ndarray
+    """
+    with open(path, 'rb') as f:
+        header: bytes = f.read(COLOR_INDEX_HEADER.size)
+    if len(header) < COLOR_INDEX_HEADER.size or not header.startswith(COLOR_INDEX_MAGIC):
+        raise ValueError(f'{path!r} is not a color index file')
+    _, version, blend_model_id, palette_id = COLOR_INDEX_HEADER.unpack(header)
+    if version != COLOR_INDEX_VERSION:
+        raise ValueError(f'Color index file {path!r} has unsupported version {version}')
+    if blend_model_id != model.id:
+        raise ValueError(f'Color index file {path!r} was made with blend model {blend_model_id}, not {model.id} ({model.name!r})')
+    if palette_id != palette.id:
+        raise ValueError(f'Color index file {path!r} was made with palette {palette_id:08x}, not {palette.id:08x} ({palette.name!r})')
+    if os.path.getsize(path) != COLOR_INDEX_HEADER.size + (1 << 24) * COLOR_INDEX_DTYPE.itemsize:
+        raise ValueError(f'Color index file {path!r} is corrupted')
+    return np.memmap(path, dtype=COLOR_INDEX_DTYPE, mode='r', offset=COLOR_INDEX_HEADER.size, shape=(1 << 24,))
+
+def build_channel_table(model: BlendModel = DEFAULT_BLEND_MODEL, palette: Palette = DEFAULT_PALETTE) -> np.ndarray:
+    """
+    Precomputes the result of blending every possible old channel value with every distinct layer
+    channel value at every opacity. Use ``model.get_channel_table(palette)`` instead to only build it
+    once.
+
+    :param model: The formula used to blend the layers.
+    :type model: BlendModel
+    :param palette: The colors and opacities layers can have.
+    :type palette: Palette
+    :return: A uint8 array indexed by ``[opacity_index, channel_value_index, old_value]``, where
+    ``channel_value_index`` indexes into ``palette.channel_values``.
+    :rtype: np.ndarray
+    """
+    table: np.ndarray = np.empty((len(palette.opacities), len(palette.channel_values), 256), dtype=np.uint8)
+    for opacity_index, layer_opacity in enumerate(palette.opacities):
+        for value_index, layer_value in enumerate(palette.channel_values):
+            table[opacity_index, value_index] = [model.blend(old_value, layer_value, layer_opacity) for old_value in range(256)]
+    return table
+
+def apply_layer_decimal(old_decimal: int, layer: tuple[int, int], model: BlendModel = DEFAULT_BLEND_MODEL, palette: Palette = DEFAULT_PALETTE) -> int:
+    """
+    Applies a layer to a color in decimal form using the precomputed channel table. This gives the
+    same result as ``apply_layer()`` but is much faster.
+
+    :param old_decimal: The color the layer is being applied to in decimal form.
+    :type old_decimal: int
+    :param layer: The layer to apply to the color as a tuple of two indexes. The first index is for the
+    colors of the palette, and the other is for its opacities.
+    :type layer: tuple[int, int]
+    :param model: The formula used to blend the layer.
+    :type model: BlendModel
+    :param palette: The colors and opacities layers can have.
+    :type palette: Palette
+    :return: The resulting color in decimal form.
+    :rtype: int
+    """
+    rows: list[bytes] = model.get_channel_table_rows(palette)[layer[1]]
+    value_indexes: tuple[int, int, int] = palette.layer_channel_indexes[layer[0]]
+    return (
+        (rows[value_indexes[0]][(old_decimal >> 16) & 255] << 16)
+        | (rows[value_indexes[1]][(old_decimal >> 8) & 255] << 8)
+        | rows[value_indexes[2]][old_decimal & 255]
+    )
+
+def apply_layer_batch(colors: np.ndarray, layer: tuple[int, int], model: BlendModel = DEFAULT_BLEND_MODEL, palette: Palette = DEFAULT_PALETTE) -> np.ndarray:
+    """
+    Applies a layer to an entire array of colors at once using the precomputed channel table. This
+    gives the same results as calling ``apply_layer()`` on every color.
+
+    :param colors: The colors the layer is being applied to in decimal form (packed 24-bit colors).
+    :type colors: np.ndarray
+    :param layer: The layer to apply to the colors as a tuple of two indexes. The first index is for
+    the colors of the palette, and the other is for its opacities.
+    :type layer: tuple[int, int]
+    :param model: The formula used to blend the layer.
+    :type model: BlendModel
+    :param palette: The colors and opacities layers can have.
+    :type palette: Palette
+    :return: A uint32 array of the resulting colors in decimal form.
+    :rtype: np.ndarray
+    """
+    colors = np.asarray(colors, dtype=np.uint32)
+    rows: np.ndarray = model.get_channel_table(palette)[layer[1]]
+    value_indexes: tuple[int, int, int] = palette.layer_channel_indexes[layer[0]]
+    r: np.ndarray = rows[value_indexes[0]][(colors >> 16) & 255].astype(np.uint32)
+    g: np.ndarray = rows[value_indexes[1]][(colors >> 8) & 255].astype(np.uint32)
+    b: np.ndarray = rows[value_indexes[2]][colors & 255].astype(np.uint32)
+    return (r << 16) | (g << 8) | b
+
+
+def apply_layers_batch(colors: np.ndarray, color_indexes: np.ndarray, opacity_indexes: np.ndarray, model: BlendModel = DEFAULT_BLEND_MODEL, palette: Palette = DEFAULT_PALETTE) -> np.ndarray:
+    """
+    Applies a different layer to every color in an array at once using the precomputed channel table.
+
+    :param colors: The colors the layers are being applied to in decimal form (packed 24-bit colors).
+    :type colors: np.ndarray
+    :param color_indexes: The index into the colors of the palette of the layer applied to each color.
+    :type color_indexes: np.ndarray
+    :param opacity_indexes: The index into the opacities of the palette of the layer applied to each
+    color.
+    :type opacity_indexes: np.ndarray
+    :param model: The formula used to blend the layers.
+    :type model: BlendModel
+    :param palette: The colors and opacities layers can have.
+    :type palette: Palette
+    :return: A uint32 array of the resulting colors in decimal form.
+    :rtype: np.ndarray
+    """
+    colors = np.asarray(colors, dtype=np.uint32)
+    table: np.ndarray = model.get_channel_table(palette)
+    value_indexes: np.ndarray = palette.layer_channel_index_array[color_indexes]
+    r: np.ndarray = table[opacity_indexes, value_indexes[:, 0], (colors >> 16) & 255].astype(np.uint32)
+    g: np.ndarray = table[opacity_indexes, value_indexes[:, 1], (colors >> 8) & 255].astype(np.uint32)
+    b: np.ndarray = table[opacity_indexes, value_indexes[:, 2], colors & 255].astype(np.uint32)
+    return (r << 16) | (g << 8) | b
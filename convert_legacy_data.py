@@ -0,0 +1,14 @@
+import common
+import sys
+
+if __name__ == '__main__':
+    # Usage: convert_legacy_data.py [legacy path] [output path]
+    legacy_path: str = sys.argv[1] if len(sys.argv) > 1 else common.CONSTRUCTIBLE_COLORS_FILE_PATH
+    path: str = sys.argv[2] if len(sys.argv) > 2 else legacy_path
+
+    if common.read_constructible_colors_header(legacy_path) is not None:
+        print(f'{legacy_path} is already in the bitset format.')
+    else:
+        print('Converting data...')
+        common.convert_legacy_constructible_colors(legacy_path, path)
+        print(f'Converted {legacy_path} to {path}.')
@@ -0,0 +1,457 @@
+from __future__ import annotations
+
+from typing import Callable, Any
+from tqdm import tqdm
+import numpy as np
+import argparse
+import metrics
+import common
+import json
+import time
+import os
+
+# Depth stored for colors that have not been reached (yet)
+UNREACHED: int = 255
+
+# How many frontier colors are expanded through every layer at once
+CHUNK_SIZE: int = 1 << 16
+
+# Finished breadth-first searches are saved here, one depths file and one JSON file describing it
+# per blend model and palette, so a palette is never searched twice and a slightly different palette
+# can start from it (see get_cached_color_depths())
+REACHABILITY_CACHE_DIRECTORY: str = 'reachability_cache'
+
+def expand_colors(
+    colors: np.ndarray,
+    opacity_index: int,
+    model: common.BlendModel = common.DEFAULT_BLEND_MODEL,
+    palette: common.Palette = common.DEFAULT_PALETTE,
+    color_indexes: np.ndarray | None = None,
+) -> np.ndarray:
+    """
+    Applies every layer with a given opacity to every color.
+
+    :param colors: The colors to expand in decimal form.
+    :type colors: np.ndarray
+    :param opacity_index: The index into the opacities of the palette of the layers to apply.
+    :type opacity_index: int
+    :param model: The formula used to blend the layers.
+    :type model: common.BlendModel
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :param color_indexes: Optional indexes into the colors of the palette, to only apply the layers
+    with those colors.
+    :type color_indexes: np.ndarray | None
+    :return: A uint32 array of shape ``(len(palette.colors), len(colors))`` (or
+    ``(len(color_indexes), len(colors))``) where row ``i`` holds the colors after applying the layer
+    ``(i, opacity_index)`` (or ``(color_indexes[i], opacity_index)``).
+    :rtype: np.ndarray
+    """
+    colors = np.asarray(colors, dtype=np.uint32)
+    rows: np.ndarray = model.get_channel_table(palette)[opacity_index]
+
+    # Blend each channel with every distinct layer channel value once, then combine them per layer
+    r: np.ndarray = rows[:, (colors >> 16) & 255].astype(np.uint32) << 16
+    g: np.ndarray = rows[:, (colors >> 8) & 255].astype(np.uint32) << 8
+    b: np.ndarray = rows[:, colors & 255].astype(np.uint32)
+    value_indexes: np.ndarray = palette.layer_channel_index_array
+    if color_indexes is not None:
+        value_indexes = value_indexes[color_indexes]
+    return r[value_indexes[:, 0]] | g[value_indexes[:, 1]] | b[value_indexes[:, 2]]
+
+def get_color_depths(
+    max_depth: int | None = None,
+    resume_depths: np.ndarray | None = None,
+    resume_depth: int = 1,
+    resume_cursor: int = 0,
+    checkpoint: Callable[[np.ndarray, int, int], Any] | None = None,
+    checkpoint_interval: float = 60.0,
+    predecessors: np.ndarray | None = None,
+    model: common.BlendModel = common.DEFAULT_BLEND_MODEL,
+    palette: common.Palette = common.DEFAULT_PALETTE,
+) -> np.ndarray:
+    """
+    Finds the minimum number of layers needed to construct every color with a breadth-first search
+    over colors. Every color is only expanded once, the first time it is reached.
+
+    :param max_depth: The maximum number of layers to check, or None to keep going until no new
+    colors are found (which proves that all colors that haven't been reached are unconstructible).
+    :type max_depth: int | None
+    :param resume_depths: Optional depths array passed to ``checkpoint`` by an earlier search to resume
+    from. The array is updated in place.
+    :type resume_depths: np.ndarray | None
+    :param resume_depth: The depth passed to ``checkpoint`` along with ``resume_depths``.
+    :type resume_depth: int
+    :param resume_cursor: The cursor passed to ``checkpoint`` along with ``resume_depths``.
+    :type resume_cursor: int
+    :param checkpoint: Optional function called with the depths array, the depth being expanded and
+    the position in the frontier (cursor) to resume from, every ``checkpoint_interval`` seconds and
+    after every depth is complete.
+    :type checkpoint: Callable[[np.ndarray, int, int], Any] | None
+    :param checkpoint_interval: The minimum number of seconds between calls to ``checkpoint``.
+    :type checkpoint_interval: float
+    :param predecessors: Optional uint64 array of length ``1 << 24`` to record how every color was
+    first reached in, as ``(previous_color << 16) | common.layer_to_index(layer, palette)``. Colors
+    of the palette are recorded with their opaque layer and a previous color of 0. Not supported when
+    resuming.
+    :type predecessors: np.ndarray | None
+    :param model: The formula used to blend the layers.
+    :type model: common.BlendModel
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :return: A uint8 array of length ``1 << 24`` indexed by colors in decimal form, holding the
+    minimum number of layers needed for every color, or UNREACHED.
+    :rtype: np.ndarray
+    """
+    depth: int = resume_depth
+    cursor: int = resume_cursor
+    depths: np.ndarray
+    if resume_depths is None:
+        depths = np.full(1 << 24, UNREACHED, dtype=np.uint8)
+        depths[palette.color_decimals] = depth
+        if predecessors is not None:
+            predecessors[palette.color_decimals] = [
+                common.layer_to_index((color_index, palette.fully_opaque_index), palette) for color_index in palette.color_indexes
+            ]
+    else:
+        depths = resume_depths
+    # One bit per color for every color reached by a previous depth; small enough to stay in cache
+    visited: np.ndarray = np.packbits(depths <= depth, bitorder='little')
+
+    constructible_bar: tqdm = tqdm(desc='Constructible', total=(1 << 24), ascii=(common.PY_IMPLEMENTATION == 'PyPy'))
+    constructible_bar.update(int(np.count_nonzero(depths <= depth)))
+
+    time_of_last_checkpoint: float = time.time()
+    frontier: np.ndarray = np.flatnonzero(depths == depth).astype(np.uint32)
+    while True:
+        if len(frontier) == 0 or (max_depth is not None and depth >= max_depth):
+            break
+        if constructible_bar.n >= (1 << 24):
+            # Every color has been reached, so expanding the frontier can't find anything new
+            break
+
+        progress_bar: tqdm = tqdm(desc=f'Depth {depth + 1:<7}', total=len(frontier), initial=cursor, ascii=(common.PY_IMPLEMENTATION == 'PyPy'), leave=False)
+        for start in range(cursor, len(frontier), CHUNK_SIZE):
+            chunk: np.ndarray = frontier[start:start+CHUNK_SIZE]
+            for opacity_index in palette.non_opaque_indexes:
+                new_colors: np.ndarray = expand_colors(chunk, opacity_index, model, palette)
+                unvisited: np.ndarray = ((visited[new_colors >> 3] >> (new_colors & 7)) & 1) == 0
+                if predecessors is not None:
+                    color_indexes: np.ndarray
+                    chunk_indexes: np.ndarray
+                    color_indexes, chunk_indexes = np.nonzero(unvisited)
+                    layer_indexes: np.ndarray = color_indexes * len(palette.opacities) + opacity_index
+                    predecessors[new_colors[unvisited]] = (chunk[chunk_indexes].astype(np.uint64) << 16) | layer_indexes.astype(np.uint64)
+                new_colors = new_colors[unvisited]
+                # Colors found earlier at this depth can show up again, which is harmless
+                depths[new_colors] = depth + 1
+            progress_bar.update(len(chunk))
+            metrics.count('frontier.colors_expanded', len(chunk))
+
+            if checkpoint is not None and time.time() - time_of_last_checkpoint >= checkpoint_interval:
+                checkpoint(depths, depth, start + len(chunk))
+                time_of_last_checkpoint = time.time()
+        progress_bar.close()
+
+        depth += 1
+        cursor = 0
+        frontier = np.flatnonzero(depths == depth).astype(np.uint32)
+        visited |= np.packbits(depths == depth, bitorder='little')
+        constructible_bar.update(len(frontier))
+        metrics.count('frontier.new_colors', len(frontier))
+
+        if checkpoint is not None:
+            checkpoint(depths, depth, cursor)
+            time_of_last_checkpoint = time.time()
+
+    constructible_bar.close()
+
+    return depths
+
+def get_color_depths_incremental(
+    base_depths: np.ndarray,
+    base_palette: common.Palette,
+    base_max_depth: int | None,
+    max_depth: int | None = None,
+    model: common.BlendModel = common.DEFAULT_BLEND_MODEL,
+    palette: common.Palette = common.DEFAULT_PALETTE,
+) -> np.ndarray:
+    """
+    Finds the same depths as ``get_color_depths()`` for a palette from the depths of a smaller
+    palette, by only exploring layer stacks that involve the new layers.
+
+    Every layer of the smaller palette is still there, so its depths are upper bounds. The search goes
+    one depth at a time like ``get_color_depths()``, but a color at the current depth is only expanded
+    through every layer if it got there thanks to the new layers (it is shallower than before) or the
+    base search didn't go this deep; the children the old layers give every other color are already
+    in the base depths. Every color is still expanded through the new layers.
+
+    :param base_depths: The depths of the smaller palette, as returned by ``get_color_depths()``.
+    :type base_depths: np.ndarray
+    :param base_palette: The smaller palette. Every color and opacity of it must be in ``palette``.
+    :type base_palette: common.Palette
+    :param base_max_depth: The ``max_depth`` the base depths were found with, or None if that search
+    went until no new colors were found.
+    :type base_max_depth: int | None
+    :param max_depth: The maximum number of layers to check, or None to keep going until no new
+    colors are found.
+    :type max_depth: int | None
+    :param model: The formula used to blend the layers, which the base depths must have been found
+    with too.
+    :type model: common.BlendModel
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :return: A uint8 array of length ``1 << 24`` indexed by colors in decimal form, holding the
+    minimum number of layers needed for every color, or UNREACHED.
+    :rtype: np.ndarray
+    """
+    if not base_palette.is_subset_of(palette):
+        raise ValueError(f'Palette {base_palette.name!r} is not a subset of palette {palette.name!r}')
+
+    base_colors: set[tuple[int, int, int]] = set(base_palette.colors)
+    base_opacities: set[float] = set(base_palette.opacities)
+    new_color_indexes: np.ndarray = np.array([i for i, color in enumerate(palette.colors) if color not in base_colors], dtype=np.intp)
+    all_color_indexes: np.ndarray = np.array(palette.color_indexes, dtype=np.intp)
+
+    depths: np.ndarray = base_depths.copy()
+    depths[palette.color_decimals] = 1
+
+    depth: int = 1
+    constructible_bar: tqdm = tqdm(desc='Constructible', total=(1 << 24), ascii=(common.PY_IMPLEMENTATION == 'PyPy'))
+    frontier: np.ndarray = np.flatnonzero(depths == depth).astype(np.uint32)
+    constructible_bar.update(len(frontier))
+    while len(frontier) > 0 and (max_depth is None or depth < max_depth):
+        # Colors whose children through the old layers aren't all in the base depths already
+        changed: np.ndarray
+        if base_max_depth is not None and depth >= base_max_depth:
+            changed = np.ones(len(frontier), dtype=bool)
+        else:
+            changed = base_depths[frontier] > depth
+
+        progress_bar: tqdm = tqdm(desc=f'Depth {depth + 1:<7}', total=len(frontier), ascii=(common.PY_IMPLEMENTATION == 'PyPy'), leave=False)
+        for start in range(0, len(frontier), CHUNK_SIZE):
+            chunk: np.ndarray = frontier[start:start+CHUNK_SIZE]
+            chunk_changed: np.ndarray = changed[start:start+CHUNK_SIZE]
+            for opacity_index in palette.non_opaque_indexes:
+                new_colors: np.ndarray
+                if palette.opacities[opacity_index] not in base_opacities:
+                    new_colors = expand_colors(chunk, opacity_index, model, palette).ravel()
+                else:
+                    new_colors = np.concatenate((
+                        expand_colors(chunk[chunk_changed], opacity_index, model, palette).ravel(),
+                        expand_colors(chunk[~chunk_changed], opacity_index, model, palette, new_color_indexes).ravel(),
+                    ))
+                new_colors = new_colors[depths[new_colors] > depth + 1]
+                depths[new_colors] = depth + 1
+            progress_bar.update(len(chunk))
+            metrics.count('frontier.colors_expanded', len(chunk))
+        progress_bar.close()
+
+        depth += 1
+        frontier = np.flatnonzero(depths == depth).astype(np.uint32)
+        constructible_bar.update(len(frontier))
+        metrics.count('frontier.new_colors', len(frontier))
+    constructible_bar.close()
+
+    # What is left deeper than the search went are only upper bounds from the base depths
+    depths[(depths > depth) & (depths != UNREACHED)] = UNREACHED
+    return depths
+
+def _get_reachability_path(directory: str, model: common.BlendModel, palette: common.Palette) -> str:
+    return os.path.join(directory, f'{model.name}-{palette.hash[:16]}')
+
+def save_reachability(depths: np.ndarray, max_depth: int | None, model: common.BlendModel = common.DEFAULT_BLEND_MODEL, palette: common.Palette = common.DEFAULT_PALETTE, directory: str = REACHABILITY_CACHE_DIRECTORY) -> None:
+    """
+    Saves the depths found by a breadth-first search to the reachability cache.
+
+    :param depths: The depths array from ``get_color_depths()``.
+    :type depths: np.ndarray
+    :param max_depth: The ``max_depth`` the depths were found with, or None if the search went until
+    no new colors were found.
+    :type max_depth: int | None
+    :param model: The blend model the depths were found with.
+    :type model: common.BlendModel
+    :param palette: The palette the depths were found with.
+    :type palette: common.Palette
+    :param directory: The cache directory.
+    :type directory: str
+    """
+    os.makedirs(directory, exist_ok=True)
+    path: str = _get_reachability_path(directory, model, palette)
+    common.write_file_atomically(f'{path}.depths', np.ascontiguousarray(depths, dtype=np.uint8).tobytes())
+    # Written last, so a cache entry is only ever found once its depths are complete
+    description: dict[str, Any] = {
+        'blend_model': model.name,
+        'palette': palette.to_dict(),
+        'palette_hash': palette.hash,
+        'max_depth': max_depth,
+    }
+    common.write_file_atomically(f'{path}.json', json.dumps(description, indent=4).encode())
+
+def _read_reachability_description(path: str) -> dict[str, Any] | None:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def load_reachability(model: common.BlendModel = common.DEFAULT_BLEND_MODEL, palette: common.Palette = common.DEFAULT_PALETTE, directory: str = REACHABILITY_CACHE_DIRECTORY) -> tuple[np.ndarray, int | None] | None:
+    """
+    Loads the depths of a palette from the reachability cache.
+
+    :param model: The blend model the depths must have been found with.
+    :type model: common.BlendModel
+    :param palette: The palette the depths must have been found with.
+    :type palette: common.Palette
+    :param directory: The cache directory.
+    :type directory: str
+    :return: The depths and the ``max_depth`` they were found with, or None if they aren't cached.
+    :rtype: tuple[np.ndarray, int | None] | None
+    """
+    path: str = _get_reachability_path(directory, model, palette)
+    description: dict[str, Any] | None = _read_reachability_description(f'{path}.json')
+    if description is None or description.get('palette_hash') != palette.hash or description.get('blend_model') != model.name:
+        return None
+    depths: np.ndarray = np.fromfile(f'{path}.depths', dtype=np.uint8)
+    if len(depths) != 1 << 24:
+        raise ValueError(f'Reachability cache file {path!r}.depths is corrupted')
+    return depths, description['max_depth']
+
+def find_reachability_base(model: common.BlendModel = common.DEFAULT_BLEND_MODEL, palette: common.Palette = common.DEFAULT_PALETTE, directory: str = REACHABILITY_CACHE_DIRECTORY) -> common.Palette | None:
+    """
+    Finds the cached palette with the most layers that is a subset of a palette, to start an
+    incremental search from (see ``get_color_depths_incremental()``).
+
+    :param model: The blend model the depths must have been found with.
+    :type model: common.BlendModel
+    :param palette: The palette to search.
+    :type palette: common.Palette
+    :param directory: The cache directory.
+    :type directory: str
+    :return: The cached palette, which can be the palette itself, or None if there isn't one.
+    :rtype: common.Palette | None
+    """
+    if not os.path.isdir(directory):
+        return None
+    best_palette: common.Palette | None = None
+    for file_name in sorted(os.listdir(directory)):
+        if not file_name.startswith(f'{model.name}-') or not file_name.endswith('.json'):
+            continue
+        description: dict[str, Any] | None = _read_reachability_description(os.path.join(directory, file_name))
+        if description is None or description.get('blend_model') != model.name:
+            continue
+        try:
+            cached_palette: common.Palette = common.Palette.from_dict(description['palette'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if cached_palette.is_subset_of(palette) and (best_palette is None or cached_palette.layer_count > best_palette.layer_count):
+            best_palette = cached_palette
+    return best_palette
+
+def get_cached_color_depths(
+    max_depth: int | None = None,
+    incremental: bool = False,
+    model: common.BlendModel = common.DEFAULT_BLEND_MODEL,
+    palette: common.Palette = common.DEFAULT_PALETTE,
+    directory: str = REACHABILITY_CACHE_DIRECTORY,
+    checkpoint: Callable[[np.ndarray, int, int], Any] | None = None,
+    checkpoint_interval: float = 60.0,
+) -> np.ndarray:
+    """
+    Gets the depths of every color like ``get_color_depths()``, from the reachability cache if the
+    palette was searched before. Otherwise, if ``incremental`` is set and the cache has a subset of
+    the palette, only the layer stacks involving the layers it doesn't have are explored. The result
+    is saved to the cache.
+
+    :param max_depth: The maximum number of layers to check, or None to keep going until no new
+    colors are found.
+    :type max_depth: int | None
+    :param incremental: Whether to start from a cached subset of the palette.
+    :type incremental: bool
+    :param model: The formula used to blend the layers.
+    :type model: common.BlendModel
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :param directory: The cache directory.
+    :type directory: str
+    :param checkpoint: Optional function passed to ``get_color_depths()`` when the palette is searched
+    from scratch. Incremental searches aren't checkpointed.
+    :type checkpoint: Callable[[np.ndarray, int, int], Any] | None
+    :param checkpoint_interval: The minimum number of seconds between calls to ``checkpoint``.
+    :type checkpoint_interval: float
+    :return: A uint8 array of length ``1 << 24`` indexed by colors in decimal form, holding the
+    minimum number of layers needed for every color, or UNREACHED.
+    :rtype: np.ndarray
+    """
+    cached: tuple[np.ndarray, int | None] | None = load_reachability(model, palette, directory)
+    if cached is not None and (cached[1] is None or (max_depth is not None and cached[1] >= max_depth)):
+        depths: np.ndarray = cached[0]
+        if max_depth is not None:
+            depths[(depths > max_depth) & (depths != UNREACHED)] = UNREACHED
+        return depths
+
+    base_palette: common.Palette | None = find_reachability_base(model, palette, directory) if incremental else None
+    if base_palette is not None:
+        base_depths: np.ndarray
+        base_max_depth: int | None
+        base_depths, base_max_depth = load_reachability(model, base_palette, directory)
+        print(f'Starting from the cached depths of palette {base_palette.name!r}...')
+        depths = get_color_depths_incremental(base_depths, base_palette, base_max_depth, max_depth, model, palette)
+    else:
+        depths = get_color_depths(max_depth, checkpoint=checkpoint, checkpoint_interval=checkpoint_interval, model=model, palette=palette)
+    save_reachability(depths, max_depth, model, palette, directory)
+    return depths
+
+def build_color_index(path: str = common.COLOR_INDEX_FILE_PATH, model: common.BlendModel = common.DEFAULT_BLEND_MODEL, palette: common.Palette = common.DEFAULT_PALETTE) -> np.ndarray:
+    """
+    Runs a full breadth-first search and saves how to construct every color with as few layers as
+    possible to a color index file, which ``search.lookup()`` reads.
+
+    :param path: The path to the color index file.
+    :type path: str
+    :param model: The formula used to blend the layers.
+    :type model: common.BlendModel
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :return: The depths array from ``get_color_depths()``.
+    :rtype: np.ndarray
+    """
+    predecessors: np.ndarray = np.zeros(1 << 24, dtype=np.uint64)
+    depths: np.ndarray = get_color_depths(predecessors=predecessors, model=model, palette=palette)
+    common.save_color_index(depths, predecessors, path, model, palette)
+    return depths
+
+if __name__ == '__main__':
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Finds every constructible color with a breadth-first search.')
+    parser.add_argument('--index', action='store_true', help=f'also save how to construct every color to {common.COLOR_INDEX_FILE_PATH}')
+    parser.add_argument('--blend-model', choices=[model.name for model in common.BLEND_MODELS], default=common.DEFAULT_BLEND_MODEL.name, help=f'formula used to blend layers (default: {common.DEFAULT_BLEND_MODEL.name})')
+    parser.add_argument('--palette', metavar='PATH', help='JSON file with the colors and opacities layers can have (default: PowerPoint\'s palette)')
+    parser.add_argument('--incremental', action='store_true', help=f'start from the cached results of the largest subset of the palette in {REACHABILITY_CACHE_DIRECTORY}')
+    parser.add_argument('--no-cache', action='store_true', help=f'don\'t read or write {REACHABILITY_CACHE_DIRECTORY}')
+    args: argparse.Namespace = parser.parse_args()
+    blend_model: common.BlendModel = common.get_blend_model(args.blend_model)
+    palette: common.Palette = common.load_palette(args.palette) if args.palette is not None else common.DEFAULT_PALETTE
+
+    print('Getting constructible colors...')
+    color_depths: np.ndarray
+    if args.index:
+        color_depths = build_color_index(model=blend_model, palette=palette)
+        if not args.no_cache:
+            save_reachability(color_depths, None, blend_model, palette)
+    elif args.no_cache:
+        color_depths = get_color_depths(model=blend_model, palette=palette)
+    else:
+        color_depths = get_cached_color_depths(incremental=args.incremental, model=blend_model, palette=palette)
+    reached: np.ndarray = color_depths != UNREACHED
+    common.save_constructible_colors(common.ColorSet(np.packbits(reached, bitorder='little')), depth=int(color_depths[reached].max()), complete=True, model=blend_model, palette=palette)
+
+    depth_counts: np.ndarray = np.bincount(color_depths, minlength=UNREACHED + 1)
+    constructible_count: int = (1 << 24) - int(depth_counts[UNREACHED])
+    for depth in range(1, UNREACHED):
+        if depth_counts[depth] > 0:
+            print(f'{depth} layers: {depth_counts[depth]} colors')
+    print(f'{constructible_count} / {1 << 24} ({constructible_count / (1 << 24):.3%}) colors constructible.')
+    print(f'{(1 << 24) - constructible_count} / {1 << 24} ({1 - (constructible_count / (1 << 24)):.3%}) colors unconstructible.')
+
+    print('')
+    input('Press ENTER to close.')
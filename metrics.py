@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+from contextlib import contextmanager, nullcontext
+from typing import Iterator, BinaryIO, Any
+import cProfile
+import bisect
+import json
+import time
+import os
+
+# Instrumentation is opt-in. While it is disabled, every function here returns straight away, so
+# calling them from hot paths costs about as much as calling an empty function.
+ENABLED: bool = False
+
+METRICS_FILE_PATH: str = 'metrics.jsonl'
+
+# Upper bounds (in seconds) of the buckets of every histogram; the last bucket has no upper bound
+HISTOGRAM_BOUNDS: list[float] = [0.0001, 0.001, 0.01, 0.1, 1.0, 10.0, 100.0, 1000.0]
+
+class Histogram:
+    def __init__(self):
+        """
+        The distribution of a measured value, like the time taken by a function.
+        """
+        self.count: int = 0
+        self.sum: float = 0.0
+        self.min: float = float('inf')
+        self.max: float = float('-inf')
+        self.bucket_counts: list[int] = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.bucket_counts[bisect.bisect_left(HISTOGRAM_BOUNDS, value)] += 1
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min if self.count > 0 else None,
+            'max': self.max if self.count > 0 else None,
+            # Keyed by upper bound like Prometheus, so the keys stay valid JSON
+            'buckets': {
+                ('+Inf' if i == len(HISTOGRAM_BOUNDS) else str(HISTOGRAM_BOUNDS[i])): bucket_count
+                for i, bucket_count in enumerate(self.bucket_counts)
+            },
+        }
+
+# State of the instrumentation, and the process it was enabled in (processes started with fork()
+# inherit it)
+_pid: int | None = None
+_counters: dict[str, int] = {}
+_histograms: dict[str, Histogram] = {}
+_file: BinaryIO | None = None
+_interval: float = 10.0
+_profile_directory: str | None = None
+_profiling: bool = False
+_profile_count: int = 0
+_start_time: float = 0.0
+_time_of_last_snapshot: float = 0.0
+_counters_at_last_snapshot: dict[str, int] = {}
+
+def enable(path: str | None = METRICS_FILE_PATH, interval: float = 10.0, profile_directory: str | None = None) -> None:
+    """
+    Starts recording metrics in this process. Worker processes have to enable metrics themselves;
+    every process can append to the same file.
+
+    :param path: The JSON-lines file to append snapshots to, or None to only record them in memory
+    (see ``snapshot()``).
+    :type path: str | None
+    :param interval: The minimum number of seconds between snapshots written to the file.
+    :type interval: float
+    :param profile_directory: Optional directory to save a cProfile profile of every stage to (see
+    ``stage()``), which can be read with ``pstats`` or a viewer like snakeviz.
+    :type profile_directory: str | None
+    """
+    global ENABLED, _pid, _file, _interval, _profile_directory, _start_time, _time_of_last_snapshot
+
+    disable()
+    _counters.clear()
+    _histograms.clear()
+    _counters_at_last_snapshot.clear()
+    if path is not None:
+        # Unbuffered, so every snapshot is a single write and processes can share the file
+        _file = open(path, 'ab', buffering=0)
+    _interval = interval
+    _profile_directory = profile_directory
+    if profile_directory is not None:
+        os.makedirs(profile_directory, exist_ok=True)
+    _start_time = time.monotonic()
+    _time_of_last_snapshot = _start_time
+    _pid = os.getpid()
+    ENABLED = True
+
+def is_enabled() -> bool:
+    """
+    Checks whether metrics were enabled in this process, rather than inherited from the process that
+    started it.
+
+    :return: Whether metrics are enabled in this process.
+    :rtype: bool
+    """
+    return ENABLED and _pid == os.getpid()
+
+def disable() -> None:
+    """
+    Writes a final snapshot and stops recording metrics. Disabling metrics that aren't enabled does
+    nothing.
+    """
+    global ENABLED, _file
+
+    if not ENABLED:
+        return
+    if is_enabled():
+        write_snapshot()
+    ENABLED = False
+    if _file is not None:
+        _file.close()
+        _file = None
+
+def count(name: str, amount: int = 1) -> None:
+    """
+    Adds to a counter.
+
+    :param name: The name of the counter, like ``'search.nodes_expanded'``.
+    :type name: str
+    :param amount: How much to add.
+    :type amount: int
+    """
+    if not ENABLED:
+        return
+    _counters[name] = _counters.get(name, 0) + amount
+    if time.monotonic() - _time_of_last_snapshot >= _interval:
+        write_snapshot()
+
+def observe(name: str, value: float) -> None:
+    """
+    Records a value in a histogram.
+
+    :param name: The name of the histogram, like ``'search.solve_seconds'``.
+    :type name: str
+    :param value: The value, in seconds for timings.
+    :type value: float
+    """
+    if not ENABLED:
+        return
+    if name not in _histograms:
+        _histograms[name] = Histogram()
+    _histograms[name].observe(value)
+
+def stage(name: str) -> Any:
+    """
+    Measures a stage of a search, for use in a ``with`` statement. The time taken is recorded in the
+    histogram ``'stage.<name>_seconds'``, and the stage is profiled with cProfile if a profile
+    directory was given to ``enable()``. A stage inside another profiled stage is only timed.
+
+    :param name: The name of the stage.
+    :type name: str
+    :return: A context manager.
+    :rtype: Any
+    """
+    if not ENABLED:
+        return nullcontext()
+    return _measure_stage(name)
+
+@contextmanager
+def _measure_stage(name: str) -> Iterator[None]:
+    global _profiling, _profile_count
+
+    profile: cProfile.Profile | None = None
+    if _profile_directory is not None and not _profiling:
+        profile = cProfile.Profile()
+        _profiling = True
+        profile.enable()
+    start_time: float = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(f'stage.{name}_seconds', time.perf_counter() - start_time)
+        if profile is not None:
+            profile.disable()
+            _profiling = False
+            _profile_count += 1
+            profile.dump_stats(os.path.join(_profile_directory, f'{name}.{os.getpid()}.{_profile_count}.prof'))
+
+def snapshot() -> dict[str, Any]:
+    """
+    Gets every metric recorded so far.
+
+    :return: A JSON-serializable dictionary with the time, the process, the number of seconds since
+    metrics were enabled, every counter, the rate of every counter per second since the last
+    snapshot that was written and every histogram.
+    :rtype: dict[str, Any]
+    """
+    now: float = time.monotonic()
+    seconds_since_last_snapshot: float = max(now - _time_of_last_snapshot, 1e-9)
+    return {
+        'time': time.time(),
+        'pid': os.getpid(),
+        'elapsed': now - _start_time,
+        'counters': dict(_counters),
+        'rates': {
+            name: (value - _counters_at_last_snapshot.get(name, 0)) / seconds_since_last_snapshot
+            for name, value in _counters.items()
+        },
+        'histograms': {name: histogram.to_dict() for name, histogram in _histograms.items()},
+    }
+
+def write_snapshot() -> None:
+    """
+    Appends a snapshot to the metrics file straight away, if metrics are enabled with a file.
+    """
+    global _time_of_last_snapshot
+
+    if not ENABLED:
+        return
+    if _file is not None:
+        _file.write((json.dumps(snapshot()) + '\n').encode())
+    _time_of_last_snapshot = time.monotonic()
+    _counters_at_last_snapshot.clear()
+    _counters_at_last_snapshot.update(_counters)
@@ -1,9 +1,22 @@
 from __future__ import annotations
 
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Iterable, Iterator, Callable
+from collections import OrderedDict
 from astar import AStar
 from tqdm import tqdm
+import numpy as np
+import channel_analysis
+import argparse
+import frontier
+import metrics
+import asyncio
+import atexit
 import common
 import math
+import time
+import os
 
 class SearchNode:
     def __init__(self, rgb: tuple[int, int, int] | None, top_layer: tuple[int, int] | None = None):
@@ -13,8 +26,8 @@ class SearchNode:
         :param rgb: The color, or None if dependent on the background color.
         :type rgb: tuple[int, int, int] | None
         :param top_layer: The final layer to create this color, or None if this is the start color.
-        The layer is a tuple of two indexes. The first index is for the common.BASE_COLORS list, and
-        the other is for the common.BASE_OPACITIES list.
+        The layer is a tuple of two indexes. The first index is for the colors of the palette that was
+        searched, and the other is for its opacities.
         """
         self.rgb: tuple[int, int, int] | None = rgb
         self.top_layer: tuple[int, int] | None = top_layer
@@ -29,37 +42,157 @@ class SearchNode:
         return f'SearchNode(rgb={self.rgb}, top_layer={self.top_layer})'
 
     def __str__(self) -> str:
+        return self.format()
+
+    def format(self, palette: common.Palette = common.DEFAULT_PALETTE) -> str:
+        """
+        Formats the node with the color and opacity of its top layer.
+
+        :param palette: The palette that was searched.
+        :type palette: common.Palette
+        :return: The formatted node.
+        :rtype: str
+        """
         result: str = ''
         if self.top_layer is None:
             result += '(START)'
         else:
-            result += f'({common.BASE_OPACITIES[self.top_layer[1]]:.0%}'
-            result += f' {common.rgb_to_hex(common.BASE_COLORS[self.top_layer[0]])})'
+            result += f'({palette.opacities[self.top_layer[1]]:.0%}'
+            result += f' {common.rgb_to_hex(palette.colors[self.top_layer[0]])})'
         if self.rgb is None:
             result += '->AMBIGUOUS'
         else:
             result += f'->{common.rgb_to_hex(self.rgb)}'
         return result
 
+# Estimates of the legacy ColorsSearch are scaled up slightly so nodes closer to the goal are expanded
+# first when several nodes have the same estimated total; path lengths are whole numbers, so this can't
+# change which length is found as long as the weight stays below 1 + 1/4
+TIE_BREAK_WEIGHT: float = 1.001
+
+def get_neighbor_layers(palette: common.Palette = common.DEFAULT_PALETTE) -> list[tuple[int, int]]:
+    """
+    Lists every layer that can go above the bottom layer, in the order of
+    ``build_neighbor_channel_table()``.
+
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :return: The layers.
+    :rtype: list[tuple[int, int]]
+    """
+    return [
+        (color_index, opacity_index)
+        for opacity_index in palette.non_opaque_indexes
+        for color_index in palette.color_indexes
+    ]
+
+def build_neighbor_channel_table(model: common.BlendModel = common.DEFAULT_BLEND_MODEL, palette: common.Palette = common.DEFAULT_PALETTE) -> np.ndarray:
+    """
+    Precomputes every channel of every color after applying each layer from
+    ``get_neighbor_layers()``, already shifted into place so the channels of a new color can be
+    combined with a bitwise OR.
+
+    :param model: The formula used to blend the layers.
+    :type model: common.BlendModel
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :return: A uint32 array of shape ``(3, 256, len(get_neighbor_layers(palette)))`` indexed by
+    ``[channel, old_value, layer]``.
+    :rtype: np.ndarray
+    """
+    neighbor_layers: list[tuple[int, int]] = get_neighbor_layers(palette)
+    channel_table: np.ndarray = model.get_channel_table(palette)
+    table: np.ndarray = np.empty((3, 256, len(neighbor_layers)), dtype=np.uint32)
+    for channel in range(3):
+        shift: int = 16 - 8 * channel
+        for layer_index, (color_index, opacity_index) in enumerate(neighbor_layers):
+            value_index: int = palette.layer_channel_indexes[color_index][channel]
+            table[channel, :, layer_index] = channel_table[opacity_index, value_index].astype(np.uint32) << shift
+    return table
+
+# Tables derived from the channel table of a blend model are built the first time the model is used
+# with a palette, keyed by the model id and the palette hash
+_neighbor_channel_tables: dict[tuple[int, str], np.ndarray] = {}
+_preimage_tables: dict[tuple[int, str], tuple[np.ndarray, np.ndarray]] = {}
+
+def get_neighbor_channel_table(model: common.BlendModel = common.DEFAULT_BLEND_MODEL, palette: common.Palette = common.DEFAULT_PALETTE) -> np.ndarray:
+    key: tuple[int, str] = (model.id, palette.hash)
+    if key not in _neighbor_channel_tables:
+        _neighbor_channel_tables[key] = build_neighbor_channel_table(model, palette)
+    return _neighbor_channel_tables[key]
+
+def get_preimage_tables(model: common.BlendModel = common.DEFAULT_BLEND_MODEL, palette: common.Palette = common.DEFAULT_PALETTE) -> tuple[np.ndarray, np.ndarray]:
+    key: tuple[int, str] = (model.id, palette.hash)
+    if key not in _preimage_tables:
+        _preimage_tables[key] = build_preimage_tables(model, palette)
+    return _preimage_tables[key]
+
 class ColorsSearch(AStar):
-    def neighbors(self, node: SearchNode) -> set[SearchNode]:
-        # Gets the possible next nodes for a given node
+    """
+    The legacy A* search from an empty canvas to a goal color, where every layer costs 1. solve()
+    doesn't use it; it is kept as the baseline that benchmark.py compares against.
+
+    The heuristic is the exact number of layers to the goal for colors that are within two layers of
+    it (found by searching backwards from the goal once per goal), 4 for colors whose channels can't
+    all reach the goal with the same three opacities (see channel_analysis) and 3 for every other
+    color, so it never overestimates and the first path found uses as few layers as possible. Goals
+    with too many colors two layers away (see ``get_colors_near()``) only get the exact number for
+    colors one layer away, and 2 for every other color.
+
+    Every node is a SearchNode handled by the astar package, so solve() uses CompactColorsSearch
+    instead, which searches the same way with far less memory and falls back to IDA*.
+    """
+    def __init__(self, model: common.BlendModel = common.DEFAULT_BLEND_MODEL, palette: common.Palette = common.DEFAULT_PALETTE):
+        self.model: common.BlendModel = model
+        self.palette: common.Palette = palette
+        self.neighbor_layers: list[tuple[int, int]] = get_neighbor_layers(palette)
+        self.neighbor_channel_table: np.ndarray = get_neighbor_channel_table(model, palette)
 
-        neighbors: set[SearchNode] = set()
+        # Colors that reach the goal with exactly one more layer, and with exactly two more layers
+        # (None if there were too many to find)
+        self.goal_rgb: tuple[int, int, int] | None = None
+        self.one_layer_away: common.ColorSet = common.ColorSet()
+        self.two_layers_away: common.ColorSet | None = common.ColorSet()
 
-        opacity_indexes: list[int] = common.OPACITY_INDEXES
+        # The channel values three layers away from the goal for every sequence of opacities, and the
+        # colors found so far that aren't channel consistent with any of them
+        self.three_layer_preimages: np.ndarray | None = None
+        self.four_or_more_layers_away: common.ColorSet = common.ColorSet()
+
+    def astar(self, start: SearchNode, goal: SearchNode, reversePath: bool = False) -> Iterable[SearchNode] | None:
+        if goal.rgb != self.goal_rgb:
+            self.goal_rgb = goal.rgb
+            self.one_layer_away, self.two_layers_away = get_colors_near(goal.rgb, self.model, self.palette)
+            self.three_layer_preimages = channel_analysis.get_channel_preimages(goal.rgb, 3, self.model, self.palette)
+            self.four_or_more_layers_away = common.ColorSet()
+        return super().astar(start, goal, reversePath)
+
+    def neighbors(self, node: SearchNode) -> list[SearchNode]:
+        # Gets the possible next nodes for a given node
+
+        metrics.count('search.nodes_expanded')
         if node.rgb is None:
             # Always apply an opaque layer if one hasn't been applied yet
-            opacity_indexes = [common.FULLY_OPAQUE_INDEX]
+            return [
+                SearchNode(rgb=self.palette.colors[color_index], top_layer=(color_index, self.palette.fully_opaque_index))
+                for color_index in self.palette.color_indexes
+            ]
 
-        for opacity_index in opacity_indexes:
-            for color_index in common.COLOR_INDEXES:
-                layer: tuple[int, int] = (color_index, opacity_index)
-                rgb: tuple[int, int, int] | None = common.apply_layer(node.rgb, layer)
-                neighbor: SearchNode = SearchNode(rgb=rgb, top_layer=layer)
-                neighbors.add(neighbor)
-
-        return neighbors
+        # Opaque layers are never needed above the bottom layer because the path could have started
+        # from that layer instead, so only one node is made per distinct color the other layers lead to
+        decimal: int = common.rgb_to_decimal(node.rgb)
+        table: np.ndarray = self.neighbor_channel_table
+        new_colors: np.ndarray = table[0, (decimal >> 16) & 255] | table[1, (decimal >> 8) & 255] | table[2, decimal & 255]
+        layer_indexes: np.ndarray
+        new_colors, layer_indexes = np.unique(new_colors, return_index=True)
+        changed: np.ndarray = new_colors != decimal
+        if self.three_layer_preimages is not None:
+            consistent: np.ndarray = channel_analysis.get_consistent_colors(new_colors[changed], self.three_layer_preimages)
+            self.four_or_more_layers_away.add_many(new_colors[changed][~consistent])
+        return [
+            SearchNode(rgb=common.decimal_to_rgb(new_color), top_layer=self.neighbor_layers[layer_index])
+            for new_color, layer_index in zip(new_colors[changed].tolist(), layer_indexes[changed].tolist())
+        ]
 
     def distance_between(self, node1: SearchNode, node2: SearchNode) -> float:
         # Gets the cost between two ADJACENT nodes
@@ -72,42 +205,1100 @@ class ColorsSearch(AStar):
         return 1
 
     def heuristic_cost_estimate(self, current_node: SearchNode, goal_node: SearchNode) -> float:
-        # ESTIMATES the cost between a node and the goal node
-
-        if current_node.rgb is None or goal_node.rgb is None:
-            # The estimated cost between an ambiguous node and any other node is infinite
-            return math.inf
+        # ESTIMATES the cost between a node and the goal node, without ever overestimating it
 
-        # Use Euclidean distance between RGB values
-        return math.hypot(
-            goal_node.rgb[0] - current_node.rgb[0],
-            goal_node.rgb[1] - current_node.rgb[1],
-            goal_node.rgb[2] - current_node.rgb[2],
-        )
+        layer_count: int
+        if current_node.rgb is None:
+            # At least the opaque bottom layer is needed
+            layer_count = 1
+        elif current_node.rgb == goal_node.rgb:
+            layer_count = 0
+        elif current_node.rgb in self.one_layer_away:
+            layer_count = 1
+        elif self.two_layers_away is None or current_node.rgb in self.two_layers_away:
+            layer_count = 2
+        elif current_node.rgb in self.four_or_more_layers_away:
+            layer_count = 4
+        else:
+            layer_count = 3
+        return layer_count * TIE_BREAK_WEIGHT
 
     def is_goal_reached(self, current_node: SearchNode, goal_node: SearchNode) -> bool:
         # Returns True if the goal is reached
 
         return current_node == goal_node
 
-def solve(target_rgb: tuple[int, int, int]) -> list[SearchNode] | None:
+# The memory solve() may use by default, in bytes. The g-scores and parents of every color take
+# SEARCH_ARRAYS_SIZE of it no matter how hard the target is, the rest of the working memory of the
+# search takes get_search_overhead_size(), and whatever is left is for the open list
+MEMORY_BUDGET: int = 256 << 20
+SEARCH_ARRAYS_SIZE: int = (1 << 24) * (np.dtype(np.uint8).itemsize + np.dtype(np.uint32).itemsize)
+
+# How many nodes from the open list are expanded at once
+EXPANSION_BATCH_SIZE: int = 1 << 8
+
+# The most boxes of colors two layers away from the goal that get_colors_near() searches, and the
+# most colors it lists from them at once. BOX_CHUNK_SIZE must be at least 1 << 16, the most colors a
+# box with a single red value can hold
+MAX_NEAR_GOAL_BOXES: int = 1 << 19
+BOX_CHUNK_SIZE: int = 1 << 17
+
+# The most working memory used per box searched by get_colors_near(), per color listed from boxes,
+# and per color reached from a batch of nodes before repeats are dropped, in bytes
+NEAR_GOAL_BOX_SIZE: int = 96
+BOX_COLOR_SIZE: int = 112
+EXPANSION_COLOR_SIZE: int = 64
+
+# The most colors CompactColorsSearch remembers reaching so it can reset just their g-scores before
+# the next search; past this, the whole array is reset instead
+MAX_TOUCHED_COLORS: int = 1 << 20
+
+def get_search_overhead_size(palette: common.Palette = common.DEFAULT_PALETTE) -> int:
+    """
+    Finds how much memory CompactColorsSearch uses besides the arrays indexed by color and the open
+    list: the sets of colors near the goal along with the boxes they are listed from (see
+    ``get_colors_near()``), the colors it remembers reaching and the colors reached from a batch of
+    nodes.
+
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :return: The size in bytes.
+    :rtype: int
+    """
+    near_goal_size: int = 3 * common.BITSET_SIZE + MAX_NEAR_GOAL_BOXES * NEAR_GOAL_BOX_SIZE + BOX_CHUNK_SIZE * BOX_COLOR_SIZE
+    touched_size: int = 2 * MAX_TOUCHED_COLORS * np.dtype(np.uint32).itemsize
+    expansion_size: int = EXPANSION_BATCH_SIZE * len(get_neighbor_layers(palette)) * EXPANSION_COLOR_SIZE
+    return near_goal_size + touched_size + expansion_size
+
+# The packed node of the empty canvas, before the opaque bottom layer; every other node is a color in
+# decimal form
+START_NODE: int = 1 << 24
+
+# The highest estimate heuristics() gives, so (f-score, estimate) pairs can be packed into one key
+MAX_ESTIMATE: int = 4
+
+class SearchCancelled(Exception):
+    """
+    Raised by CompactColorsSearch when it is told to stop before it finds a path.
+    """
+
+class CompactColorsSearch:
+    """
+    The same A* search as ColorsSearch, without a Python object per node. Nodes are packed into ints
+    (colors in decimal form and START_NODE), the g-score and parent of every color are stored in
+    arrays indexed by color that are allocated once, and the open list is a bucket queue of arrays
+    of nodes, with one bucket per f-score and estimate (every layer costs 1, so both are small whole
+    numbers). A whole batch of nodes from the lowest bucket is expanded at once.
+
+    The arrays indexed by color take SEARCH_ARRAYS_SIZE bytes and the rest of the working memory takes
+    ``get_search_overhead_size()``. If the open list grows past what is left of the memory budget, the
+    search starts over as an IDA* search, a depth-first search with an increasing bound on the f-score
+    that keeps nothing but the arrays and its stack.
+
+    The arrays are reused by every search, so only the g-scores of the colors the last search reached
+    are reset before the next one.
+    """
+    def __init__(self, model: common.BlendModel = common.DEFAULT_BLEND_MODEL, memory_budget: int = MEMORY_BUDGET, palette: common.Palette = common.DEFAULT_PALETTE):
+        self.model: common.BlendModel = model
+        self.palette: common.Palette = palette
+        self.neighbor_layers: list[tuple[int, int]] = get_neighbor_layers(palette)
+        self.neighbor_channel_table: np.ndarray = get_neighbor_channel_table(model, palette)
+        self.max_open_nodes: int = 0
+        self.set_memory_budget(memory_budget)
+
+        self.g_scores: np.ndarray = np.full(1 << 24, frontier.UNREACHED, dtype=np.uint8)
+        self.parents: np.ndarray = np.empty(1 << 24, dtype=np.uint32)
+
+        # Arrays of the colors whose g-scores were set since the last reset, or None if there were
+        # more than MAX_TOUCHED_COLORS
+        self.touched_colors: list[np.ndarray] | None = []
+        self.touched_color_count: int = 0
+
+        # The same tables as ColorsSearch, computed once per goal
+        self.goal: int | None = None
+        self.one_layer_away: common.ColorSet = common.ColorSet()
+        self.two_layers_away: common.ColorSet | None = common.ColorSet()
+        self.three_layer_preimages: np.ndarray | None = None
+
+    def set_memory_budget(self, memory_budget: int) -> None:
+        """
+        Changes the most memory the search may use before it falls back to IDA*.
+
+        :param memory_budget: The memory budget in bytes. Must be more than SEARCH_ARRAYS_SIZE plus
+        ``get_search_overhead_size()``.
+        :type memory_budget: int
+        """
+        fixed_size: int = SEARCH_ARRAYS_SIZE + get_search_overhead_size(self.palette)
+        if memory_budget <= fixed_size:
+            raise ValueError(f'Memory budget must be more than {fixed_size} bytes, not {memory_budget}')
+        self.max_open_nodes = (memory_budget - fixed_size) // np.dtype(np.uint32).itemsize
+
+    def reset(self) -> None:
+        """
+        Marks every color as unreached again, by resetting only the g-scores set since the last reset
+        unless there were too many of them to remember.
+        """
+        if self.touched_colors is None:
+            self.g_scores.fill(frontier.UNREACHED)
+        elif len(self.touched_colors) > 0:
+            self.g_scores[np.concatenate(self.touched_colors)] = frontier.UNREACHED
+        self.touched_colors = []
+        self.touched_color_count = 0
+
+    def set_goal(self, goal_rgb: tuple[int, int, int]) -> None:
+        goal: int = common.rgb_to_decimal(goal_rgb)
+        if goal != self.goal:
+            self.goal = goal
+            self.one_layer_away, self.two_layers_away = get_colors_near(goal_rgb, self.model, self.palette)
+            self.three_layer_preimages = channel_analysis.get_channel_preimages(goal_rgb, 3, self.model, self.palette)
+
+    def heuristics(self, colors: np.ndarray) -> np.ndarray:
+        """
+        Estimates the number of layers from every color to the goal in the same way as
+        ``ColorsSearch.heuristic_cost_estimate()``, without ever overestimating it.
+
+        :param colors: The colors in decimal form.
+        :type colors: np.ndarray
+        :return: A uint8 array with the estimate for every color.
+        :rtype: np.ndarray
+        """
+        if self.two_layers_away is None:
+            estimates: np.ndarray = np.full(len(colors), 2, dtype=np.uint8)
+        else:
+            estimates = np.full(len(colors), 3, dtype=np.uint8)
+            estimates[~channel_analysis.get_consistent_colors(colors, self.three_layer_preimages)] = 4
+            estimates[self.two_layers_away.contains_many(colors)] = 2
+        estimates[self.one_layer_away.contains_many(colors)] = 1
+        estimates[colors == self.goal] = 0
+        return estimates
+
+    def expand(self, nodes: np.ndarray, g_score: int) -> np.ndarray:
+        """
+        Finds the colors one layer above every node that haven't been reached with as few layers yet,
+        and records how they were reached.
+
+        :param nodes: Packed nodes that were all reached with ``g_score`` layers.
+        :type nodes: np.ndarray
+        :param g_score: The number of layers of the nodes.
+        :type g_score: int
+        :return: The new colors in decimal form, without repeats.
+        :rtype: np.ndarray
+        """
+        metrics.count('search.nodes_expanded', len(nodes))
+        new_colors: np.ndarray
+        parents: np.ndarray
+        if g_score == 0:
+            # The start node only leads to the opaque base colors
+            new_colors = self.palette.color_decimals
+            parents = np.full(len(new_colors), START_NODE, dtype=np.uint32)
+        else:
+            # Opaque layers are never needed above the bottom layer (see ColorsSearch.neighbors())
+            table: np.ndarray = self.neighbor_channel_table
+            new_colors = (table[0, (nodes >> 16) & 255] | table[1, (nodes >> 8) & 255] | table[2, nodes & 255]).ravel()
+            parents = np.repeat(nodes, len(self.neighbor_layers))
+        improved: np.ndarray = self.g_scores[new_colors] > g_score + 1
+        unique_indexes: np.ndarray = np.unique(new_colors[improved], return_index=True)[1]
+        new_colors = new_colors[improved][unique_indexes]
+        # Remembered before the g-scores are set, so a search that is stopped halfway can't leave any
+        # behind
+        if self.touched_colors is not None:
+            self.touched_color_count += len(new_colors)
+            if self.touched_color_count > MAX_TOUCHED_COLORS:
+                self.touched_colors = None
+            else:
+                self.touched_colors.append(new_colors)
+        self.g_scores[new_colors] = g_score + 1
+        self.parents[new_colors] = parents[improved][unique_indexes]
+        return new_colors
+
+    def build_path(self) -> list[SearchNode]:
+        """
+        Follows the parents from the goal back to the start node.
+
+        :return: A list of nodes in the same shape as the result of ``solve()``.
+        :rtype: list[SearchNode]
+        """
+        path: list[SearchNode] = []
+        node: int = self.goal
+        while node != START_NODE:
+            parent: int = int(self.parents[node])
+            top_layer: tuple[int, int]
+            if parent == START_NODE:
+                top_layer = (int(np.flatnonzero(self.palette.color_decimals == node)[0]), self.palette.fully_opaque_index)
+            else:
+                # The first layer that leads there, like ColorsSearch.neighbors()
+                table: np.ndarray = self.neighbor_channel_table
+                new_colors: np.ndarray = table[0, (parent >> 16) & 255] | table[1, (parent >> 8) & 255] | table[2, parent & 255]
+                top_layer = self.neighbor_layers[int(np.flatnonzero(new_colors == node)[0])]
+            path.append(SearchNode(rgb=common.decimal_to_rgb(node), top_layer=top_layer))
+            node = parent
+        path.append(SearchNode(rgb=None))
+        path.reverse()
+        return path
+
+    def search(self, goal_rgb: tuple[int, int, int], should_stop: Callable[[], bool] | None = None) -> list[SearchNode] | None:
+        """
+        Finds the optimal path of nodes to reach a goal color.
+
+        :param goal_rgb: The goal color.
+        :type goal_rgb: tuple[int, int, int]
+        :param should_stop: Optional function checked before every batch of nodes is expanded. The
+        search raises SearchCancelled as soon as it returns True.
+        :type should_stop: Callable[[], bool] | None
+        :return: A list of nodes in the same shape as the result of ``solve()``, or None if the color
+        is unconstructible.
+        :rtype: list[SearchNode] | None
+        """
+        self.set_goal(goal_rgb)
+        self.reset()
+
+        # buckets[f_score * (MAX_ESTIMATE + 1) + estimate] holds arrays of nodes, so the lowest key
+        # is the lowest f-score, with ties broken towards nodes closer to the goal. The start node
+        # needs at least the opaque bottom layer
+        buckets: list[list[np.ndarray]] = [[] for _ in range(2 * (MAX_ESTIMATE + 1))]
+        buckets[1 * (MAX_ESTIMATE + 1) + 1].append(np.array([START_NODE], dtype=np.uint32))
+        open_node_count: int = 1
+        key: int = 0
+        while key < len(buckets):
+            if should_stop is not None and should_stop():
+                raise SearchCancelled
+            if len(buckets[key]) == 0:
+                key += 1
+                continue
+            f_score: int
+            estimate: int
+            f_score, estimate = divmod(key, MAX_ESTIMATE + 1)
+            g_score: int = f_score - estimate
+
+            nodes: np.ndarray = buckets[key].pop()
+            if len(nodes) > EXPANSION_BATCH_SIZE:
+                buckets[key].append(nodes[EXPANSION_BATCH_SIZE:])
+                nodes = nodes[:EXPANSION_BATCH_SIZE]
+            open_node_count -= len(nodes)
+            if g_score > 0:
+                # Skip nodes that were reached with fewer layers after they were added
+                nodes = nodes[self.g_scores[nodes] == g_score]
+                if len(nodes) == 0:
+                    continue
+            if estimate == 0:
+                return self.build_path()
+
+            new_colors: np.ndarray = self.expand(nodes, g_score)
+            estimates: np.ndarray = self.heuristics(new_colors)
+            for new_estimate in np.unique(estimates).tolist():
+                new_key: int = (g_score + 1 + new_estimate) * (MAX_ESTIMATE + 1) + new_estimate
+                while len(buckets) <= new_key:
+                    buckets.append([])
+                buckets[new_key].append(new_colors[estimates == new_estimate])
+                # New colors have at least the same f-score, but can be closer to the goal
+                key = min(key, new_key)
+            open_node_count += len(new_colors)
+            if open_node_count > self.max_open_nodes:
+                # The lowest f-score in the open list is still a lower bound on the number of layers
+                metrics.count('search.memory_fallbacks')
+                del buckets
+                return self.search_depth_first(f_score, should_stop)
+        return None
+
+    def search_depth_first(self, bound: int = 1, should_stop: Callable[[], bool] | None = None) -> list[SearchNode] | None:
+        """
+        Finds the optimal path of nodes to reach the goal color with IDA*, which only needs the arrays
+        indexed by color and a stack of at most one node per neighbor layer for every layer. The g-scores
+        double as a transposition table: a color is only searched again if it is reached with fewer
+        layers within the same bound.
+
+        :param bound: A lower bound on the number of layers needed.
+        :type bound: int
+        :param should_stop: Optional function checked before every node is expanded, like in
+        ``search()``.
+        :type should_stop: Callable[[], bool] | None
+        :return: A list of nodes in the same shape as the result of ``solve()``, or None if the color
+        is unconstructible.
+        :rtype: list[SearchNode] | None
+        """
+        while True:
+            self.reset()
+            next_bound: int | None = None
+            stack: list[tuple[int, int]] = [(START_NODE, 0)]
+            while len(stack) > 0:
+                node: int
+                g_score: int
+                node, g_score = stack.pop()
+                if should_stop is not None and should_stop():
+                    raise SearchCancelled
+                if node == self.goal:
+                    return self.build_path()
+                if node != START_NODE and self.g_scores[node] != g_score:
+                    continue
+
+                new_colors: np.ndarray = self.expand(np.array([node], dtype=np.uint32), g_score)
+                f_scores: np.ndarray = g_score + 1 + self.heuristics(new_colors).astype(np.int64)
+                if (f_scores > bound).any():
+                    lowest_pruned: int = int(f_scores[f_scores > bound].min())
+                    next_bound = lowest_pruned if next_bound is None else min(next_bound, lowest_pruned)
+                # Pushed from the highest f-score to the lowest, so the most promising color is next
+                order: np.ndarray = np.argsort(-f_scores[f_scores <= bound], kind='stable')
+                stack.extend((new_color, g_score + 1) for new_color in new_colors[f_scores <= bound][order].tolist())
+            if next_bound is None:
+                return None
+            bound = next_bound
+
+# The CompactColorsSearch of every blend model and palette, made the first time solve() is called with
+# them. A search is taken out of the dict while it runs, so callers on other threads make their own
+_solvers: dict[tuple[int, str], CompactColorsSearch] = {}
+
+def solve(target_rgb: tuple[int, int, int], model: common.BlendModel = common.DEFAULT_BLEND_MODEL, memory_budget: int = MEMORY_BUDGET, palette: common.Palette = common.DEFAULT_PALETTE) -> list[SearchNode] | None:
     """
-    Finds the optimal path of nodes to reach a target color.
+    Finds the optimal path of nodes to reach a target color with CompactColorsSearch. The arrays of
+    the search are reused by every call with the same blend model and palette.
 
     :param target_rgb: The target color.
     :type target_rgb: tuple[int, int, int]
+    :param model: The formula used to blend the layers.
+    :type model: common.BlendModel
+    :param memory_budget: The most memory the search may use in bytes, past which it falls back to
+    IDA*. Must be more than SEARCH_ARRAYS_SIZE plus ``get_search_overhead_size(palette)``.
+    :type memory_budget: int
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
     :return: A list of nodes, or None if the color is unconstructible.
     :rtype: list[SearchNode] | None
     """
-    solver: ColorsSearch = ColorsSearch()
-    start_node: SearchNode = SearchNode(rgb=None)
-    goal_node: SearchNode = SearchNode(rgb=target_rgb)
-    solver_result = solver.astar(start_node, goal_node)
-    if solver_result is None:
+    start_time: float = time.perf_counter()
+    key: tuple[int, str] = (model.id, palette.hash)
+    solver: CompactColorsSearch | None = _solvers.pop(key, None)
+    if solver is None:
+        solver = CompactColorsSearch(model, memory_budget, palette)
+    else:
+        solver.set_memory_budget(memory_budget)
+    try:
+        solver_result: list[SearchNode] | None = solver.search(target_rgb)
+    finally:
+        _solvers[key] = solver
+    metrics.observe('search.solve_seconds', time.perf_counter() - start_time)
+    metrics.count('search.solves')
+    return solver_result
+
+def build_preimage_tables(model: common.BlendModel = common.DEFAULT_BLEND_MODEL, palette: common.Palette = common.DEFAULT_PALETTE) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Precomputes the preimage of every channel value under every layer channel value and opacity.
+    Blending is monotonic in the old channel value, so every preimage is an interval.
+
+    :param model: The formula used to blend the layers.
+    :type model: common.BlendModel
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :return: Two int16 arrays indexed like ``model.get_channel_table(palette)`` by
+    ``[opacity_index, channel_value_index, new_value]``. The first holds the lowest old value that
+    blends to at least ``new_value`` and the second holds the highest old value that blends to at most
+    ``new_value``. A lower bound above the upper bound means the interval is empty.
+    :rtype: tuple[np.ndarray, np.ndarray]
+    """
+    channel_table: np.ndarray = model.get_channel_table(palette)
+    lower_bounds: np.ndarray = np.empty(channel_table.shape, dtype=np.int16)
+    upper_bounds: np.ndarray = np.empty(channel_table.shape, dtype=np.int16)
+    new_values: np.ndarray = np.arange(256)
+    for opacity_index, rows in enumerate(channel_table):
+        for value_index, row in enumerate(rows):
+            lower_bounds[opacity_index, value_index] = np.searchsorted(row, new_values, side='left')
+            upper_bounds[opacity_index, value_index] = np.searchsorted(row, new_values, side='right') - 1
+    return lower_bounds, upper_bounds
+
+def _pack_boxes(lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    # Packs boxes of colors into unique 48-bit integers
+    lower = lower.astype(np.int64)
+    upper = upper.astype(np.int64)
+    return (
+        (lower[:, 0] << 40) | (lower[:, 1] << 32) | (lower[:, 2] << 24)
+        | (upper[:, 0] << 16) | (upper[:, 1] << 8) | upper[:, 2]
+    )
+
+# How many layers the forward side of solve_reverse() covers
+REVERSE_FORWARD_DEPTH: int = 2
+
+# The most colors solve_reverse() lists from the boxes of a level at once
+REVERSE_CHUNK_SIZE: int = 1 << 22
+
+def build_forward_colors(model: common.BlendModel = common.DEFAULT_BLEND_MODEL, palette: common.Palette = common.DEFAULT_PALETTE) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Finds every color that can be constructed with at most REVERSE_FORWARD_DEPTH (2) layers, and how.
+
+    :param model: The formula used to blend the layers.
+    :type model: common.BlendModel
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :return: The colors in decimal form (sorted, without repeats), the number of layers every color
+    needs, the index of the base color below it and the index of the layer above that base color in
+    ``get_neighbor_layers(palette)`` (-1 for colors that are a base color themselves).
+    :rtype: tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+    """
+    base_colors: np.ndarray = palette.color_decimals
+    table: np.ndarray = get_neighbor_channel_table(model, palette)
+    layer_count: int = table.shape[2]
+    two_layer_colors: np.ndarray = (
+        table[0, (base_colors >> 16) & 255] | table[1, (base_colors >> 8) & 255] | table[2, base_colors & 255]
+    ).ravel()
+
+    # Base colors go first, so np.unique() keeps them over the same colors made with two layers
+    colors: np.ndarray = np.concatenate((base_colors, two_layer_colors))
+    depths: np.ndarray = np.repeat(np.array([1, 2], dtype=np.uint8), [len(base_colors), len(two_layer_colors)])
+    base_indexes: np.ndarray = np.concatenate((np.arange(len(base_colors)), np.repeat(np.arange(len(base_colors)), layer_count)))
+    layer_indexes: np.ndarray = np.concatenate((np.full(len(base_colors), -1), np.tile(np.arange(layer_count), len(base_colors))))
+    unique_indexes: np.ndarray
+    colors, unique_indexes = np.unique(colors, return_index=True)
+    return colors, depths[unique_indexes], base_indexes[unique_indexes], layer_indexes[unique_indexes]
+
+# The forward side of solve_reverse() for every blend model and palette, built the first time
+# solve_reverse() is called with them
+_forward_colors: dict[tuple[int, str], tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = {}
+
+def get_forward_colors(model: common.BlendModel = common.DEFAULT_BLEND_MODEL, palette: common.Palette = common.DEFAULT_PALETTE) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    key: tuple[int, str] = (model.id, palette.hash)
+    if key not in _forward_colors:
+        _forward_colors[key] = build_forward_colors(model, palette)
+    return _forward_colors[key]
+
+def _expand_boxes_backwards(lower: np.ndarray, upper: np.ndarray, model: common.BlendModel = common.DEFAULT_BLEND_MODEL, palette: common.Palette = common.DEFAULT_PALETTE) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Finds the boxes of colors that land inside a set of boxes after one more layer. Layers above the
+    bottom layer never need to be opaque, so only the other opacities are used.
+
+    :param lower: An array of shape ``(N, 3)`` with the lowest value of every channel in every box.
+    :type lower: np.ndarray
+    :param upper: An array of shape ``(N, 3)`` with the highest value of every channel in every box.
+    :type upper: np.ndarray
+    :param model: The formula used to blend the layers.
+    :type model: common.BlendModel
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :return: The lower and upper bounds of the new (non-empty) boxes, the index of the box every new
+    box leads into, and an array of shape ``(M, 2)`` with the layer that leads there.
+    :rtype: tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+    """
+    preimage_lower_bounds: np.ndarray
+    preimage_upper_bounds: np.ndarray
+    preimage_lower_bounds, preimage_upper_bounds = get_preimage_tables(model, palette)
+    value_indexes: np.ndarray = palette.layer_channel_index_array
+
+    new_lower_list: list[np.ndarray] = []
+    new_upper_list: list[np.ndarray] = []
+    new_parent_list: list[np.ndarray] = []
+    new_layer_list: list[np.ndarray] = []
+    for opacity_index in palette.non_opaque_indexes:
+        # Arrays of shape (len(palette.colors), len(lower), 3)
+        new_lower: np.ndarray = np.stack([
+            preimage_lower_bounds[opacity_index][:, lower[:, channel]][value_indexes[:, channel]] for channel in range(3)
+        ], axis=-1)
+        new_upper: np.ndarray = np.stack([
+            preimage_upper_bounds[opacity_index][:, upper[:, channel]][value_indexes[:, channel]] for channel in range(3)
+        ], axis=-1)
+        color_indexes: np.ndarray
+        box_indexes: np.ndarray
+        color_indexes, box_indexes = np.nonzero(np.all(new_lower <= new_upper, axis=2))
+        new_lower_list.append(new_lower[color_indexes, box_indexes])
+        new_upper_list.append(new_upper[color_indexes, box_indexes])
+        new_parent_list.append(box_indexes)
+        new_layer_list.append(np.stack((color_indexes, np.full_like(color_indexes, opacity_index)), axis=1))
+
+    return (
+        np.concatenate(new_lower_list),
+        np.concatenate(new_upper_list),
+        np.concatenate(new_parent_list),
+        np.concatenate(new_layer_list),
+    )
+
+def _colors_in_box_chunks(lower: np.ndarray, upper: np.ndarray, chunk_size: int = BOX_CHUNK_SIZE) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    # Lists the colors of boxes like _colors_in_boxes(), at most chunk_size colors at a time. Boxes
+    # that hold more colors are listed in slabs of red values, so chunk_size must be at least 1 << 16
+    sizes: np.ndarray = upper.astype(np.int32) - lower + 1
+    slab_heights: np.ndarray = np.maximum(chunk_size // (sizes[:, 1] * sizes[:, 2]), 1)
+    slab_counts: np.ndarray = -(-sizes[:, 0] // slab_heights)
+    box_indexes: np.ndarray = np.repeat(np.arange(len(lower)), slab_counts)
+    slab_numbers: np.ndarray = np.arange(len(box_indexes)) - np.repeat(np.cumsum(slab_counts) - slab_counts, slab_counts)
+    slab_lower: np.ndarray = lower[box_indexes].astype(np.int16)
+    slab_upper: np.ndarray = upper[box_indexes].astype(np.int16)
+    slab_lower[:, 0] += (slab_numbers * slab_heights[box_indexes]).astype(np.int16)
+    slab_upper[:, 0] = np.minimum(slab_lower[:, 0] + slab_heights[box_indexes] - 1, slab_upper[:, 0])
+    del sizes, slab_heights, slab_counts, slab_numbers
+
+    cumulative_volumes: np.ndarray = np.cumsum((slab_upper.astype(np.int64) - slab_lower + 1).prod(axis=1))
+    chunk_start: int = 0
+    while chunk_start < len(slab_lower):
+        volume_before: int = int(cumulative_volumes[chunk_start - 1]) if chunk_start > 0 else 0
+        chunk_end: int = max(int(np.searchsorted(cumulative_volumes, volume_before + chunk_size, side='right')), chunk_start + 1)
+        colors: np.ndarray
+        slab_indexes: np.ndarray
+        colors, slab_indexes = _colors_in_boxes(slab_lower[chunk_start:chunk_end], slab_upper[chunk_start:chunk_end])
+        yield colors, box_indexes[chunk_start + slab_indexes]
+        chunk_start = chunk_end
+
+def _colors_in_boxes(lower: np.ndarray, upper: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Lists every color inside every box in decimal form (with repeats where boxes overlap) and the
+    # index of the box each one is in
+    lower = lower.astype(np.int64)
+    sizes: np.ndarray = upper.astype(np.int64) - lower + 1
+    volumes: np.ndarray = sizes.prod(axis=1)
+    box_indexes: np.ndarray = np.repeat(np.arange(len(volumes)), volumes)
+    offsets: np.ndarray = np.arange(len(box_indexes)) - np.repeat(np.cumsum(volumes) - volumes, volumes)
+    sizes = sizes[box_indexes]
+    lower = lower[box_indexes]
+    r: np.ndarray = lower[:, 0] + offsets // (sizes[:, 1] * sizes[:, 2])
+    g: np.ndarray = lower[:, 1] + (offsets // sizes[:, 2]) % sizes[:, 1]
+    b: np.ndarray = lower[:, 2] + offsets % sizes[:, 2]
+    return ((r << 16) | (g << 8) | b).astype(np.uint32), box_indexes
+
+def get_colors_near(target_rgb: tuple[int, int, int], model: common.BlendModel = common.DEFAULT_BLEND_MODEL, palette: common.Palette = common.DEFAULT_PALETTE) -> tuple[common.ColorSet, common.ColorSet | None]:
+    """
+    Finds every color that reaches a target color with exactly one more layer, and every color that
+    needs exactly two more layers, by searching backwards from the target. The colors two layers away
+    are only found if the boxes holding them can't number more than MAX_NEAR_GOAL_BOXES, and colors
+    are listed from the boxes BOX_CHUNK_SIZE at a time, so the working memory stays within
+    ``get_search_overhead_size()``.
+
+    :param target_rgb: The target color.
+    :type target_rgb: tuple[int, int, int]
+    :param model: The formula used to blend the layers.
+    :type model: common.BlendModel
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :return: The colors one layer away from the target, and the colors two layers away from it or None
+    if there could be too many boxes of them. Neither set includes the target itself.
+    :rtype: tuple[common.ColorSet, common.ColorSet | None]
+    """
+    lower: np.ndarray = np.array([target_rgb], dtype=np.int16)
+    upper: np.ndarray = lower.copy()
+
+    colors_by_distance: list[common.ColorSet] = []
+    excluded: common.ColorSet = common.ColorSet()
+    excluded.add(target_rgb)
+    for distance in range(1, 3):
+        # Every box leads to at most one new box per neighbor layer
+        if distance == 2 and len(lower) * len(palette.colors) * len(palette.non_opaque_indexes) > MAX_NEAR_GOAL_BOXES:
+            return colors_by_distance[0], None
+        lower, upper, _, _ = _expand_boxes_backwards(lower, upper, model, palette)
+        unique_indexes: np.ndarray = np.unique(_pack_boxes(lower, upper), return_index=True)[1]
+        lower = lower[unique_indexes]
+        upper = upper[unique_indexes]
+
+        colors_at_distance: common.ColorSet = common.ColorSet()
+        for colors, _ in _colors_in_box_chunks(lower, upper):
+            colors_at_distance.add_many(colors[~excluded.contains_many(colors)])
+        excluded.update(colors_at_distance)
+        colors_by_distance.append(colors_at_distance)
+
+    return colors_by_distance[0], colors_by_distance[1]
+
+def _search_backwards(target_rgb: tuple[int, int, int], model: common.BlendModel = common.DEFAULT_BLEND_MODEL, palette: common.Palette = common.DEFAULT_PALETTE) -> Iterator[tuple[np.ndarray, np.ndarray, list[np.ndarray], list[np.ndarray]]]:
+    """
+    Searches backwards from a target color one level at a time. Every level holds boxes of colors
+    (ranges of values per channel) that reach the target with one more layer than the level before,
+    starting from a box holding only the target. Boxes already found on an earlier level are left out.
+
+    :param target_rgb: The target color.
+    :type target_rgb: tuple[int, int, int]
+    :param model: The formula used to blend the layers.
+    :type model: common.BlendModel
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :return: An iterator over the lower and upper bounds of the boxes on each level, along with lists
+    holding the index of the box on the level before that every box leads into and the layer that
+    leads there, for every level after the first. The same lists are yielded every time and grow as
+    the search goes on. The iterator ends when a level has no new boxes.
+    :rtype: Iterator[tuple[np.ndarray, np.ndarray, list[np.ndarray], list[np.ndarray]]]
+    """
+    lower: np.ndarray = np.array([target_rgb], dtype=np.int16)
+    upper: np.ndarray = lower.copy()
+    seen_boxes: np.ndarray = _pack_boxes(lower, upper)
+
+    parent_indexes: list[np.ndarray] = []
+    parent_layers: list[np.ndarray] = []
+
+    while len(lower) > 0:
+        yield lower, upper, parent_indexes, parent_layers
+
+        layers: np.ndarray
+        parents: np.ndarray
+        lower, upper, parents, layers = _expand_boxes_backwards(lower, upper, model, palette)
+
+        # Drop duplicate boxes and boxes already found at a lower depth
+        keys: np.ndarray = _pack_boxes(lower, upper)
+        unique_indexes: np.ndarray
+        keys, unique_indexes = np.unique(keys, return_index=True)
+        unseen: np.ndarray = ~np.isin(keys, seen_boxes, assume_unique=True)
+        unique_indexes = unique_indexes[unseen]
+        seen_boxes = np.union1d(seen_boxes, keys[unseen])
+
+        lower = lower[unique_indexes]
+        upper = upper[unique_indexes]
+        parent_indexes.append(parents[unique_indexes])
+        parent_layers.append(layers[unique_indexes])
+
+def _walk_boxes_forward(rgb: tuple[int, int, int], box_index: int, parent_indexes: list[np.ndarray], parent_layers: list[np.ndarray], model: common.BlendModel = common.DEFAULT_BLEND_MODEL, palette: common.Palette = common.DEFAULT_PALETTE) -> list[SearchNode]:
+    # Walks forwards from a color in a box on the last level of _search_backwards() to the target
+    # through the boxes that lead there
+    path: list[SearchNode] = []
+    for level in range(len(parent_indexes) - 1, -1, -1):
+        layer: tuple[int, int] = (int(parent_layers[level][box_index][0]), int(parent_layers[level][box_index][1]))
+        rgb = common.apply_layer(rgb, layer, model, palette)
+        path.append(SearchNode(rgb=rgb, top_layer=layer))
+        box_index = int(parent_indexes[level][box_index])
+    return path
+
+def solve_reverse(target_rgb: tuple[int, int, int], max_depth: int | None = None, model: common.BlendModel = common.DEFAULT_BLEND_MODEL, palette: common.Palette = common.DEFAULT_PALETTE) -> list[SearchNode] | None:
+    """
+    Finds the optimal path of nodes to reach a target color by searching backwards from the target.
+
+    Every level of the search holds boxes of colors (ranges of values per channel) that reach the
+    target with one more layer than the level before. The backward search meets a small forward
+    search of every color that needs at most REVERSE_FORWARD_DEPTH layers (see
+    ``get_forward_colors()``): the first level that contains one of those colors gives the path,
+    using the color that needs the fewest layers. A color that needs n layers meets the forward side
+    by level n - REVERSE_FORWARD_DEPTH, so colors that need up to 5 layers are found by level 3,
+    before the boxes start to overlap so much that their total volume grows to many times the number
+    of colors.
+
+    :param target_rgb: The target color.
+    :type target_rgb: tuple[int, int, int]
+    :param max_depth: The maximum number of layers to check, or None to keep going until no new boxes
+    are found.
+    :type max_depth: int | None
+    :param model: The formula used to blend the layers.
+    :type model: common.BlendModel
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :return: A list of nodes in the same shape as the result of ``solve()``, or None if the color is
+    unconstructible (within ``max_depth`` layers).
+    :rtype: list[SearchNode] | None
+    """
+    forward_colors: np.ndarray
+    forward_depths: np.ndarray
+    forward_base_indexes: np.ndarray
+    forward_layer_indexes: np.ndarray
+    forward_colors, forward_depths, forward_base_indexes, forward_layer_indexes = get_forward_colors(model, palette)
+    neighbor_layers: list[tuple[int, int]] = get_neighbor_layers(palette)
+
+    for lower, upper, parent_indexes, parent_layers in _search_backwards(target_rgb, model, palette):
+        # Every color on this level needs at least one layer of its own
+        level: int = len(parent_indexes)
+        if max_depth is not None and level + 1 > max_depth:
+            return None
+
+        # The colors of the boxes are listed a chunk at a time, as the boxes on later levels can hold
+        # many times more colors than there are
+        for colors, box_indexes in _colors_in_box_chunks(lower, upper, REVERSE_CHUNK_SIZE):
+            positions: np.ndarray = np.minimum(np.searchsorted(forward_colors, colors), len(forward_colors) - 1)
+            met: np.ndarray = np.flatnonzero(forward_colors[positions] == colors)
+            if len(met) == 0:
+                continue
+
+            # An optimal path goes through a color that needs REVERSE_FORWARD_DEPTH layers (or the
+            # target itself) no later than the first level that meets the forward side, so every
+            # color that meets it on that level gives a path with as few layers
+            index: int = int(met[0])
+            position: int = int(positions[index])
+            if max_depth is not None and level + int(forward_depths[position]) > max_depth:
+                return None
+            base_color_index: int = int(forward_base_indexes[position])
+            rgb: tuple[int, int, int] = palette.colors[base_color_index]
+            path: list[SearchNode] = [SearchNode(rgb=None), SearchNode(rgb=rgb, top_layer=(base_color_index, palette.fully_opaque_index))]
+            if forward_layer_indexes[position] >= 0:
+                rgb = common.decimal_to_rgb(int(colors[index]))
+                path.append(SearchNode(rgb=rgb, top_layer=neighbor_layers[int(forward_layer_indexes[position])]))
+            return path + _walk_boxes_forward(rgb, int(box_indexes[index]), parent_indexes, parent_layers, model, palette)
+    return None
+
+# How many layers the breadth-first search shared by solve_many() covers
+SHARED_SEARCH_DEPTH: int = 3
+
+# The size of a buffer holding the shared breadth-first search (see view_shared_search())
+SHARED_SEARCH_SIZE: int = (1 << 24) * (np.dtype(np.uint8).itemsize + np.dtype(np.uint64).itemsize)
+
+# The depths and predecessors of the shared breadth-first search for every blend model and palette,
+# run the first time solve_many() is called with them
+_shared_searches: dict[tuple[int, str], tuple[np.ndarray, np.ndarray]] = {}
+
+def view_shared_search(buffer: memoryview | bytearray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Gets the arrays of a shared breadth-first search stored in a buffer by ``build_shared_search()``,
+    without copying them.
+
+    :param buffer: A buffer of SHARED_SEARCH_SIZE bytes, like a shared memory block.
+    :type buffer: memoryview | bytearray
+    :return: The depths and predecessors, in the same shape as the result of
+    ``build_shared_search()``.
+    :rtype: tuple[np.ndarray, np.ndarray]
+    """
+    depths: np.ndarray = np.ndarray(1 << 24, dtype=np.uint8, buffer=buffer)
+    predecessors: np.ndarray = np.ndarray(1 << 24, dtype=np.uint64, buffer=buffer, offset=depths.nbytes)
+    return depths, predecessors
+
+def build_shared_search(model: common.BlendModel = common.DEFAULT_BLEND_MODEL, palette: common.Palette = common.DEFAULT_PALETTE, buffer: memoryview | bytearray | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Runs the breadth-first search of every color up to SHARED_SEARCH_DEPTH layers that solve_many()
+    shares between targets.
+
+    :param model: The formula used to blend the layers.
+    :type model: common.BlendModel
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :param buffer: Optional buffer of SHARED_SEARCH_SIZE bytes to store the search in, like a shared
+    memory block, so other processes can use it with ``view_shared_search()`` instead of running the
+    search again.
+    :type buffer: memoryview | bytearray | None
+    :return: The depths from ``frontier.get_color_depths()`` and the predecessors it recorded.
+    :rtype: tuple[np.ndarray, np.ndarray]
+    """
+    with metrics.stage('shared_search'):
+        depths: np.ndarray
+        predecessors: np.ndarray
+        if buffer is None:
+            predecessors = np.zeros(1 << 24, dtype=np.uint64)
+            depths = frontier.get_color_depths(SHARED_SEARCH_DEPTH, predecessors=predecessors, model=model, palette=palette)
+        else:
+            depths, predecessors = view_shared_search(buffer)
+            predecessors.fill(0)
+            depths[:] = frontier.get_color_depths(SHARED_SEARCH_DEPTH, predecessors=predecessors, model=model, palette=palette)
+    return depths, predecessors
+
+def _get_shared_search(model: common.BlendModel = common.DEFAULT_BLEND_MODEL, palette: common.Palette = common.DEFAULT_PALETTE) -> tuple[np.ndarray, np.ndarray]:
+    key: tuple[int, str] = (model.id, palette.hash)
+    if key not in _shared_searches:
+        _shared_searches[key] = build_shared_search(model, palette)
+    return _shared_searches[key]
+
+def _follow_predecessors(decimal_color: int, depths: np.ndarray, predecessors: np.ndarray, palette: common.Palette = common.DEFAULT_PALETTE) -> list[SearchNode]:
+    # Follows the predecessors from a breadth-first search back to an opaque base color
+    path: list[SearchNode] = []
+    while True:
+        predecessor: int = int(predecessors[decimal_color])
+        path.append(SearchNode(rgb=common.decimal_to_rgb(decimal_color), top_layer=common.index_to_layer(predecessor & 0xFFFF, palette)))
+        if depths[decimal_color] <= 1:
+            break
+        decimal_color = predecessor >> 16
+    path.append(SearchNode(rgb=None))
+    path.reverse()
+    return path
+
+def solve_many(targets: Iterable[tuple[int, int, int]], model: common.BlendModel = common.DEFAULT_BLEND_MODEL, palette: common.Palette = common.DEFAULT_PALETTE, shared_search: tuple[np.ndarray, np.ndarray] | None = None, max_depth: int | None = None) -> Iterator[tuple[tuple[int, int, int], list[SearchNode] | None]]:
+    """
+    Finds the optimal paths of nodes to reach many target colors, sharing as much work between them
+    as possible.
+
+    A breadth-first search of every color up to SHARED_SEARCH_DEPTH layers is run once per process
+    (which takes a few seconds and about 150 MiB of RAM) and shared by every target. Targets that it
+    reached are answered straight away, and the other targets are searched backwards one level at a
+    time until a level contains a color that the shared search reached. The colors of every level are
+    listed REVERSE_CHUNK_SIZE at a time like in ``solve_reverse()``.
+
+    :param targets: The target colors.
+    :type targets: Iterable[tuple[int, int, int]]
+    :param model: The formula used to blend the layers.
+    :type model: common.BlendModel
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :param shared_search: Optional result of ``build_shared_search()`` with the same blend model and
+    palette to use instead of running the search in this process, like one that another process
+    stored in shared memory.
+    :type shared_search: tuple[np.ndarray, np.ndarray] | None
+    :param max_depth: The maximum number of layers to check for every target, or None to keep going
+    until no new boxes are found, like in ``solve_reverse()``.
+    :type max_depth: int | None
+    :return: An iterator over every target along with its result, in the same order as the targets.
+    Results are in the same shape as the result of ``solve()`` (None if the color is unconstructible
+    within ``max_depth`` layers) and are yielded as soon as they are found.
+    :rtype: Iterator[tuple[tuple[int, int, int], list[SearchNode] | None]]
+    """
+    depths: np.ndarray
+    predecessors: np.ndarray
+    depths, predecessors = shared_search if shared_search is not None else _get_shared_search(model, palette)
+
+    for target_rgb in targets:
+        decimal_color: int = common.rgb_to_decimal(target_rgb)
+        if depths[decimal_color] != frontier.UNREACHED:
+            metrics.count('search.shared_search_hits')
+            within_depth: bool = max_depth is None or int(depths[decimal_color]) <= max_depth
+            yield target_rgb, _follow_predecessors(decimal_color, depths, predecessors, palette) if within_depth else None
+            continue
+
+        start_time: float = time.perf_counter()
+        solver_result: list[SearchNode] | None = None
+        for lower, upper, parent_indexes, parent_layers in _search_backwards(target_rgb, model, palette):
+            level: int = len(parent_indexes)
+            if level == 0:
+                # The first level only holds the target itself
+                continue
+            # Every color in the level before was unreached, so every reached color here needs
+            # SHARED_SEARCH_DEPTH layers and any of them leads to an optimal path
+            if max_depth is not None and level + SHARED_SEARCH_DEPTH > max_depth:
+                break
+            for colors, box_indexes in _colors_in_box_chunks(lower, upper, REVERSE_CHUNK_SIZE):
+                reached_indexes: np.ndarray = np.flatnonzero(depths[colors] != frontier.UNREACHED)
+                if len(reached_indexes) > 0:
+                    index: int = int(reached_indexes[0])
+                    solver_result = _follow_predecessors(int(colors[index]), depths, predecessors, palette)
+                    solver_result += _walk_boxes_forward(solver_result[-1].rgb, int(box_indexes[index]), parent_indexes, parent_layers, model, palette)
+                    break
+            if solver_result is not None:
+                break
+        metrics.observe('search.backward_search_seconds', time.perf_counter() - start_time)
+        metrics.count('search.backward_searches')
+        yield target_rgb, solver_result
+
+# The color index of every blend model and palette is memory-mapped the first time lookup() is called
+# with them
+_color_indexes: dict[tuple[int, str], np.ndarray] = {}
+
+def lookup(target_rgb: tuple[int, int, int], model: common.BlendModel = common.DEFAULT_BLEND_MODEL, palette: common.Palette = common.DEFAULT_PALETTE) -> list[SearchNode] | None:
+    """
+    Looks up the optimal path of nodes to reach a target color in the color index file, by following
+    the previous colors stored for every color back to an opaque base color. The index file must be
+    built first with ``frontier.py --index``.
+
+    :param target_rgb: The target color.
+    :type target_rgb: tuple[int, int, int]
+    :param model: The formula used to blend the layers. The index file must have been built with the
+    same model.
+    :type model: common.BlendModel
+    :param palette: The colors and opacities layers can have. The index file must have been built
+    with the same palette.
+    :type palette: common.Palette
+    :return: A list of nodes in the same shape as the result of ``solve()``, or None if the color is
+    unconstructible.
+    :rtype: list[SearchNode] | None
+    """
+    key: tuple[int, str] = (model.id, palette.hash)
+    if key not in _color_indexes:
+        _color_indexes[key] = common.load_color_index(model=model, palette=palette)
+    index: np.ndarray = _color_indexes[key]
+
+    decimal_color: int = common.rgb_to_decimal(target_rgb)
+    if index[decimal_color]['depth'] == 255:
         return None
-    return list(solver_result)
 
-def format_solver_result(solver_result: list[SearchNode] | None, target_rgb: tuple[int, int, int]) -> str:
+    path: list[SearchNode] = []
+    while True:
+        entry: np.void = index[decimal_color]
+        path.append(SearchNode(rgb=common.decimal_to_rgb(decimal_color), top_layer=common.index_to_layer(int(entry['layer']), palette)))
+        if entry['depth'] <= 1:
+            break
+        previous: np.ndarray = entry['previous']
+        decimal_color = (int(previous[0]) << 16) | (int(previous[1]) << 8) | int(previous[2])
+    path.append(SearchNode(rgb=None))
+    path.reverse()
+
+    return path
+
+# How many results a SolveService keeps by default, and how many requests it can tell apart when
+# cancelling them (request IDs wrap around after this many)
+SOLVE_CACHE_SIZE: int = 1 << 12
+CANCEL_FLAG_COUNT: int = 1 << 16
+
+# Worker process state of SolveService: a shared byte for every request ID (modulo
+# CANCEL_FLAG_COUNT) that is set to cancel it, and the memory budget of its searches
+_cancel_flags_memory: shared_memory.SharedMemory | None = None
+_worker_memory_budget: int = MEMORY_BUDGET
+
+def initialize_solve_worker(cancel_flags_name: str, memory_budget: int = MEMORY_BUDGET) -> None:
+    """
+    Attaches a worker process of a SolveService to its shared cancellation flags.
+
+    :param cancel_flags_name: The name of the shared memory block holding the flags.
+    :type cancel_flags_name: str
+    :param memory_budget: The memory budget of every search in bytes.
+    :type memory_budget: int
+    """
+    global _cancel_flags_memory, _worker_memory_budget
+
+    _cancel_flags_memory = shared_memory.SharedMemory(name=cancel_flags_name)
+    _worker_memory_budget = memory_budget
+
+def solve_in_worker(request_id: int, target_rgb: tuple[int, int, int], blend_model_name: str, palette: common.Palette = common.DEFAULT_PALETTE) -> list[SearchNode] | None:
+    """
+    Solves a color in a worker process of a SolveService, reusing the arrays of the search between
+    requests.
+
+    :param request_id: The ID of the request, used to check whether it was cancelled.
+    :type request_id: int
+    :param target_rgb: The target color.
+    :type target_rgb: tuple[int, int, int]
+    :param blend_model_name: The name of the blend model.
+    :type blend_model_name: str
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :return: The result of ``solve()``.
+    :rtype: list[SearchNode] | None
+    """
+    model: common.BlendModel = common.get_blend_model(blend_model_name)
+    key: tuple[int, str] = (model.id, palette.hash)
+    if key not in _solvers:
+        _solvers[key] = CompactColorsSearch(model, _worker_memory_budget, palette)
+    cancel_flags: memoryview = _cancel_flags_memory.buf
+    flag_index: int = request_id % CANCEL_FLAG_COUNT
+    return _solvers[key].search(target_rgb, should_stop=lambda: cancel_flags[flag_index] != 0)
+
+class SolveRequest:
+    def __init__(self, request_id: int, future: asyncio.Future):
+        """
+        A search running in a SolveService, shared by every caller waiting for the same color.
+
+        :param request_id: The ID of the request.
+        :type request_id: int
+        :param future: The future of the search.
+        :type future: asyncio.Future
+        """
+        self.request_id: int = request_id
+        self.future: asyncio.Future = future
+        self.waiter_count: int = 0
+
+class SolveService:
+    def __init__(self, workers: int | None = None, cache_size: int = SOLVE_CACHE_SIZE, memory_budget: int = MEMORY_BUDGET):
+        """
+        Solves colors with ``solve()`` in a pool of worker processes for asyncio code, so event loops
+        never block on a search. Concurrent requests for the same color share one search, finished
+        results are kept in an LRU cache, and a search is stopped as soon as every caller waiting
+        for it is cancelled or times out.
+
+        :param workers: The number of worker processes, or None for one per CPU. Every worker takes
+        up to ``memory_budget`` bytes.
+        :type workers: int | None
+        :param cache_size: The maximum number of results to keep.
+        :type cache_size: int
+        :param memory_budget: The memory budget of every search in bytes (see ``solve()``).
+        :type memory_budget: int
+        """
+        self.workers: int = workers if workers is not None else (os.cpu_count() or 1)
+        self.cache_size: int = cache_size
+        # Keyed by blend model id, palette hash and target color in decimal form
+        self.cache: OrderedDict[tuple[int, str, int], list[SearchNode] | None] = OrderedDict()
+        self.requests: dict[tuple[int, str, int], SolveRequest] = {}
+        self.next_request_id: int = 0
+
+        self.cancel_flags_memory: shared_memory.SharedMemory = shared_memory.SharedMemory(create=True, size=CANCEL_FLAG_COUNT)
+        self.cancel_flags_memory.buf[:] = bytes(CANCEL_FLAG_COUNT)
+        self.executor: ProcessPoolExecutor = ProcessPoolExecutor(max_workers=self.workers, initializer=initialize_solve_worker, initargs=(self.cancel_flags_memory.name, memory_budget))
+        self.closed: bool = False
+
+    def __enter__(self) -> SolveService:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    async def solve(self, target_rgb: tuple[int, int, int], model: common.BlendModel = common.DEFAULT_BLEND_MODEL, timeout: float | None = None, palette: common.Palette = common.DEFAULT_PALETTE) -> list[SearchNode] | None:
+        """
+        Finds the optimal path of nodes to reach a target color in a worker process.
+
+        :param target_rgb: The target color.
+        :type target_rgb: tuple[int, int, int]
+        :param model: The formula used to blend the layers.
+        :type model: common.BlendModel
+        :param timeout: Optional number of seconds to wait for the result before raising
+        ``asyncio.TimeoutError``.
+        :type timeout: float | None
+        :param palette: The colors and opacities layers can have.
+        :type palette: common.Palette
+        :return: A list of nodes in the same shape as the result of ``solve()``, or None if the color
+        is unconstructible.
+        :rtype: list[SearchNode] | None
+        """
+        key: tuple[int, str, int] = (model.id, palette.hash, common.rgb_to_decimal(target_rgb))
+        if key in self.cache:
+            metrics.count('search.async_cache_hits')
+            self.cache.move_to_end(key)
+            cached_result: list[SearchNode] | None = self.cache[key]
+            return None if cached_result is None else list(cached_result)
+
+        request: SolveRequest | None = self.requests.get(key)
+        if request is None:
+            request_id: int = self.next_request_id
+            self.next_request_id += 1
+            # Cleared before the search is submitted, so a worker can't see the flag left set by an
+            # earlier request with the same ID
+            self.cancel_flags_memory.buf[request_id % CANCEL_FLAG_COUNT] = 0
+            request = SolveRequest(request_id, asyncio.get_running_loop().run_in_executor(self.executor, solve_in_worker, request_id, target_rgb, model.name, palette))
+            self.requests[key] = request
+            request.future.add_done_callback(lambda future: self._finish(key, request))
+        else:
+            metrics.count('search.async_coalesced')
+
+        # Every caller waits through its own shield, so one caller giving up doesn't cancel the
+        # search for the others
+        request.waiter_count += 1
+        try:
+            solver_result: list[SearchNode] | None = await asyncio.wait_for(asyncio.shield(request.future), timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            request.waiter_count -= 1
+            if request.waiter_count == 0 and not request.future.done():
+                self._cancel(key, request)
+            raise
+        request.waiter_count -= 1
+        return None if solver_result is None else list(solver_result)
+
+    def _cancel(self, key: tuple[int, str, int], request: SolveRequest) -> None:
+        # Searches that haven't started yet are dropped from the queue, and running ones stop the next
+        # time they check their flag
+        metrics.count('search.async_cancelled')
+        if not self.closed:
+            self.cancel_flags_memory.buf[request.request_id % CANCEL_FLAG_COUNT] = 1
+        request.future.cancel()
+        if self.requests.get(key) is request:
+            del self.requests[key]
+
+    def _finish(self, key: tuple[int, str, int], request: SolveRequest) -> None:
+        if self.requests.get(key) is request:
+            del self.requests[key]
+        if request.future.cancelled() or request.future.exception() is not None:
+            return
+        self.cache[key] = request.future.result()
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def close(self) -> None:
+        """
+        Stops every search and the worker processes.
+        """
+        if self.closed:
+            return
+        self.cancel_flags_memory.buf[:] = b'\x01' * CANCEL_FLAG_COUNT
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.closed = True
+        self.cancel_flags_memory.close()
+        self.cancel_flags_memory.unlink()
+
+# The service used by solve_async(), started the first time it is called
+_solve_service: SolveService | None = None
+
+def get_solve_service() -> SolveService:
+    global _solve_service
+
+    if _solve_service is None:
+        _solve_service = SolveService()
+        atexit.register(_solve_service.close)
+    return _solve_service
+
+async def solve_async(target_rgb: tuple[int, int, int], model: common.BlendModel = common.DEFAULT_BLEND_MODEL, timeout: float | None = None, palette: common.Palette = common.DEFAULT_PALETTE) -> list[SearchNode] | None:
+    """
+    Finds the optimal path of nodes to reach a target color without blocking the event loop, with a
+    SolveService shared by the whole process (see ``SolveService.solve()``). Cancelling the call or
+    letting it time out stops the search unless another call is waiting for the same color.
+
+    :param target_rgb: The target color.
+    :type target_rgb: tuple[int, int, int]
+    :param model: The formula used to blend the layers.
+    :type model: common.BlendModel
+    :param timeout: Optional number of seconds to wait for the result before raising
+    ``asyncio.TimeoutError``.
+    :type timeout: float | None
+    :param palette: The colors and opacities layers can have.
+    :type palette: common.Palette
+    :return: A list of nodes in the same shape as the result of ``solve()``, or None if the color is
+    unconstructible.
+    :rtype: list[SearchNode] | None
+    """
+    return await get_solve_service().solve(target_rgb, model, timeout, palette)
+
+def format_solver_result(solver_result: list[SearchNode] | None, target_rgb: tuple[int, int, int], palette: common.Palette = common.DEFAULT_PALETTE) -> str:
     """
     Formats the result from ``solve()``.
 
@@ -115,6 +1306,8 @@ def format_solver_result(solver_result: list[SearchNode] | None, target_rgb: tup
     :type solver_result: list[SearchNode] | None
     :param target_rgb: The target color.
     :type target_rgb: tuple[int, int, int]
+    :param palette: The palette that was searched.
+    :type palette: common.Palette
     :return: The formatted result.
     :rtype: str
     """
@@ -122,27 +1315,33 @@ def format_solver_result(solver_result: list[SearchNode] | None, target_rgb: tup
         return f'FAIL | Target: {common.rgb_to_hex(target_rgb)}'
 
     steps: list[SearchNode] = solver_result[1:]
-    formatted_steps: str = ', '.join([str(node) for node in steps])
+    formatted_steps: str = ', '.join([node.format(palette) for node in steps])
     word_layers: str = 'layer' if len(steps) == 1 else 'layers'
     return f'PASS | Target: {common.rgb_to_hex(target_rgb)} | {len(steps)} {word_layers}: {formatted_steps}'
 
 if __name__ == '__main__':
-    with open(common.CONSTRUCTIBLE_COLORS_FILE_PATH, 'wb') as f:
-
-        print('Getting constructible colors...')
-        progress_bar: tqdm = tqdm(desc='Progress     ', total=(1 << 24), ascii=(common.PY_IMPLEMENTATION == 'PyPy'))
-        constructible_bar: tqdm = tqdm(desc='Constructible', total=(1 << 24), ascii=(common.PY_IMPLEMENTATION == 'PyPy'))
-
-        constructible_count: int = 0
-        for r in range(256):
-            for g in range(256):
-                for b in range(256):
-                    solver_result: list[SearchNode] | None = solve((r, g, b))
-                    progress_bar.update(1)
-                    if solver_result is not None:
-                        constructible_bar.update(1)
-                        constructible_count += 1
-                        f.write(common.rgb_to_bytes((r, g, b)))
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Searches every color one at a time.')
+    parser.add_argument('--blend-model', choices=[model.name for model in common.BLEND_MODELS], default=common.DEFAULT_BLEND_MODEL.name, help=f'formula used to blend layers (default: {common.DEFAULT_BLEND_MODEL.name})')
+    parser.add_argument('--palette', metavar='PATH', help='JSON file with the colors and opacities layers can have (default: PowerPoint\'s palette)')
+    args: argparse.Namespace = parser.parse_args()
+    blend_model: common.BlendModel = common.get_blend_model(args.blend_model)
+    palette: common.Palette = common.load_palette(args.palette) if args.palette is not None else common.DEFAULT_PALETTE
+
+    print('Getting constructible colors...')
+    progress_bar: tqdm = tqdm(desc='Progress     ', total=(1 << 24), ascii=(common.PY_IMPLEMENTATION == 'PyPy'))
+    constructible_bar: tqdm = tqdm(desc='Constructible', total=(1 << 24), ascii=(common.PY_IMPLEMENTATION == 'PyPy'))
+
+    constructible_count: int = 0
+    # Colors are saved as they are found, so they aren't lost if the search is interrupted
+    with common.ResultWriter(model=blend_model, palette=palette) as writer:
+        targets: Iterator[tuple[int, int, int]] = ((r, g, b) for r in range(256) for g in range(256) for b in range(256))
+        for target_rgb, solver_result in solve_many(targets, blend_model, palette):
+            progress_bar.update(1)
+            if solver_result is not None:
+                constructible_bar.update(1)
+                constructible_count += 1
+                writer.add(target_rgb)
+        writer.close(complete=True)
 
     print(f'{constructible_count} / {1 << 24} ({constructible_count / (1 << 24):.3%}) colors constructible.')
     print(f'{(1 << 24) - constructible_count} / {1 << 24} ({1 - (constructible_count / (1 << 24)):.3%}) colors unconstructible.')